@@ -1,7 +1,9 @@
 import grpc
+import logging
 import time
 import os
 import uuid
+import shutil
 from concurrent import futures
 from proto_files import  audio_service_pb2
 from proto_files import  audio_service_pb2_grpc
@@ -9,8 +11,47 @@ from pydub import AudioSegment
 import tempfile
 from voice_cloning.utils import *
 from voice_cloning.api import F5TTS
+from voice_cloning.utils.cfm import InferenceCancelled
 from utils.utils import *
-import datetime
+from prometheus_client import Counter, Gauge, Histogram
+from utils.metrics import DEFAULT_BUCKETS, instrument_rpc, start_metrics_server
+from utils.tracing import create_tracer, trace_rpc
+from utils.channel_pool import SERVER_KEEPALIVE_OPTIONS
+from utils.health import add_health_servicer, warm_up
+from utils.fair_scheduler import DEFAULT_TENANT, PRIORITY_INTERACTIVE, FairScheduler, SchedulingCancelled, parse_weights
+from datetime import datetime
+
+# Shows the metrics and health logs of utils next to the prints of this service
+logging.basicConfig(level=logging.INFO)
+
+# gRPC port; run more replicas on one box by giving each its own port
+PORT = int(os.getenv("AUDIO_SERVICE_PORT", "50052"))
+# Name reported to gRPC health checks; set AUDIO_SERVICE_WARMUP=0 to report SERVING without warming up first
+SERVICE_NAME = audio_service_pb2.DESCRIPTOR.services_by_name["AudioGenerator"].full_name
+WARMUP = os.getenv("AUDIO_SERVICE_WARMUP", "1") == "1"
+WARMUP_TEXT = "The story begins."
+
+# Segments synthesized at the same time on the F5-TTS engine, and the share of the engine per priority class
+TTS_SLOTS = int(os.getenv("AUDIO_SERVICE_TTS_SLOTS", "1"))
+PRIORITY_WEIGHTS = parse_weights(os.getenv("AUDIO_SERVICE_PRIORITY_WEIGHTS", "interactive=8,batch=1"))
+
+# Time the steps inside F5-TTS (audio_service_infer_stage_seconds); off by default because
+# timing the ODE sampling waits for the GPU to finish it (torch.cuda.synchronize)
+STAGE_TIMING = os.getenv("AUDIO_SERVICE_STAGE_TIMING", "0") == "1"
+
+# Prometheus metrics, served on METRICS_PORT
+METRICS_PORT = int(os.getenv("AUDIO_SERVICE_METRICS_PORT", "9102"))
+RPC_DURATION = Histogram("audio_service_rpc_duration_seconds", "Latency of AudioGenerator RPCs", ["method"], buckets=DEFAULT_BUCKETS)
+RPC_IN_FLIGHT = Gauge("audio_service_rpc_in_flight", "AudioGenerator RPCs currently being handled", ["method"])
+RPC_ERRORS = Counter("audio_service_rpc_errors_total", "AudioGenerator RPCs that raised an error", ["method"])
+SEGMENT_INFER_DURATION = Histogram("audio_service_segment_infer_seconds", "Duration of one F5TTS.infer call (one segment)", ["emotion"], buckets=DEFAULT_BUCKETS)
+INFER_STAGE_DURATION = Histogram("audio_service_infer_stage_seconds", "Duration of internal F5-TTS steps (reference preprocessing, ODE sampling, vocoder decode, file write)", ["stage"], buckets=DEFAULT_BUCKETS)
+MERGE_DURATION = Histogram("audio_service_merge_export_seconds", "Time to merge the segments and export the story audio", buckets=DEFAULT_BUCKETS)
+SEGMENT_QUEUE_WAIT = Histogram("audio_service_segment_queue_wait_seconds", "Time a segment waited for its turn on the F5-TTS engine", ["priority"], buckets=DEFAULT_BUCKETS)
+RPC_CANCELLED = Counter("audio_service_rpc_cancelled_total", "AudioGenerator RPCs abandoned because the client cancelled or the deadline passed", ["method"])
+
+# Spans are continued from the traceparent sent by the orchestrator
+TRACER = create_tracer("audio_service")
 
 
 
@@ -26,6 +67,8 @@ class AudioGeneratorServicer(audio_service_pb2_grpc.AudioGeneratorServicer):
         self.output_dir = output_folder
         self.emotion_files = get_files_with_extension(refernce_audio_folder,'wav')
         self.emotion_files_dict = {}
+        # Requests are interleaved segment by segment, weighted by priority class and fair across tenants
+        self.scheduler = FairScheduler(slots=TTS_SLOTS, weights=PRIORITY_WEIGHTS)
      
     
     def make_key_file_pairs(self):
@@ -45,18 +88,67 @@ class AudioGeneratorServicer(audio_service_pb2_grpc.AudioGeneratorServicer):
             
     
 
-    def audio_generator(self,emotion,text_to_gen,output_path):
-        print("F5tts object ")
-        wav, sr, spect = self.f5tts.infer(
-                    ref_file=self.emotion_files_dict[emotion],
+    def warmup(self):
+        """
+        Synthesize a short sentence with every reference voice
+
+        The first synthesis of a voice pays for loading Whisper and
+        transcribing the reference, CUDA allocator growth and kernel
+        selection. Doing it before reporting SERVING keeps those costs out of
+        the first requests, and leaves every reference in the cache.
+        """
+        self.make_key_file_pairs()
+        warmup_dir = os.path.join(self.output_dir, "warmup")
+        os.makedirs(warmup_dir, exist_ok=True)
+        try:
+            for emotion, ref_file in self.emotion_files_dict.items():
+                start = time.perf_counter()
+                self.f5tts.infer(
+                    ref_file=ref_file,
                     ref_text="",
-                    gen_text=text_to_gen,
-                    file_wave=output_path,
-                    # file_spect=spect_path,
-                    speed = 0.8,
-                    seed=-1  # Random seed
+                    gen_text=WARMUP_TEXT,
+                    file_wave=os.path.join(warmup_dir, f"{emotion}.wav"),
+                    speed=0.8,
+                    seed=-1
                 )
+                print(f"Warmed up voice {emotion} in {time.perf_counter() - start:.1f}s")
+        finally:
+            shutil.rmtree(warmup_dir, ignore_errors=True)
+
+    def record_stage(self, stage, seconds):
+        """on_stage hook of F5TTS.infer: one metric sample and one span per timed step"""
+        INFER_STAGE_DURATION.labels(stage).observe(seconds)
+        TRACER.record_span(stage, seconds)
+
+    def scheduled_audio_generator(self,request,emotion,text_to_gen,output_path,should_stop=None):
+        """Wait for the segment's turn on the engine, then synthesize it"""
+        priority = request.priority or PRIORITY_INTERACTIVE
+        tenant = request.tenant or DEFAULT_TENANT
+        # Synthesis time grows with the length of the text, so that is what a segment costs its flow
+        try:
+            with self.scheduler.slot(priority, tenant, len(text_to_gen), should_stop) as waited:
+                SEGMENT_QUEUE_WAIT.labels(priority).observe(waited)
+                return self.audio_generator(emotion,text_to_gen,output_path,should_stop)
+        except SchedulingCancelled:
+            # Cancelled while still waiting for its turn
+            raise InferenceCancelled()
+
+    def audio_generator(self,emotion,text_to_gen,output_path,should_stop=None):
+        print("F5tts object ")
+        with SEGMENT_INFER_DURATION.labels(emotion).time(), TRACER.span("synthesize_segment", emotion=emotion, characters=len(text_to_gen)):
+            wav, sr, spect = self.f5tts.infer(
+                        ref_file=self.emotion_files_dict[emotion],
+                        ref_text="",
+                        gen_text=text_to_gen,
+                        file_wave=output_path,
+                        # file_spect=spect_path,
+                        speed = 0.8,
+                        seed=-1,  # Random seed
+                        on_stage=self.record_stage if STAGE_TIMING else None,
+                        should_stop=should_stop
+                    )
         print("Audio generated successfully")
+        return len(wav) / sr
 
     def merge_audio_files(self,audio_files, output_file):
         for file in audio_files:
@@ -80,62 +172,136 @@ class AudioGeneratorServicer(audio_service_pb2_grpc.AudioGeneratorServicer):
             
             # Export the merged audio to the output file
             merged_audio.export(output_file, format=output_ext)
-            return True
+            # Return the merged duration in seconds
+            return len(merged_audio) / 1000.0
         
         except Exception as e:
             print(f"Error merging audio files: {e}")
-            return False
-    def GenerateAudio(self, request, context):
-        print(f"Received request to generate audio for {len(request.segments)} sentences")
-        
-        # Create a unique file name for this audio
-        audio_file_name = f"story_{uuid.uuid4().hex}.mp3"
-        audio_file_path = os.path.join("generated_audio", audio_file_name)
-        
-        combined_audio = AudioSegment.silent(duration=0)
+            return None
+    def synthesize_segments(self, request, context):
+        """
+        Synthesize the segments of a request one by one.
+
+        Yields (index, text, emotion, output_path, duration) as soon as each
+        segment has been written, so callers can stream partial results.
+        Raises InferenceCancelled once the RPC is no longer active (client
+        cancelled or deadline passed), checked between segments and at every
+        ODE step, and removes the segments written so far.
+
+        Each segment waits for its turn on the engine separately, so segments
+        of concurrent requests are interleaved by the fair scheduler. A
+        request with an emotion that has no reference voice is aborted with
+        INVALID_ARGUMENT before anything is synthesized.
+        """
         # self.generate_objects()
         self.make_key_file_pairs()
-        # Process each sentence with its emotion
-        i=0
-        all_outputs = []
-        for pair in request.segments:
-            sentence = pair.text
-            emotion = pair.emotion.lower()
-            print("Sentence: ",sentence,"\n Emotion ",emotion)
-            output_path = os.path.join(self.output_dir,f"{str(i)}.wav")
-            all_outputs.append(output_path)
-            print(f"Generating audio {output_path}")
-            self.audio_generator(emotion,sentence,output_path)
-            i+=1
-        #     pause = AudioSegment.silent(duration=500)
-            
-        #     # Append to our combined audio
-        #     combined_audio += audio_segment + pause
+        unknown = sorted({pair.emotion.lower() for pair in request.segments} - set(self.emotion_files_dict))
+        if unknown:
+            context.abort(
+                grpc.StatusCode.INVALID_ARGUMENT,
+                f"No reference voice for emotion(s) {', '.join(unknown)}; "
+                f"expected one of {', '.join(sorted(self.emotion_files_dict))}"
+            )
+        # Each request gets its own directory so concurrent requests don't overwrite segments
+        request_dir = os.path.join(self.output_dir, uuid.uuid4().hex)
+        os.makedirs(request_dir, exist_ok=True)
+        should_stop = lambda: not context.is_active()
+        try:
+            # Process each sentence with its emotion
+            for i, pair in enumerate(request.segments):
+                if should_stop():
+                    raise InferenceCancelled()
+                sentence = pair.text
+                emotion = pair.emotion.lower()
+                print("Sentence: ",sentence,"\n Emotion ",emotion)
+                output_path = os.path.join(request_dir,f"{str(i)}.wav")
+                print(f"Generating audio {output_path}")
+                duration = self.scheduled_audio_generator(request,emotion,sentence,output_path,should_stop)
+                yield i, sentence, emotion, output_path, duration
+        except InferenceCancelled:
+            print(f"Request cancelled, stopping synthesis and removing {request_dir}")
+            shutil.rmtree(request_dir, ignore_errors=True)
+            raise
 
+    def merge_request_output(self, all_outputs):
+        """Merge the segment files of a request into the final story audio"""
         # # Export the combined audio to a file
-        date_dir = datetime.now().strftime("%Y-%m-%d")
+        date_dir = os.path.join("generated_audio", datetime.now().strftime("%Y-%m-%d"))
         timestamp = datetime.now().strftime("%H%M%S")
-        final_output = f'{date_dir}/story_generated_{timestamp}.wav'
-        self.merge_audio_files(all_outputs,final_output)
+        os.makedirs(date_dir, exist_ok=True)
+        final_output = f'{date_dir}/story_generated_{timestamp}_{uuid.uuid4().hex[:8]}.wav'
+        with MERGE_DURATION.time(), TRACER.span("merge_segments", segments=len(all_outputs)):
+            duration = self.merge_audio_files(all_outputs,final_output)
+        if duration is None:
+            return audio_service_pb2.AudioResponse(success=0,error='Failed to merge audio segments')
+        
+        print(f"Audio generated and saved to {final_output} ({duration:.1f}s)")
+        return audio_service_pb2.AudioResponse(audio_file_path=final_output,success=1,error='None',duration=duration)
+
+    @instrument_rpc("GenerateAudio", RPC_DURATION, RPC_IN_FLIGHT, RPC_ERRORS)
+    @trace_rpc(TRACER, "GenerateAudio")
+    def GenerateAudio(self, request, context):
+        print(f"Received request to generate audio for {len(request.segments)} sentences")
+        
+        try:
+            all_outputs = [
+                output_path for _, _, _, output_path, _ in self.synthesize_segments(request, context)
+            ]
+        except InferenceCancelled:
+            RPC_CANCELLED.labels("GenerateAudio").inc()
+            # Nobody is waiting for this response any more
+            return audio_service_pb2.AudioResponse(success=0,error='Cancelled')
+        return self.merge_request_output(all_outputs)
+
+    @instrument_rpc("GenerateAudioStream", RPC_DURATION, RPC_IN_FLIGHT, RPC_ERRORS)
+    @trace_rpc(TRACER, "GenerateAudioStream")
+    def GenerateAudioStream(self, request, context):
+        print(f"Received request to stream audio for {len(request.segments)} sentences")
+        
+        all_outputs = []
+        try:
+            for index, sentence, emotion, output_path, duration in self.synthesize_segments(request, context):
+                all_outputs.append(output_path)
+                with open(output_path, "rb") as f:
+                    audio_data = f.read()
+                yield audio_service_pb2.AudioStreamResponse(
+                    segment=audio_service_pb2.AudioSegment(
+                        index=index,
+                        text=sentence,
+                        emotion=emotion,
+                        audio_file_path=output_path,
+                        audio_data=audio_data,
+                        duration=duration
+                    )
+                )
+        except InferenceCancelled:
+            RPC_CANCELLED.labels("GenerateAudioStream").inc()
+            return
         
-        print(f"Audio generated and saved to {final_output}")
-        return audio_service_pb2.AudioResponse(audio_file_path=final_output,success=1,error='None')
+        if request.segments_only:
+            # The caller holds the other segments of the story and merges them itself
+            return
+        yield audio_service_pb2.AudioStreamResponse(merged=self.merge_request_output(all_outputs))
 
 
 def serve():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10), options=SERVER_KEEPALIVE_OPTIONS)
     reference_audio_folder = f"reference_audios\\emotion"
     output_dir = "output_audios"
     os.makedirs(output_dir,exist_ok=True)
-    audio_service_pb2_grpc.add_AudioGeneratorServicer_to_server(
-        AudioGeneratorServicer(reference_audio_folder,output_dir), server)
-    server.add_insecure_port('[::]:50052')
+    servicer = AudioGeneratorServicer(reference_audio_folder,output_dir)
+    audio_service_pb2_grpc.add_AudioGeneratorServicer_to_server(servicer, server)
+    health_servicer = add_health_servicer(server, SERVICE_NAME)
+    server.add_insecure_port(f'[::]:{PORT}')
     server.start()
-    print("Audio Generator Server started on port 50052...")
+    print(f"Audio Generator Server started on port {PORT}...")
+    start_metrics_server(METRICS_PORT)
+    warm_up(servicer.warmup if WARMUP else None, health_servicer, SERVICE_NAME)
     try:
         while True:
             time.sleep(86400)  # One day in seconds
     except KeyboardInterrupt:
+        health_servicer.enter_graceful_shutdown()
         server.stop(0)
 
 
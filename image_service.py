@@ -1,4 +1,5 @@
 import grpc
+import logging
 import time
 import os
 import uuid
@@ -6,6 +7,30 @@ from concurrent import futures
 from proto_files import image_service_pb2
 from proto_files import image_service_pb2_grpc
 from diffusers import StableDiffusionPipeline, DPMSolverMultistepScheduler
+from prometheus_client import Counter, Gauge, Histogram
+from utils.metrics import DEFAULT_BUCKETS, instrument_rpc, start_metrics_server
+from utils.tracing import create_tracer, trace_rpc
+from utils.channel_pool import SERVER_KEEPALIVE_OPTIONS
+from utils.health import add_health_servicer, warm_up
+
+# Shows the metrics and health logs of utils next to the prints of this service
+logging.basicConfig(level=logging.INFO)
+
+# gRPC port; run more replicas on one box by giving each its own port
+PORT = int(os.getenv("IMAGE_SERVICE_PORT", "50053"))
+# Name reported to gRPC health checks; set IMAGE_SERVICE_WARMUP=0 to report SERVING without warming up first
+SERVICE_NAME = image_service_pb2.DESCRIPTOR.services_by_name["ImageGenerator"].full_name
+WARMUP = os.getenv("IMAGE_SERVICE_WARMUP", "1") == "1"
+
+# Prometheus metrics, served on METRICS_PORT
+METRICS_PORT = int(os.getenv("IMAGE_SERVICE_METRICS_PORT", "9103"))
+RPC_DURATION = Histogram("image_service_rpc_duration_seconds", "Latency of ImageGenerator RPCs", ["method"], buckets=DEFAULT_BUCKETS)
+RPC_IN_FLIGHT = Gauge("image_service_rpc_in_flight", "ImageGenerator RPCs currently being handled", ["method"])
+RPC_ERRORS = Counter("image_service_rpc_errors_total", "ImageGenerator RPCs that raised an error", ["method"])
+IMAGE_DURATION = Histogram("image_service_image_seconds", "Time to generate and save one scene image", buckets=DEFAULT_BUCKETS)
+
+# Spans are continued from the traceparent sent by the orchestrator
+TRACER = create_tracer("image_service")
 
 
 # This is a mock image generation service. In a real implementation,
@@ -22,13 +47,24 @@ class ImageGenerator:
     
     
     def generate_image(self, prompt):       
-        image = self.pipe(prompt).images[0]
+        with TRACER.span("diffusion"):
+            image = self.pipe(prompt).images[0]
+        image_path = os.path.join("generated_images", f"scene_{uuid.uuid4().hex}.png")
+        with TRACER.span("file_write"):
+            image.save(image_path)
+        return image_path
 
 
 class ImageGeneratorServicer(image_service_pb2_grpc.ImageGeneratorServicer):
     def __init__(self):
         self.image_generator = ImageGenerator()
     
+    def warmup(self):
+        """A short diffusion run, so the first scene does not pay for CUDA kernel selection and allocator growth"""
+        self.image_generator.pipe("a quiet landscape", num_inference_steps=2)
+    
+    @instrument_rpc("GenerateImages", RPC_DURATION, RPC_IN_FLIGHT, RPC_ERRORS)
+    @trace_rpc(TRACER, "GenerateImages")
     def GenerateImages(self, request, context):
         print(f"Received request to generate images for {len(request.scenes)} scenes")
         
@@ -36,35 +72,38 @@ class ImageGeneratorServicer(image_service_pb2_grpc.ImageGeneratorServicer):
         
         # Process each scene prompt
         for i, scene in enumerate(request.scenes):
-            prompt = scene.prompt
-            start_line = scene.start_line
-            end_line = scene.end_line
+            prompt = scene.image_prompt
             
-            print(f"Generating image for scene {i+1} (lines {start_line}-{end_line})")
+            print(f"Generating image for scene {scene.scene_number}")
             
             # Generate image for this scene
-            image_path = self.image_generator.generate_image(prompt)
+            with IMAGE_DURATION.time(), TRACER.span("generate_image", scene_number=scene.scene_number):
+                image_path = self.image_generator.generate_image(prompt)
             
             # Add to our list of generated images
             generated_images.append(image_service_pb2.GeneratedImage(
-                scene_index=i,
-                image_file_path=image_path
+                scene_number=scene.scene_number,
+                image_path=image_path
             ))
         
-        return image_service_pb2.ImageResponse(images=generated_images)
+        return image_service_pb2.ImageResponse(images=generated_images, success=1, error='none')
 
 
 def serve():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    image_service_pb2_grpc.add_ImageGeneratorServicer_to_server(
-        ImageGeneratorServicer(), server)
-    server.add_insecure_port('[::]:50053')
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10), options=SERVER_KEEPALIVE_OPTIONS)
+    servicer = ImageGeneratorServicer()
+    image_service_pb2_grpc.add_ImageGeneratorServicer_to_server(servicer, server)
+    health_servicer = add_health_servicer(server, SERVICE_NAME)
+    server.add_insecure_port(f'[::]:{PORT}')
     server.start()
-    print("Image Generator Server started on port 50053...")
+    print(f"Image Generator Server started on port {PORT}...")
+    start_metrics_server(METRICS_PORT)
+    warm_up(servicer.warmup if WARMUP else None, health_servicer, SERVICE_NAME)
     try:
         while True:
             time.sleep(86400)  # One day in seconds
     except KeyboardInterrupt:
+        health_servicer.enter_graceful_shutdown()
         server.stop(0)
 
 
@@ -1,13 +1,21 @@
 import argparse
+import asyncio
+import base64
+import contextvars
+import copy
 import logging
+import math
 import time
 import os
+import uuid
 import json
-from typing import Dict, List, Optional, Any, Union
+from datetime import datetime
+from contextlib import aclosing, asynccontextmanager
+from typing import Dict, List, Optional, Any, Tuple, Union
 
 import grpc.aio
 from fastapi import FastAPI, HTTPException, Request, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
 import uvicorn
 
@@ -18,6 +26,21 @@ from proto_files import audio_service_pb2
 from proto_files import audio_service_pb2_grpc
 from proto_files import image_service_pb2
 from proto_files import image_service_pb2_grpc
+from utils.file_server import file_response, file_url, resolve_served_file
+from utils.result_cache import ResultCache, make_cache_key
+from utils.singleflight import SingleFlight
+from utils.admission import AdmissionController, AdmissionRejected, background_work
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from utils.metrics import DEFAULT_BUCKETS, BusyClock
+from utils.tracing import SpanContext, create_tracer, current_traceparent, outgoing_metadata
+from utils.channel_pool import ChannelPool, parse_endpoints
+from utils.utils import merge_wav_data, wav_duration
+from utils.jobs import Job, JobManager, JobQueueFullError, JOB_FAILED, JOB_SUCCEEDED
+from utils.job_store import JobCheckpoints, JobStore
+from utils.fair_scheduler import DEFAULT_TENANT, PRIORITY_BATCH, PRIORITY_INTERACTIVE
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from utils.hedging import LatencyTracker, hedge
+from utils.idempotency import MAX_KEY_LENGTH, IdempotencyConflictError, IdempotentRuns
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -27,16 +50,167 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="Story to Audio Orchestration Service",
     description="An API that orchestrates story generation, audio synthesis, and image creation services",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson encodes the larger responses (sentences, scenes, job lists) several times faster
+    default_response_class=ORJSONResponse
 )
 
-# Global flag to determine if image generation should be enabled
-ENABLE_IMAGE_GENERATION = False
+# Global flag to determine if image generation should be enabled (set by main() through the
+# environment, so it reaches the reloaded or worker processes)
+ENABLE_IMAGE_GENERATION = os.getenv("STORY2AUDIO_ENABLE_IMAGES", "0") == "1"
 
-# Global stubs for gRPC services
-story_stub = None
-audio_stub = None
-image_stub = None
+# Server processes started by main() in production mode. Each process has its own channels,
+# admission limits and job workers, so the limits below are shared out between them.
+SERVER_WORKERS = int(os.getenv("STORY2AUDIO_WORKERS", "1"))
+
+# Scene prompts are requested on this normalized timeline and rescaled to the audio duration
+SCENE_TIMELINE_SCALE = 100
+
+# Directories that /files is allowed to serve from
+FILE_ROOTS = os.getenv(
+    "STORY2AUDIO_FILE_ROOTS",
+    os.pathsep.join(["generated_audio", "output_audios", "generated_images", "result_cache"])
+).split(os.pathsep)
+FILE_CACHE_MAX_AGE = int(os.getenv("STORY2AUDIO_FILE_CACHE_MAX_AGE", "86400"))
+
+# Result cache settings
+RESULT_CACHE_ENABLED = os.getenv("STORY2AUDIO_CACHE_ENABLED", "1") == "1"
+RESULT_CACHE_DIR = os.getenv("STORY2AUDIO_CACHE_DIR", "result_cache")
+RESULT_CACHE_MAX_MB = int(os.getenv("STORY2AUDIO_CACHE_MAX_MB", "1024"))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("STORY2AUDIO_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Emotions the audio service has a reference voice for (emotion.zip); edits to other emotions are rejected
+EMOTIONS = os.getenv("STORY2AUDIO_EMOTIONS", "angry,calm,disgust,fear,happy,neutral,sad,surprise").split(",")
+
+# Voice and synthesis settings that change the generated audio (part of the cache key)
+SYNTHESIS_PARAMS = {
+    "voice_set": os.getenv("STORY2AUDIO_VOICE_SET", "default"),
+    "speed": 0.8  # Must match the speed used by AudioGeneratorServicer.audio_generator
+}
+
+# Admission control: concurrent calls per downstream stage, wait queue size and max wait.
+# TTS and image limits are per replica of the audio / image service, for all server workers together.
+LLM_CONCURRENCY = int(os.getenv("STORY2AUDIO_LLM_CONCURRENCY", "4"))
+# Several TTS requests per replica so its fair scheduler can interleave their segments
+TTS_CONCURRENCY = int(os.getenv("STORY2AUDIO_TTS_CONCURRENCY", "4"))
+IMAGE_CONCURRENCY = int(os.getenv("STORY2AUDIO_IMAGE_CONCURRENCY", "1"))
+STAGE_MAX_QUEUE = int(os.getenv("STORY2AUDIO_STAGE_MAX_QUEUE", "10"))
+STAGE_MAX_QUEUE_SECONDS = float(os.getenv("STORY2AUDIO_STAGE_MAX_QUEUE_SECONDS", "300"))
+
+# Replicas of each gRPC service (comma separated host:port); calls go to the least loaded one
+STORY_ENDPOINTS = parse_endpoints(os.getenv("STORY2AUDIO_STORY_ENDPOINTS", "localhost:50051"))
+AUDIO_ENDPOINTS = parse_endpoints(os.getenv("STORY2AUDIO_AUDIO_ENDPOINTS", "localhost:50052"))
+IMAGE_ENDPOINTS = parse_endpoints(os.getenv("STORY2AUDIO_IMAGE_ENDPOINTS", "localhost:50053"))
+# Circuit breaker per replica: failures in a row that open it and how long it stays open before probing
+ENDPOINT_MAX_FAILURES = int(os.getenv("STORY2AUDIO_ENDPOINT_MAX_FAILURES", "3"))
+ENDPOINT_EJECTION_SECONDS = float(os.getenv("STORY2AUDIO_ENDPOINT_EJECTION_SECONDS", "30"))
+# It also opens when, out of at least BREAKER_MIN_CALLS calls in the window, the share of
+# failed calls or of calls slower than the service's slow call threshold reaches the limit
+BREAKER_WINDOW_SECONDS = float(os.getenv("STORY2AUDIO_BREAKER_WINDOW_SECONDS", "120"))
+BREAKER_MIN_CALLS = int(os.getenv("STORY2AUDIO_BREAKER_MIN_CALLS", "5"))
+BREAKER_FAILURE_RATE = float(os.getenv("STORY2AUDIO_BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_SLOW_CALL_RATE = float(os.getenv("STORY2AUDIO_BREAKER_SLOW_CALL_RATE", "0.5"))
+SLOW_CALL_SECONDS = {
+    "story": float(os.getenv("STORY2AUDIO_STORY_SLOW_CALL_SECONDS", "60")),
+    "audio": float(os.getenv("STORY2AUDIO_AUDIO_SLOW_CALL_SECONDS", "600")),
+    "image": float(os.getenv("STORY2AUDIO_IMAGE_SLOW_CALL_SECONDS", "300")),
+}
+# Hedge story service calls on a second replica once they are slower than the recent p95
+LLM_HEDGING = os.getenv("STORY2AUDIO_LLM_HEDGING", "0") == "1"
+HEDGE_QUANTILE = 0.95
+HEDGE_MIN_DELAY_SECONDS = float(os.getenv("STORY2AUDIO_HEDGE_MIN_DELAY_SECONDS", "2"))
+# Have the LLM write the story already split into sentences with emotions (one call instead of
+# GenerateStory followed by ProcessStoryEmotions)
+SEGMENTED_STORY = os.getenv("STORY2AUDIO_SEGMENTED_STORY", "1") == "1"
+# A replica that answered UNIMPLEMENTED for an optional RPC is not asked for it again for this long
+# (it may be upgraded in the meantime)
+UNIMPLEMENTED_RECHECK_SECONDS = float(os.getenv("STORY2AUDIO_UNIMPLEMENTED_RECHECK_SECONDS", "300"))
+# With several audio replicas, segments go to the replica that owns their reference voice
+# unless it already has this many calls in flight
+VOICE_AFFINITY_MAX_OUTSTANDING = int(os.getenv("STORY2AUDIO_VOICE_AFFINITY_MAX_OUTSTANDING", "1"))
+
+# End-to-end time budget of one request; every gRPC call gets the remaining time as its deadline
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("STORY2AUDIO_REQUEST_TIMEOUT_SECONDS", "900"))
+# How often a waiting /story-to-audio request checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = 1.0
+
+# Background job settings (environment so they survive uvicorn reloads)
+JOB_WORKERS = int(os.getenv("STORY2AUDIO_JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("STORY2AUDIO_JOB_QUEUE_SIZE", "100"))
+JOB_RETENTION_SECONDS = float(os.getenv("STORY2AUDIO_JOB_RETENTION_SECONDS", "3600"))
+# Durable job store; a crashed job is resumed from its checkpoints once its lease expires
+JOB_STORE_DIR = os.getenv("STORY2AUDIO_JOB_STORE_DIR", "job_store")
+JOB_LEASE_SECONDS = float(os.getenv("STORY2AUDIO_JOB_LEASE_SECONDS", "30"))
+JOB_MAX_ATTEMPTS = int(os.getenv("STORY2AUDIO_JOB_MAX_ATTEMPTS", "3"))
+# How long an Idempotency-Key maps to the job or result made for it
+IDEMPOTENCY_WINDOW_SECONDS = float(os.getenv("STORY2AUDIO_IDEMPOTENCY_WINDOW_SECONDS", "3600"))
+# Largest number of stories accepted in one batch submission
+BATCH_MAX_ITEMS = int(os.getenv("STORY2AUDIO_BATCH_MAX_ITEMS", "50"))
+
+# Prometheus metrics served on /metrics
+HTTP_DURATION = Histogram("story2audio_http_request_duration_seconds", "Latency of orchestrator HTTP requests", ["path", "method", "status"], buckets=DEFAULT_BUCKETS)
+HTTP_IN_FLIGHT = Gauge("story2audio_http_requests_in_flight", "Orchestrator HTTP requests currently being handled")
+ORCHESTRATOR_OVERHEAD = Histogram(
+    "story2audio_orchestrator_overhead_seconds",
+    "Time of HTTP requests not spent waiting on downstream services (stage slots and gRPC calls)",
+    ["path"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+DOWNSTREAM_DURATION = Histogram("story2audio_downstream_duration_seconds", "Latency of downstream gRPC calls as seen by the orchestrator", ["method"], buckets=DEFAULT_BUCKETS)
+DOWNSTREAM_IN_FLIGHT = Gauge("story2audio_downstream_in_flight", "Downstream gRPC calls currently in flight", ["method"])
+DOWNSTREAM_ERRORS = Counter("story2audio_downstream_errors_total", "Downstream gRPC calls that failed", ["method"])
+STAGE_QUEUED = Gauge("story2audio_stage_queued", "Calls waiting for a stage slot", ["stage"])
+STAGE_IN_FLIGHT = Gauge("story2audio_stage_in_flight", "Calls holding a stage slot", ["stage"])
+STAGE_REJECTED = Counter("story2audio_stage_rejected_total", "Calls rejected or timed out by stage admission control", ["stage"])
+CACHE_LOOKUPS = Counter("story2audio_result_cache_lookups_total", "Result cache lookups", ["result"])
+ENDPOINT_OUTSTANDING = Gauge("story2audio_endpoint_outstanding", "Calls in flight to one replica of a gRPC service", ["service", "endpoint"])
+ENDPOINT_EJECTED = Gauge("story2audio_endpoint_ejected", "1 while the circuit breaker of a replica is open", ["service", "endpoint"])
+DOWNSTREAM_HEDGES = Counter("story2audio_downstream_hedges_total", "Downstream calls that were hedged on a second replica", ["method"])
+
+# Request traces; the trace context is passed on to the gRPC services as metadata
+TRACER = create_tracer("orchestrator")
+
+# Global load-balanced channel pools of the gRPC services
+story_pool = None
+audio_pool = None
+image_pool = None
+
+# Global background job manager
+job_manager = None
+
+# Global per-stage admission control
+admission = None
+
+# Global whole-request result cache
+result_cache = None
+
+# Identical requests currently being processed, keyed by their cache key
+inflight_requests = SingleFlight()
+
+# /story-to-audio runs of requests with an Idempotency-Key, reattached to by retries
+idempotent_runs = IdempotentRuns(IDEMPOTENCY_WINDOW_SECONDS)
+IDEMPOTENCY_HEADER = "idempotency-key"
+# Set on responses that were answered for an earlier request with the same key
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# time.monotonic() by which the current request must finish, None for no deadline
+request_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+# Recent latencies of the story service methods, the basis of the hedging delay
+llm_latencies: Dict[str, LatencyTracker] = {}
+
+# method -> {replica address: time.monotonic() when it answered UNIMPLEMENTED}
+unimplemented_rpcs: Dict[str, Dict[str, float]] = {}
+
+# Checkpoints of the background job being run, None outside of jobs
+job_checkpoints = contextvars.ContextVar("job_checkpoints", default=None)
+
+# Time the current HTTP request has spent waiting on downstream services, None outside of requests
+request_downstream_clock = contextvars.ContextVar("request_downstream_clock", default=None)
+
+# Tenant the current request is made for (X-Tenant-ID header); the audio service shares TTS fairly between tenants
+request_tenant = contextvars.ContextVar("request_tenant", default=DEFAULT_TENANT)
+TENANT_HEADER = b"x-tenant-id"
 
 # Define data models for API requests and responses
 class StoryRequest(BaseModel):
@@ -51,66 +225,276 @@ class HealthResponse(BaseModel):
     status: str = "ok"
     service: str = "Story to Audio API"
     image_service_enabled: bool
+    ready: bool = False
     timestamp: float
+    stages: Dict[str, Dict[str, Any]] = {}
+    endpoints: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+class SceneInfo(BaseModel):
+    scene_number: int
+    start_time: Optional[float] = None
+    end_time: Optional[float] = None
+    image_prompt: str
+    image_path: Optional[str] = None
+    image_url: Optional[str] = None
 
 class StoryToAudioResponse(BaseModel):
     status: str = "success"
     story: str
     sentences: List[TextEmotionPair]
     audio_file_path: str
+    audio_url: Optional[str] = None
     image_paths: Optional[List[str]] = None
+    scenes: Optional[List[SceneInfo]] = None
 
 class ErrorResponse(BaseModel):
     status: str = "error"
     message: str
 
-# Initialize gRPC service stubs
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    status: str
+    status_url: str
+    result_url: str
+
+class SentenceEdit(BaseModel):
+    index: int = Field(..., ge=0, description="Position of the sentence in the previous result")
+    text: Optional[str] = Field(None, min_length=1, description="New text of the sentence, unchanged if omitted")
+    emotion: Optional[str] = Field(None, min_length=1, description="New emotion of the sentence, unchanged if omitted")
+
+class RerenderRequest(BaseModel):
+    edits: List[SentenceEdit] = Field(..., min_length=1, description="The sentences to change")
+
+class BatchStoryRequest(BaseModel):
+    items: List[StoryRequest] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS, description="The stories to generate")
+
+class BatchSubmitResponse(BaseModel):
+    batch_id: str
+    jobs: List[JobSubmitResponse]
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    batch_id: Optional[str] = None
+    status: str
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+def create_channel_pool(name: str, addresses: List[str], stub_class, service_descriptor) -> ChannelPool:
+    """Channel pool over the replicas of one service, with its health probe running"""
+    pool = ChannelPool(
+        name,
+        addresses,
+        stub_class,
+        health_service=service_descriptor.full_name,
+        breaker=lambda: CircuitBreaker(
+            window_seconds=BREAKER_WINDOW_SECONDS,
+            min_calls=BREAKER_MIN_CALLS,
+            failure_rate=BREAKER_FAILURE_RATE,
+            slow_call_seconds=SLOW_CALL_SECONDS[name],
+            slow_call_rate=BREAKER_SLOW_CALL_RATE,
+            max_consecutive_failures=ENDPOINT_MAX_FAILURES,
+            open_seconds=ENDPOINT_EJECTION_SECONDS
+        ),
+        max_affinity_outstanding=VOICE_AFFINITY_MAX_OUTSTANDING
+    )
+    pool.start()
+    logger.info(f"{name} service configured with {len(addresses)} replica(s): {', '.join(addresses)}")
+    return pool
+
+# Initialize gRPC service channel pools
 async def setup_grpc_services():
-    """Set up gRPC service stubs with async channels"""
-    global story_stub, audio_stub, image_stub
+    """Set up the channel pools of the gRPC services"""
+    global story_pool, audio_pool, image_pool
     
     logger.info("Setting up gRPC services...")
     
-    # Create async gRPC channels
-    story_channel = grpc.aio.insecure_channel('localhost:50051')
-    story_stub = story_service_pb2_grpc.StoryGeneratorStub(story_channel)
-    logger.info("Story generator service configured")
-    
-    audio_channel = grpc.aio.insecure_channel('localhost:50052')
-    audio_stub = audio_service_pb2_grpc.AudioGeneratorStub(audio_channel)
-    logger.info("Audio generator service configured")
+    story_pool = create_channel_pool(
+        "story", STORY_ENDPOINTS, story_service_pb2_grpc.StoryGeneratorStub,
+        story_service_pb2.DESCRIPTOR.services_by_name["StoryGenerator"]
+    )
+    audio_pool = create_channel_pool(
+        "audio", AUDIO_ENDPOINTS, audio_service_pb2_grpc.AudioGeneratorStub,
+        audio_service_pb2.DESCRIPTOR.services_by_name["AudioGenerator"]
+    )
     
     if ENABLE_IMAGE_GENERATION:
-        image_channel = grpc.aio.insecure_channel('localhost:50053')
-        image_stub = image_service_pb2_grpc.ImageGeneratorStub(image_channel)
-        logger.info("Image generation service enabled and configured")
+        image_pool = create_channel_pool(
+            "image", IMAGE_ENDPOINTS, image_service_pb2_grpc.ImageGeneratorStub,
+            image_service_pb2.DESCRIPTOR.services_by_name["ImageGenerator"]
+        )
     else:
         logger.info("Image generation service is disabled")
 
+def channel_pools() -> Dict[str, ChannelPool]:
+    """The configured channel pools by service name"""
+    pools = {"story": story_pool, "audio": audio_pool, "image": image_pool}
+    return {name: pool for name, pool in pools.items() if pool is not None}
+
+def worker_share(limit: int) -> int:
+    """This server process's part of a limit that holds for all SERVER_WORKERS together"""
+    return max(1, math.ceil(limit / SERVER_WORKERS))
+
 # FastAPI startup event
 @app.on_event("startup")
 async def startup_event():
     """Initialize services on startup"""
+    global job_manager, result_cache, admission
+    # Runs in every server process: gRPC channels cannot be carried across a fork, so each
+    # worker opens its own pools once and shares them between all of its requests
     await setup_grpc_services()
+    
+    admission = AdmissionController(
+        {
+            "llm": worker_share(LLM_CONCURRENCY),
+            "tts": worker_share(TTS_CONCURRENCY * len(audio_pool)),
+            "image": worker_share(IMAGE_CONCURRENCY * (len(image_pool) if image_pool is not None else 1))
+        },
+        max_queue=worker_share(STAGE_MAX_QUEUE),
+        max_queue_seconds=STAGE_MAX_QUEUE_SECONDS,
+        on_reject=lambda stage: STAGE_REJECTED.labels(stage).inc()
+    )
+    
+    if RESULT_CACHE_ENABLED:
+        result_cache = ResultCache(
+            RESULT_CACHE_DIR,
+            max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024,
+            ttl_seconds=RESULT_CACHE_TTL_SECONDS,
+            on_lookup=lambda result: CACHE_LOOKUPS.labels(result).inc()
+        )
+    
+    job_manager = JobManager(
+        run_job_pipeline,
+        JobStore(JOB_STORE_DIR),
+        num_workers=worker_share(JOB_WORKERS),
+        max_queue_size=JOB_QUEUE_SIZE,
+        retention_seconds=JOB_RETENTION_SECONDS,
+        lease_seconds=JOB_LEASE_SECONDS,
+        max_attempts=JOB_MAX_ATTEMPTS,
+        batch_pipeline=run_batch_pipeline,
+        idempotency_seconds=IDEMPOTENCY_WINDOW_SECONDS
+    )
+    job_manager.start()
 
 # FastAPI shutdown event
 @app.on_event("shutdown")
 async def shutdown_event():
     """Clean up resources on shutdown"""
     logger.info("Shutting down services...")
-    # Close channels if needed
+    if job_manager is not None:
+        await job_manager.stop()
+        job_manager.store.close()
+    if result_cache is not None:
+        await asyncio.to_thread(result_cache.close)
+    for pool in channel_pools().values():
+        await pool.close()
 
 # Health check endpoint
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
-    """Simple health check endpoint"""
+    """
+    Health check endpoint, including queue depth and wait time per stage
+
+    `ready` aggregates the gRPC health of the downstream services: it is
+    true once every service has at least one replica reporting SERVING.
+    """
     return {
         "status": "ok",
         "service": "Story to Audio API",
         "image_service_enabled": ENABLE_IMAGE_GENERATION,
-        "timestamp": time.time()
+        "ready": services_ready(),
+        "timestamp": time.time(),
+        "stages": admission.stats() if admission is not None else {},
+        "endpoints": {name: pool.stats() for name, pool in channel_pools().items()}
     }
 
+# Readiness endpoint for load balancers and start scripts
+@app.get("/ready")
+async def readiness_check():
+    """200 once every downstream service has a warm replica, 503 before that"""
+    pools = channel_pools()
+    services = {name: pool.ready() for name, pool in pools.items()}
+    status_code = 200 if services and all(services.values()) else 503
+    return JSONResponse(status_code=status_code, content={"ready": status_code == 200, "services": services})
+
+def services_ready() -> bool:
+    pools = channel_pools()
+    return bool(pools) and all(pool.ready() for pool in pools.values())
+
+# Prometheus metrics endpoint
+@app.get("/metrics")
+async def metrics():
+    """Export orchestrator metrics in the Prometheus text format"""
+    if admission is not None:
+        for stage, stats in admission.stats().items():
+            STAGE_QUEUED.labels(stage).set(stats["queued"])
+            STAGE_IN_FLIGHT.labels(stage).set(stats["in_flight"])
+    for name, pool in channel_pools().items():
+        for address, stats in pool.stats().items():
+            ENDPOINT_OUTSTANDING.labels(name, address).set(stats["outstanding"])
+            ENDPOINT_EJECTED.labels(name, address).set(1 if stats["ejected"] else 0)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+class RequestObservabilityMiddleware:
+    """
+    Record metrics and a server span for every HTTP request
+
+    Written as a plain ASGI middleware: Starlette's BaseHTTPMiddleware
+    (@app.middleware("http")) hides client disconnects from the endpoints,
+    which /story-to-audio relies on to cancel abandoned work.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        # Continue the caller's trace if it sent a traceparent header
+        parent = SpanContext.from_traceparent(headers.get(b"traceparent", b"").decode("latin-1"))
+        tenant = headers.get(TENANT_HEADER, b"").decode("latin-1").strip()[:64]
+        if tenant:
+            request_tenant.set(tenant)
+        status = 500
+        downstream = BusyClock()
+        request_downstream_clock.set(downstream)
+
+        with TRACER.span(f"{scope['method']} {scope['path']}", parent=parent, kind="SERVER") as span:
+            async def send_with_trace_id(message):
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    elapsed = time.perf_counter() - start
+                    waited = downstream.elapsed()
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-trace-id", span.trace_id.encode("latin-1")),
+                        # Time spent on downstream services vs. in the orchestrator itself, in ms
+                        (b"server-timing", (
+                            f"downstream;dur={waited * 1000:.1f}, "
+                            f"orchestrator;dur={max(0.0, elapsed - waited) * 1000:.1f}"
+                        ).encode("latin-1"))
+                    ]
+                await send(message)
+
+            HTTP_IN_FLIGHT.inc()
+            start = time.perf_counter()
+            try:
+                await self.app(scope, receive, send_with_trace_id)
+            finally:
+                # Label with the route template so /jobs/{job_id} is one series, not one per job
+                route = scope.get("route")
+                template = route.path if route is not None else "unmatched"
+                duration = time.perf_counter() - start
+                HTTP_IN_FLIGHT.dec()
+                HTTP_DURATION.labels(template, scope["method"], status).observe(duration)
+                ORCHESTRATOR_OVERHEAD.labels(template).observe(max(0.0, duration - downstream.elapsed()))
+
+app.add_middleware(RequestObservabilityMiddleware)
+
 # Echo endpoint for testing
 @app.post("/echo")
 async def echo(request: Request):
@@ -125,110 +509,1015 @@ async def echo(request: Request):
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error processing request: {str(e)}")
 
-# Main endpoint to convert storyline to audio
-@app.post("/story-to-audio", response_model=StoryToAudioResponse)
-async def story_to_audio(story_request: StoryRequest):
+@asynccontextmanager
+async def downstream_call(stage: str, method: str, pool: ChannelPool, affinity_key: Optional[str] = None,
+                          tried: Optional[List] = None):
     """
-    Convert a storyline and genre into an audio story
-    
-    This endpoint orchestrates:
-    1. Story generation based on storyline and genre
-    2. Emotion analysis of the story
-    3. Audio generation with appropriate emotions
-    4. (Optional) Image generation for key scenes
+    Wrap one downstream gRPC call
+
+    Holds a slot of the stage's admission limiter, picks a replica from the
+    service's channel pool (the least loaded one, or the one owning
+    affinity_key when given), records latency, in-flight count
+    and errors of the call and opens a client span. Yields the replica's stub
+    and the keyword arguments for the stub call: the gRPC metadata that
+    carries the trace context and the time left until the request deadline.
+
+    tried holds the replicas used by other attempts of the same call
+    (hedging); they are avoided if possible and the chosen one is added.
+    The call, including the wait for a stage slot, counts as downstream
+    time of the HTTP request.
     """
+    clock = request_downstream_clock.get()
+    if clock is not None:
+        clock.start()
     try:
-        storyline = story_request.storyline
-        genre = story_request.genre
-        
-        # Step 1: Generate the story
-        logger.info(f"Generating {genre} story...")
-        story_response = await story_stub.GenerateStory(
-            story_service_pb2.StoryRequest(storyline=storyline, genre=genre)
+        with TRACER.span(method, kind="CLIENT", stage=stage):
+            async with admission[stage].slot():
+                timeout = None
+                deadline = request_deadline.get()
+                if deadline is not None:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        raise HTTPException(status_code=504, detail=f"Request deadline exceeded before {method}")
+                async with pool.endpoint(affinity_key, avoid=tried or ()) as endpoint:
+                    if tried is not None:
+                        tried.append(endpoint)
+                    DOWNSTREAM_IN_FLIGHT.labels(method).inc()
+                    start = time.perf_counter()
+                    try:
+                        yield endpoint.stub, {"metadata": outgoing_metadata(), "timeout": timeout}
+                    except Exception:
+                        DOWNSTREAM_ERRORS.labels(method).inc()
+                        raise
+                    finally:
+                        DOWNSTREAM_IN_FLIGHT.labels(method).dec()
+                        DOWNSTREAM_DURATION.labels(method).observe(time.perf_counter() - start)
+    finally:
+        if clock is not None:
+            clock.stop()
+
+async def llm_call(method: str, request):
+    """
+    Unary call to the story service
+
+    The story service's RPCs have no side effects, so with LLM_HEDGING and
+    several replicas a call that is still running after the recent p95
+    latency of its method is sent to a second replica as well, and a call
+    that fails with UNAVAILABLE is retried there right away. The first
+    response wins and the other call is cancelled.
+    """
+    tracker = llm_latencies.setdefault(method, LatencyTracker())
+    # Replicas known to lack the method are avoided if possible
+    tried = unimplemented_endpoints(method, story_pool)
+
+    async def attempt():
+        async with downstream_call("llm", method, story_pool, tried=tried) as (stub, call_options):
+            endpoint = tried[-1]
+            start = time.perf_counter()
+            try:
+                response = await getattr(stub, method)(request, **call_options)
+            except grpc.aio.AioRpcError as rpc_error:
+                if rpc_error.code() == grpc.StatusCode.UNIMPLEMENTED:
+                    mark_unimplemented(method, endpoint)
+                raise
+        tracker.observe(time.perf_counter() - start)
+        return response
+
+    if not LLM_HEDGING or len(story_pool) < 2:
+        return await attempt()
+    p95 = tracker.quantile(HEDGE_QUANTILE)
+    return await hedge(
+        attempt,
+        delay=max(p95, HEDGE_MIN_DELAY_SECONDS) if p95 is not None else None,
+        retriable=lambda e: isinstance(e, grpc.aio.AioRpcError) and e.code() == grpc.StatusCode.UNAVAILABLE,
+        on_hedge=DOWNSTREAM_HEDGES.labels(method).inc
+    )
+
+def mark_unimplemented(method: str, endpoint):
+    """Remember that a replica answered UNIMPLEMENTED for method"""
+    if endpoint.address not in unimplemented_rpcs.setdefault(method, {}):
+        logger.warning(f"{endpoint.address} does not implement {method}")
+    unimplemented_rpcs[method][endpoint.address] = time.monotonic()
+
+def unimplemented_endpoints(method: str, pool: ChannelPool) -> List[Any]:
+    """Replicas of pool that answered UNIMPLEMENTED for method in the last UNIMPLEMENTED_RECHECK_SECONDS"""
+    marked = unimplemented_rpcs.get(method, {})
+    now = time.monotonic()
+    return [
+        endpoint for endpoint in pool.endpoints
+        if now - marked.get(endpoint.address, -math.inf) < UNIMPLEMENTED_RECHECK_SECONDS
+    ]
+
+def implements(method: str, pool: ChannelPool) -> bool:
+    """Whether some replica of pool may implement method, so it is worth calling"""
+    return len(unimplemented_endpoints(method, pool)) < len(pool)
+
+def voice_key(emotion: str) -> str:
+    """Affinity key of a segment: the reference voice the audio service clones for it"""
+    return f"{SYNTHESIS_PARAMS['voice_set']}/{emotion.lower()}"
+
+def plan_audio_requests(sentences, indexes: List[int]) -> List[Tuple[str, List[int]]]:
+    """
+    Split segments of a story by the audio replica that owns their voice
+
+    Returns one (affinity key, segment indexes) pair per replica, so each
+    replica gets a single request with all the segments it is warm for.
+    """
+    groups: Dict[str, Tuple[str, List[int]]] = {}
+    for index in indexes:
+        key = voice_key(sentences[index].emotion)
+        _, group_indexes = groups.setdefault(audio_pool.owner(key).address, (key, []))
+        group_indexes.append(index)
+    return list(groups.values())
+
+def audio_scheduling() -> Dict[str, str]:
+    """
+    Scheduling fields of an AudioRequest
+
+    Background work (jobs and batches) is sent as the batch class, so the
+    audio service keeps serving interactive requests in between its segments.
+    """
+    return {
+        "priority": PRIORITY_BATCH if background_work.get() else PRIORITY_INTERACTIVE,
+        "tenant": request_tenant.get()
+    }
+
+async def stream_replica_segments(key: str, indexes: List[int], sentences, queue: asyncio.Queue):
+    """
+    Synthesize the given segments on the replica chosen for key
+
+    Puts (story index, AudioSegment) on the queue for every segment, then
+    (None, None) when done or (None, exception) if the call failed.
+    """
+    audio_request = audio_service_pb2.AudioRequest(
+        segments=[
+            audio_service_pb2.TextEmotion(text=sentences[index].text, emotion=sentences[index].emotion)
+            for index in indexes
+        ],
+        segments_only=True,
+        **audio_scheduling()
+    )
+    try:
+        async with downstream_call("tts", "GenerateAudioStream", audio_pool, affinity_key=key) as (stub, call_options):
+            audio_call = stub.GenerateAudioStream(audio_request, **call_options)
+            try:
+                async for response in audio_call:
+                    await queue.put((indexes[response.segment.index], response.segment))
+            finally:
+                audio_call.cancel()
+    except Exception as e:
+        await queue.put((None, e))
+    else:
+        await queue.put((None, None))
+
+async def synthesize_routed_segments(sentences, indexes: Optional[List[int]] = None):
+    """
+    Synthesize a story on several audio replicas, routed by voice affinity
+
+    Every replica keeps the preprocessed reference audio of the voices it
+    has used, so sending each voice to the same replica avoids redoing that
+    work. The replicas run in parallel; segments are yielded as
+    (index, AudioSegment) in story order. The first failure is raised and
+    cancels the other replicas' calls. indexes limits the work to some of
+    the segments (default: all of them).
+    """
+    if indexes is None:
+        indexes = list(range(len(sentences)))
+    queue = asyncio.Queue()
+    tasks = [
+        asyncio.create_task(stream_replica_segments(key, group_indexes, sentences, queue))
+        for key, group_indexes in plan_audio_requests(sentences, indexes)
+    ]
+    running = len(tasks)
+    received = {}
+    try:
+        for index in indexes:
+            while index not in received:
+                if running == 0:
+                    raise RuntimeError(f"Audio replicas finished without producing segment {index}")
+                segment_index, item = await queue.get()
+                if segment_index is not None:
+                    received[segment_index] = item
+                elif item is None:
+                    running -= 1
+                else:
+                    raise item
+            yield index, received.pop(index)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def synthesize_stories(stories: Dict[str, Tuple[Any, Optional[JobCheckpoints]]]) -> Dict[str, Tuple[str, float]]:
+    """
+    Synthesize stories segment by segment and merge them in the orchestrator
+
+    stories maps a key to the story's sentences and, for jobs, its
+    checkpoints. The segments of all stories form one workload that is
+    split over the audio replicas by voice. For jobs, each segment is
+    written to the job store and checkpointed as soon as it arrives, and
+    segments checkpointed by an earlier attempt are not synthesized again.
+
+    Returns the merged audio file and duration of every story.
+    """
+    audio_data: Dict[str, Dict[int, bytes]] = {}
+    all_sentences, owners, missing = [], [], []
+    for key, (sentences, checkpoints) in stories.items():
+        audio_data[key] = load_checkpointed_segments(sentences, checkpoints)
+        for index, pair in enumerate(sentences):
+            if index not in audio_data[key]:
+                missing.append(len(all_sentences))
+            all_sentences.append(pair)
+            owners.append((key, index))
+    
+    if missing:
+        async with aclosing(synthesize_routed_segments(all_sentences, missing)) as routed_segments:
+            async for flat_index, segment in routed_segments:
+                key, index = owners[flat_index]
+                audio_data[key][index] = segment.audio_data
+                checkpoints = stories[key][1]
+                if checkpoints is not None:
+                    await checkpoints.save_file(f"segment/{index}", f"segment_{index}.wav", segment.audio_data)
+    
+    merged = {}
+    for key, (sentences, _) in stories.items():
+        merged[key] = await asyncio.to_thread(
+            merge_story_segments, [audio_data[key][index] for index in range(len(sentences))]
         )
-        story = story_response.story
-        logger.info(f"Story generated successfully ({len(story)} characters)")
-        
-        # Step 2: Process story emotions
-        logger.info("Processing story emotions...")
-        process_request = story_service_pb2.ProcessRequest(story=story)
-        emotion_response = await story_stub.ProcessStoryEmotions(process_request)
-        sentences = emotion_response.sentences
-        logger.info(f"Story broken into {len(sentences)} sentence-emotion pairs")
-        
-        # Step 3: Generate audio from sentences with emotions
-        logger.info("Generating audio...")
-        audio_request = audio_service_pb2.AudioRequest()
-        for pair in sentences:
-            text_emotion = audio_service_pb2.TextEmotion(
-                text=pair.text,
-                emotion=pair.emotion
-            )
-            audio_request.segments.append(text_emotion)
-            
-        audio_response = await audio_stub.GenerateAudio(audio_request)
-        
-        if audio_response.success:
-            audio_file_path = audio_response.audio_file_path
-            logger.info(f"Audio generated successfully: {audio_file_path}")
-        else:
-            logger.error(f"Audio generation failed: {audio_response.error}")
-            raise HTTPException(
-                status_code=500, 
-                detail=f"Audio generation failed: {audio_response.error}"
-            )
-        
-        # Step 4 (Optional): Generate scene prompts and images
-        image_paths = []
-        if ENABLE_IMAGE_GENERATION and image_stub is not None:
+    return merged
+
+def load_checkpointed_segments(sentences, checkpoints: Optional[JobCheckpoints]) -> Dict[int, bytes]:
+    """Audio of the segments a previous attempt of a job has already synthesized"""
+    audio_data = {}
+    if checkpoints is None:
+        return audio_data
+    for index in range(len(sentences)):
+        path = checkpoints.get(f"segment/{index}")
+        if path is not None and os.path.exists(path):
+            with open(path, "rb") as f:
+                audio_data[index] = f.read()
+    if audio_data:
+        logger.info(f"Resuming with {len(audio_data)}/{len(sentences)} segments already synthesized")
+    return audio_data
+
+def reject_empty_story(sentences):
+    """Fail a story the story service split into no sentences: it has no audio to merge"""
+    if not sentences:
+        raise HTTPException(status_code=422, detail="The story has no sentences to narrate")
+
+def merge_story_segments(segments: List[bytes]) -> Tuple[str, float]:
+    """
+    Merge the WAV segments of a story into one story file
+
+    Raises:
+        HTTPException: 422 if there are no segments
+    """
+    reject_empty_story(segments)
+    date_dir = os.path.join("generated_audio", datetime.now().strftime("%Y-%m-%d"))
+    os.makedirs(date_dir, exist_ok=True)
+    output_path = os.path.join(
+        date_dir,
+        f"story_generated_{datetime.now().strftime('%H%M%S')}_{uuid.uuid4().hex[:8]}.wav"
+    )
+    return output_path, merge_wav_data(segments, output_path)
+
+async def process_story_emotions(story: str):
+    """ProcessStoryEmotions stage, skipped when a resumed job has already checkpointed the sentences"""
+    checkpoints = job_checkpoints.get()
+    if checkpoints is not None and "sentences" in checkpoints:
+        sentences = [story_service_pb2.SentenceEmotion(**pair) for pair in checkpoints.get("sentences")]
+        logger.info(f"Resuming with {len(sentences)} checkpointed sentence-emotion pairs")
+        return sentences
+    
+    logger.info("Processing story emotions...")
+    process_request = story_service_pb2.ProcessRequest(story=story)
+    emotion_response = await llm_call("ProcessStoryEmotions", process_request)
+    sentences = emotion_response.sentences
+    logger.info(f"Story broken into {len(sentences)} sentence-emotion pairs")
+    if checkpoints is not None:
+        checkpoints.save("sentences", [{"text": pair.text, "emotion": pair.emotion} for pair in sentences])
+    return sentences
+
+async def stream_story_emotions(story: str):
+    """
+    Yield the SentenceEmotion pairs of a story as the story service tags them
+
+    A story service without ProcessStoryEmotionsStream (UNIMPLEMENTED, e.g.
+    an older replica during a rollout) is asked with ProcessStoryEmotions.
+    Such replicas are remembered (see mark_unimplemented), so later stories
+    go to another replica or straight to ProcessStoryEmotions.
+    """
+    process_request = story_service_pb2.ProcessRequest(story=story)
+    if not implements("ProcessStoryEmotionsStream", story_pool):
+        emotion_response = await llm_call("ProcessStoryEmotions", process_request)
+        for pair in emotion_response.sentences:
+            yield pair
+        return
+    received = 0
+    tried = unimplemented_endpoints("ProcessStoryEmotionsStream", story_pool)
+    try:
+        async with downstream_call("llm", "ProcessStoryEmotionsStream", story_pool, tried=tried) as (stub, call_options):
+            emotion_call = stub.ProcessStoryEmotionsStream(process_request, **call_options)
             try:
-                # Generate scene prompts
-                logger.info("Generating scene prompts...")
-                scene_request = story_service_pb2.SceneRequest(story=story)
-                scene_response = await story_stub.GenerateScenePrompts(scene_request)
-                scenes = scene_response.scenes
-                logger.info(f"Generated {len(scenes)} scene prompts")
-                
-                # Generate images for scenes
-                logger.info("Generating images for scenes...")
-                image_request = image_service_pb2.ImageRequest(
-                    scenes=[
-                        image_service_pb2.Scene(
-                            start_line=scene.start_line,
-                            end_line=scene.end_line,
-                            prompt=scene.prompt
-                        ) for scene in scenes
-                    ]
-                )
-                image_response = await image_stub.GenerateImages(image_request)
-                image_paths = [img.image_file_path for img in image_response.images]
-                logger.info(f"Generated {len(image_paths)} images")
-            except Exception as e:
-                logger.error(f"Error in image generation process: {str(e)}")
-                # Continue with just the audio if image generation fails
-        
-        # Prepare and return the response
-        result = {
-            "status": "success",
-            "story": story,
-            "sentences": [
-                {"text": pair.text, "emotion": pair.emotion}
-                for pair in sentences
-            ],
-            "audio_file_path": audio_file_path
+                async for pair in emotion_call:
+                    received += 1
+                    yield pair
+            finally:
+                emotion_call.cancel()
+    except grpc.aio.AioRpcError as rpc_error:
+        if rpc_error.code() != grpc.StatusCode.UNIMPLEMENTED or received:
+            raise
+        mark_unimplemented("ProcessStoryEmotionsStream", tried[-1])
+        logger.warning("Story service has no ProcessStoryEmotionsStream, using ProcessStoryEmotions")
+        emotion_response = await llm_call("ProcessStoryEmotions", process_request)
+        for pair in emotion_response.sentences:
+            yield pair
+
+async def tag_and_synthesize(story: str):
+    """
+    Tag the emotions of a story and synthesize its segments, overlapping the two
+
+    The first sentence goes to TTS as soon as the story service has tagged
+    it. Sentences tagged while a TTS call runs are sent together as the next
+    call, routed by voice like any other segments. Yields, in story order:
+    ("sentence", index, SentenceEmotion) for every tagged sentence,
+    ("sentences", None, all sentences) once tagging is done and
+    ("segment", index, AudioSegment) for every synthesized segment.
+    """
+    sentences = []
+    events = asyncio.Queue()
+    # Set whenever a sentence arrives or tagging ends
+    tagged = asyncio.Event()
+    tagging_done = False
+
+    async def tag():
+        nonlocal tagging_done
+        try:
+            async with aclosing(stream_story_emotions(story)) as pairs:
+                async for pair in pairs:
+                    events.put_nowait(("sentence", len(sentences), pair))
+                    sentences.append(pair)
+                    tagged.set()
+            logger.info(f"Story broken into {len(sentences)} sentence-emotion pairs")
+            tagging_done = True
+            events.put_nowait(("sentences", None, list(sentences)))
+            tagged.set()
+        except Exception as e:
+            events.put_nowait(("error", None, e))
+
+    async def synthesize():
+        next_index = 0
+        try:
+            while next_index < len(sentences) or not tagging_done:
+                if next_index == len(sentences):
+                    tagged.clear()
+                    await tagged.wait()
+                    continue
+                indexes = list(range(next_index, len(sentences)))
+                next_index = len(sentences)
+                async with aclosing(synthesize_routed_segments(sentences, indexes)) as routed_segments:
+                    async for index, segment in routed_segments:
+                        events.put_nowait(("segment", index, segment))
+            events.put_nowait(("done", None, None))
+        except Exception as e:
+            events.put_nowait(("error", None, e))
+
+    tasks = [asyncio.create_task(tag()), asyncio.create_task(synthesize())]
+    try:
+        while True:
+            kind, index, item = await events.get()
+            if kind == "error":
+                raise item
+            if kind == "done":
+                return
+            yield kind, index, item
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def segmented_story_events(sentences):
+    """tag_and_synthesize events of a story whose sentences are already tagged"""
+    for index, pair in enumerate(sentences):
+        yield "sentence", index, pair
+    yield "sentences", None, list(sentences)
+    async with aclosing(synthesize_routed_segments(sentences)) as routed_segments:
+        async for index, segment in routed_segments:
+            yield "segment", index, segment
+
+async def generate_audio_branch(story: str, sentences=None) -> Dict[str, Any]:
+    """
+    Audio branch of the pipeline: emotion tagging followed by TTS
+
+    Tagging is skipped when the sentences came with the story
+    (generate_segmented_story). Otherwise interactive requests overlap the
+    two (tag_and_synthesize), while jobs tag the whole story first, so the
+    sentences can be checkpointed before any segment is.
+    """
+    if sentences is None and job_checkpoints.get() is None:
+        sentences, segments = [], []
+        async with aclosing(tag_and_synthesize(story)) as events:
+            async for kind, _, item in events:
+                if kind == "sentences":
+                    sentences = item
+                elif kind == "segment":
+                    segments.append(item.audio_data)
+        audio_file_path, duration = await asyncio.to_thread(merge_story_segments, segments)
+        logger.info(f"Audio generated successfully: {audio_file_path}")
+        return {
+            "sentences": [{"text": pair.text, "emotion": pair.emotion} for pair in sentences],
+            "audio_file_path": audio_file_path,
+            "duration": duration
         }
+    
+    if sentences is None:
+        sentences = await process_story_emotions(story)
+    
+    # Generate audio from sentences with emotions
+    logger.info("Generating audio...")
+    stories = await synthesize_stories({"story": (sentences, job_checkpoints.get())})
+    audio_file_path, duration = stories["story"]
+    logger.info(f"Audio generated successfully: {audio_file_path}")
+    
+    return {
+        "sentences": [
+            {"text": pair.text, "emotion": pair.emotion}
+            for pair in sentences
+        ],
+        "audio_file_path": audio_file_path,
+        "duration": duration
+    }
+
+async def generate_image_branch(story: str) -> List[Dict[str, Any]]:
+    """
+    Image branch of the pipeline: scene prompts followed by image generation
+
+    Scene boundaries are requested on a normalized 0-SCENE_TIMELINE_SCALE
+    timeline because the audio duration is not known yet when this branch
+    starts. Failures are logged and yield no scenes so audio is still returned.
+    """
+    try:
+        # Generate scene prompts
+        logger.info("Generating scene prompts...")
+        scene_request = story_service_pb2.SceneRequest(story=story, audio_duration=SCENE_TIMELINE_SCALE)
+        scene_response = await llm_call("GenerateScenePrompts", scene_request)
+        scenes = scene_response.scenes
+        logger.info(f"Generated {len(scenes)} scene prompts")
         
-        if image_paths:
-            result["image_paths"] = image_paths
+        # Generate images for scenes
+        logger.info("Generating images for scenes...")
+        image_request = image_service_pb2.ImageRequest(
+            scenes=[
+                image_service_pb2.ScenePrompt(
+                    scene_number=scene.scene_number,
+                    image_prompt=scene.image_prompt
+                ) for scene in scenes
+            ]
+        )
+        async with downstream_call("image", "GenerateImages", image_pool) as (stub, call_options):
+            image_response = await stub.GenerateImages(image_request, **call_options)
+        image_paths = {img.scene_number: img.image_path for img in image_response.images}
+        logger.info(f"Generated {len(image_paths)} images")
         
+        return [
+            {
+                "scene_number": scene.scene_number,
+                "start_fraction": scene.start_line / SCENE_TIMELINE_SCALE,
+                "end_fraction": scene.end_line / SCENE_TIMELINE_SCALE,
+                "image_prompt": scene.image_prompt,
+                "image_path": image_paths.get(scene.scene_number)
+            }
+            for scene in scenes
+        ]
+    except Exception as e:
+        logger.error(f"Error in image generation process: {str(e)}")
+        # Continue with just the audio if image generation fails
+        return []
+
+def merge_scene_timings(scenes: List[Dict[str, Any]], duration: float) -> List[Dict[str, Any]]:
+    """Map normalized scene boundaries onto the real audio timeline"""
+    return [
+        {
+            "scene_number": scene["scene_number"],
+            "start_time": round(scene["start_fraction"] * duration, 2) if duration else None,
+            "end_time": round(scene["end_fraction"] * duration, 2) if duration else None,
+            "image_prompt": scene["image_prompt"],
+            "image_path": scene["image_path"]
+        }
+        for scene in scenes
+    ]
+
+async def run_story_pipeline(storyline: str, genre: str) -> Dict[str, Any]:
+    """
+    Run the full story-to-audio pipeline for one storyline
+
+    The pipeline is a small stage DAG:
+
+        GenerateStory -> ProcessStoryEmotions -> GenerateAudio
+                      \-> GenerateScenePrompts -> GenerateImages  (optional)
+
+    With SEGMENTED_STORY the first two stages are one GenerateSegmentedStory
+    call. Both branches only need the story text, so the image branch runs
+    concurrently with the audio branch and the results are merged at the end.
+    Within the audio branch, sentences are synthesized while the rest of the
+    story is still being tagged.
+    """
+    # Reject before spending LLM time if a later stage is already saturated
+    admission.check_capacity()
+    
+    # Generate the story
+    story, sentences = await generate_segmented_story(storyline, genre)
+    
+    # Fan out into the audio and (optional) image branches
+    image_task = start_image_branch(story)
+    try:
+        audio_result = await generate_audio_branch(story, sentences)
+    except BaseException:
+        if image_task is not None:
+            image_task.cancel()
+        raise
+    scenes = await image_task if image_task is not None else []
+    
+    return build_story_result(story, audio_result, scenes)
+
+async def generate_story(storyline: str, genre: str) -> str:
+    """GenerateStory stage, skipped when a resumed job has already checkpointed the story"""
+    checkpoints = job_checkpoints.get()
+    if checkpoints is not None and "story" in checkpoints:
+        story = checkpoints.get("story")
+        logger.info(f"Resuming with the checkpointed story ({len(story)} characters)")
+        return story
+    
+    logger.info(f"Generating {genre} story...")
+    story_response = await llm_call("GenerateStory", story_service_pb2.StoryRequest(storyline=storyline, genre=genre))
+    story = story_response.story
+    logger.info(f"Story generated successfully ({len(story)} characters)")
+    if checkpoints is not None:
+        checkpoints.save("story", story)
+    return story
+
+async def generate_segmented_story(storyline: str, genre: str) -> Tuple[str, Optional[List[Any]]]:
+    """
+    GenerateSegmentedStory stage: the story and its sentence-emotion pairs from one LLM call
+
+    Returns (story, sentences). sentences is None when they still have to be
+    tagged with ProcessStoryEmotions: with SEGMENTED_STORY off, when the
+    story service has no GenerateSegmentedStory (UNIMPLEMENTED, e.g. an older
+    replica during a rollout) or could not parse the model's JSON, in which
+    case the story is generated with GenerateStory instead. Replicas without
+    the RPC are remembered, so later requests skip it while no replica has it.
+    A resumed job continues from whatever it has checkpointed.
+    """
+    checkpoints = job_checkpoints.get()
+    if (not SEGMENTED_STORY or (checkpoints is not None and "story" in checkpoints)
+            or not implements("GenerateSegmentedStory", story_pool)):
+        return await generate_story(storyline, genre), None
+    
+    logger.info(f"Generating segmented {genre} story...")
+    try:
+        story_response = await llm_call(
+            "GenerateSegmentedStory", story_service_pb2.StoryRequest(storyline=storyline, genre=genre)
+        )
+    except grpc.aio.AioRpcError as rpc_error:
+        if rpc_error.code() != grpc.StatusCode.UNIMPLEMENTED:
+            raise
+        logger.warning("Story service has no GenerateSegmentedStory, using GenerateStory")
+        return await generate_story(storyline, genre), None
+    if not story_response.success:
+        logger.warning(f"GenerateSegmentedStory failed ({story_response.error}), using GenerateStory")
+        return await generate_story(storyline, genre), None
+    
+    story, sentences = story_response.story, story_response.sentences
+    logger.info(f"Story generated successfully ({len(story)} characters, {len(sentences)} sentence-emotion pairs)")
+    if checkpoints is not None:
+        checkpoints.save("sentences", [{"text": pair.text, "emotion": pair.emotion} for pair in sentences])
+        checkpoints.save("story", story)
+    return story, sentences
+
+def start_image_branch(story: str) -> Optional[asyncio.Task]:
+    """Start the image branch for a story if image generation is enabled"""
+    if ENABLE_IMAGE_GENERATION and image_pool is not None:
+        return asyncio.create_task(generate_image_branch(story))
+    return None
+
+def build_story_result(story: str, audio_result: Dict[str, Any], scenes: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge the outputs of the audio and image branches into the response"""
+    result = {
+        "status": "success",
+        "story": story,
+        "sentences": audio_result["sentences"],
+        "audio_file_path": audio_result["audio_file_path"]
+    }
+    
+    if scenes:
+        result["scenes"] = merge_scene_timings(scenes, audio_result["duration"])
+        result["image_paths"] = [scene["image_path"] for scene in scenes if scene["image_path"]]
+    
+    return add_file_urls(result)
+
+def add_file_urls(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Attach /files URLs for the audio and scene images of a result"""
+    result["audio_url"] = file_url(result["audio_file_path"], FILE_ROOTS)
+    for scene in result.get("scenes") or []:
+        scene["image_url"] = file_url(scene["image_path"], FILE_ROOTS)
+    return result
+
+async def run_cached_story_pipeline(storyline: str, genre: str) -> Dict[str, Any]:
+    """
+    Run the pipeline through the result cache and the in-flight request table
+
+    Identical requests (same storyline, genre, voice set and synthesis
+    parameters) are answered from the cache without touching the LLM or TTS.
+    Identical requests that arrive while one is still running wait for that
+    run instead of starting their own, if they share its priority class and
+    tenant. The shared run has no deadline of its own: every caller waits
+    for it until its own deadline, and it is cancelled once all have left.
+    It writes the job checkpoints of the caller that started it; the other
+    jobs get none, as on a cache hit.
+    """
+    cache_key = story_cache_key(storyline, genre)
+    cached = await get_cached_result(cache_key)
+    if cached is not None:
+        return cached
+    
+    async def run_shared():
+        # Runs in a copy of the first caller's context; its deadline only bounds that caller's wait
+        request_deadline.set(None)
+        return await run_and_cache_story_pipeline(cache_key, storyline, genre)
+    
+    inflight_key = f"{cache_key}:{'batch' if background_work.get() else 'interactive'}:{request_tenant.get()}"
+    deadline = request_deadline.get()
+    timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+    try:
+        result = await inflight_requests.run(inflight_key, run_shared, timeout=timeout)
+    except asyncio.TimeoutError:
+        if deadline is None or time.monotonic() < deadline:
+            raise
+        raise HTTPException(status_code=504, detail="Request deadline exceeded waiting for the story pipeline")
+    # Every coalesced caller receives the same object, hand out private copies
+    return copy.deepcopy(result)
+
+def story_cache_key(storyline: str, genre: str) -> str:
+    """Result cache key of a request: everything that changes the generated story audio"""
+    return make_cache_key({
+        "storyline": storyline,
+        "genre": genre.lower(),
+        **SYNTHESIS_PARAMS,
+        "images": ENABLE_IMAGE_GENERATION
+    })
+
+async def get_cached_result(cache_key: str) -> Optional[Dict[str, Any]]:
+    """Cached result for the key with fresh /files URLs, or None"""
+    if result_cache is None:
+        return None
+    # The lookup checks the artifacts on disk and may wait for the lock held by a put
+    cached = await asyncio.to_thread(result_cache.get, cache_key)
+    if cached is None:
+        return None
+    logger.info(f"Result cache hit for {cache_key[:12]}")
+    return add_file_urls(cached)
+
+async def run_and_cache_story_pipeline(cache_key: str, storyline: str, genre: str) -> Dict[str, Any]:
+    """Run the pipeline once and store the result in the cache"""
+    result = await run_story_pipeline(storyline, genre)
+    return await cache_result(cache_key, result)
+
+async def cache_result(cache_key: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """Store a result in the cache, returning it as served from there"""
+    if result_cache is None:
         return result
+    try:
+        result = await asyncio.to_thread(result_cache.put, cache_key, result)
+    except OSError as e:
+        # The result is still valid, it just could not be cached
+        logger.error(f"Failed to cache result: {str(e)}")
+        return result
+    return add_file_urls(result)
+
+def start_request_deadline():
+    """Start the REQUEST_TIMEOUT_SECONDS budget of the current request"""
+    request_deadline.set(time.monotonic() + REQUEST_TIMEOUT_SECONDS)
+
+async def cancel_on_disconnect(request: Request, awaitable):
+    """
+    Await a pipeline run, cancelling it if the HTTP client goes away first
+
+    Cancelling the run cancels its in-flight gRPC calls, which the services
+    see as an inactive context and stop working on.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                logger.info("Client disconnected, cancelling its pipeline run")
+                raise HTTPException(status_code=499, detail="Client closed request")
+    finally:
+        task.cancel()
+
+def describe_pipeline_error(error: Exception) -> str:
+    """Human readable message for a pipeline failure"""
+    if isinstance(error, grpc.aio.AioRpcError) and error.code() == grpc.StatusCode.DEADLINE_EXCEEDED:
+        return f"Request deadline exceeded: {error.details()}"
+    if isinstance(error, grpc.aio.AioRpcError):
+        return f"Service unavailable: {error.details()}"
+    if isinstance(error, HTTPException):
+        return str(error.detail)
+    if isinstance(error, AdmissionRejected):
+        return f"Service busy: {str(error)}"
+    if isinstance(error, CircuitOpenError):
+        return f"Service unavailable: {str(error)}"
+    return f"Internal server error: {str(error)}"
+
+def idempotency_key(request: Request, scope: str) -> Optional[str]:
+    """
+    Idempotency-Key of the request scoped to the endpoint and tenant, None without one
+
+    Raises:
+        HTTPException: 400 if the key is empty or too long
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if key is None:
+        return None
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters long"
+        )
+    return f"{scope}:{request_tenant.get()}:{key}"
+
+def raise_idempotency_conflict(error: IdempotencyConflictError):
+    """Translate a reused idempotency key into a 422"""
+    logger.warning(f"Rejecting request: {str(error)}")
+    raise HTTPException(status_code=422, detail=str(error))
+
+def raise_too_many_requests(error: AdmissionRejected):
+    """Translate an admission rejection into a 429 with a Retry-After hint"""
+    logger.warning(f"Rejecting request: {str(error)}")
+    raise HTTPException(
+        status_code=429,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+async def run_job_pipeline(job_request: Dict[str, Any], checkpoints: JobCheckpoints) -> Dict[str, Any]:
+    """Pipeline entry point used by the background job workers"""
+    # Completed stages are recorded so a job interrupted by a crash resumes where it stopped
+    job_checkpoints.set(checkpoints)
+    # Jobs already waited in the job queue, so they wait for stage slots instead of being rejected
+    background_work.set(True)
+    # The deadline starts when a worker picks the job up, not when it was queued
+    start_request_deadline()
+    request_tenant.set(job_request.get("tenant", DEFAULT_TENANT))
+    # Link the job's work to the trace of the request that submitted it
+    parent = SpanContext.from_traceparent(job_request.get("traceparent"))
+    with TRACER.span("job", parent=parent):
+        try:
+            if "rerender_of" in job_request:
+                return await rerender_story(job_request, checkpoints)
+            return await run_cached_story_pipeline(job_request["storyline"], job_request["genre"])
+        except Exception as e:
+            raise RuntimeError(describe_pipeline_error(e)) from e
+
+async def rerender_story(job_request: Dict[str, Any], checkpoints: JobCheckpoints) -> Dict[str, Any]:
+    """
+    Re-synthesize the edited sentences of an earlier job and splice them into its audio
+
+    The segments of the unchanged sentences are copied from the earlier
+    job's checkpoints into this job's, so synthesize_stories only
+    synthesizes the edited sentences and merges the story audio again. A
+    segment the earlier job does not have is synthesized as well. The result
+    cache only keeps the merged audio, so an earlier job answered from it
+    (or one that was evicted) has no segments and the whole story is
+    synthesized again.
+    """
+    source = job_manager.get(job_request["rerender_of"])
+    sentences = [story_service_pb2.SentenceEmotion(**pair) for pair in job_request["sentences"]]
+    changed = set(job_request["changed"])
+    unchanged = [index for index in range(len(sentences)) if index not in changed]
+    copied = 0
+    if source is not None:
+        copied = await copy_segments(job_manager.store.checkpoints(source.id), checkpoints, unchanged)
+    if copied < len(unchanged):
+        logger.warning(
+            f"Job {job_request['rerender_of']} has {copied}/{len(unchanged)} of the unchanged segments "
+            f"(result cache hit or evicted), synthesizing the others again"
+        )
+    logger.info(f"Re-rendering {len(changed)}/{len(sentences)} sentences of job {job_request['rerender_of']}")
+    stories = await synthesize_stories({"story": (sentences, checkpoints)})
+    audio_file_path, duration = stories["story"]
+    
+    result = {
+        "status": "success",
+        "story": job_request["story"],
+        "sentences": job_request["sentences"],
+        "audio_file_path": audio_file_path
+    }
+    scenes = job_request.get("scenes")
+    if scenes:
+        # The scenes keep their share of the story, on the new timeline
+        scale = duration / (job_request.get("duration") or duration)
+        result["scenes"] = [
+            {
+                **scene,
+                "start_time": round(scene["start_time"] * scale, 2) if scene["start_time"] is not None else None,
+                "end_time": round(scene["end_time"] * scale, 2) if scene["end_time"] is not None else None
+            }
+            for scene in scenes
+        ]
+        result["image_paths"] = job_request.get("image_paths")
+    return add_file_urls(result)
+
+async def copy_segments(source: JobCheckpoints, target: JobCheckpoints, indexes: List[int]) -> int:
+    """
+    Checkpoint the segment audio of another job as this job's, for the given segments
+
+    Returns how many of the segments this job has checkpointed afterwards.
+    """
+    copied = 0
+    for index in indexes:
+        name = f"segment/{index}"
+        if name in target:
+            copied += 1
+            continue
+        path = source.get(name)
+        if path is None or not os.path.exists(path):
+            continue
+        data = await asyncio.to_thread(read_file, path)
+        await target.save_file(name, f"segment_{index}.wav", data)
+        copied += 1
+    return copied
+
+def read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+async def run_batch_pipeline(batch: Dict[str, Tuple[Dict[str, Any], JobCheckpoints]]) -> Dict[str, Any]:
+    """
+    Pipeline entry point for the jobs of a batch leased by one worker
+
+    The LLM stages of all stories run concurrently, then the sentences of
+    every story are synthesized as one workload spread over the audio
+    replicas by voice, so replicas stay busy across story boundaries instead
+    of idling at the end of each story. If that shared workload fails, each
+    story is retried on its own (synthesize_stories_separately), so one
+    story's failure does not fail the others. Returns {job_id: result or
+    exception}.
+    """
+    background_work.set(True)
+    # One budget for the whole batch, scaled by its size
+    request_deadline.set(time.monotonic() + REQUEST_TIMEOUT_SECONDS * len(batch))
+    # All items of a batch were submitted by the same client
+    first_request, _ = next(iter(batch.values()))
+    request_tenant.set(first_request.get("tenant", DEFAULT_TENANT))
+    outcomes: Dict[str, Any] = {}
+
+    pending = {}
+    for job_id, (job_request, checkpoints) in batch.items():
+        cached = await get_cached_result(story_cache_key(job_request["storyline"], job_request["genre"]))
+        if cached is not None:
+            outcomes[job_id] = cached
+        else:
+            pending[job_id] = (job_request, checkpoints)
+
+    async def prepare(job_request: Dict[str, Any], checkpoints: JobCheckpoints):
+        job_checkpoints.set(checkpoints)
+        parent = SpanContext.from_traceparent(job_request.get("traceparent"))
+        with TRACER.span("job", parent=parent):
+            story, sentences = await generate_segmented_story(job_request["storyline"], job_request["genre"])
+            image_task = start_image_branch(story)
+            try:
+                if sentences is None:
+                    sentences = await process_story_emotions(story)
+                # Before the shared workload, which an empty story would fail for every story
+                reject_empty_story(sentences)
+            except BaseException:
+                if image_task is not None:
+                    image_task.cancel()
+                raise
+            return story, sentences, image_task
+
+    prepared = {}
+    image_tasks = []
+    try:
+        results = await asyncio.gather(
+            *(prepare(job_request, checkpoints) for job_request, checkpoints in pending.values()),
+            return_exceptions=True
+        )
+        for job_id, outcome in zip(pending, results):
+            if isinstance(outcome, Exception):
+                outcomes[job_id] = RuntimeError(describe_pipeline_error(outcome))
+            else:
+                prepared[job_id] = outcome
+                if outcome[2] is not None:
+                    image_tasks.append(outcome[2])
+        if not prepared:
+            return outcomes
+
+        logger.info(f"Generating audio for {len(prepared)} stories of a batch...")
+        try:
+            with TRACER.span("batch_audio", stories=len(prepared)):
+                stories = await synthesize_stories({
+                    job_id: (sentences, pending[job_id][1]) for job_id, (_, sentences, _) in prepared.items()
+                })
+        except Exception as e:
+            logger.warning(f"Batch audio failed ({describe_pipeline_error(e)}), synthesizing its stories one by one")
+            stories = await synthesize_stories_separately({
+                job_id: (sentences, pending[job_id][1]) for job_id, (_, sentences, _) in prepared.items()
+            })
+
+        for job_id, (story, sentences, image_task) in prepared.items():
+            if isinstance(stories[job_id], BaseException):
+                outcomes[job_id] = RuntimeError(describe_pipeline_error(stories[job_id]))
+                continue
+            audio_file_path, duration = stories[job_id]
+            audio_result = {
+                "sentences": [{"text": pair.text, "emotion": pair.emotion} for pair in sentences],
+                "audio_file_path": audio_file_path,
+                "duration": duration
+            }
+            scenes = await image_task if image_task is not None else []
+            job_request = pending[job_id][0]
+            outcomes[job_id] = await cache_result(
+                story_cache_key(job_request["storyline"], job_request["genre"]),
+                build_story_result(story, audio_result, scenes)
+            )
+        return outcomes
+    finally:
+        for image_task in image_tasks:
+            image_task.cancel()
+
+async def synthesize_stories_separately(
+        stories: Dict[str, Tuple[Any, Optional[JobCheckpoints]]]) -> Dict[str, Union[Tuple[str, float], Exception]]:
+    """
+    synthesize_stories with one call per story, so a failure only fails its own story
+
+    Used after the shared workload of a batch failed: segments that arrived
+    before the failure are checkpointed, so a story that was already complete
+    is only merged, and the others resume from their checkpoints. Returns
+    the merged audio file and duration, or the exception, of every story.
+    """
+    async def synthesize_one(key: str):
+        return (await synthesize_stories({key: stories[key]}))[key]
+
+    results = await asyncio.gather(*(synthesize_one(key) for key in stories), return_exceptions=True)
+    return dict(zip(stories, results))
+
+# Main endpoint to convert storyline to audio
+@app.post("/story-to-audio", response_model=StoryToAudioResponse)
+async def story_to_audio(story_request: StoryRequest, request: Request, response: Response):
+    """
+    Convert a storyline and genre into an audio story
     
+    This endpoint keeps the connection open until the whole pipeline is done.
+    Long running clients should prefer the /jobs API. If the client
+    disconnects, the downstream work done for it is cancelled, unless the
+    request has an Idempotency-Key: then the run keeps going and a retry
+    with the same key reattaches to it (or gets its result).
+    """
+    start_request_deadline()
+    key = idempotency_key(request, "story-to-audio")
+    try:
+        if key is None:
+            return await cancel_on_disconnect(
+                request,
+                run_cached_story_pipeline(story_request.storyline, story_request.genre)
+            )
+        result, replayed = await cancel_on_disconnect(
+            request,
+            idempotent_runs.run(
+                key,
+                story_cache_key(story_request.storyline, story_request.genre),
+                lambda: run_cached_story_pipeline(story_request.storyline, story_request.genre)
+            )
+        )
+        if replayed:
+            response.headers[REPLAYED_HEADER] = "true"
+        return copy.deepcopy(result)
+    
+    except IdempotencyConflictError as e:
+        raise_idempotency_conflict(e)
+    except AdmissionRejected as e:
+        raise_too_many_requests(e)
+    except CircuitOpenError as e:
+        logger.error(f"Failing fast: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail=describe_pipeline_error(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except grpc.aio.AioRpcError as rpc_error:
+        if rpc_error.code() == grpc.StatusCode.DEADLINE_EXCEEDED:
+            logger.error(f"Request deadline exceeded: {rpc_error.details()}")
+            raise HTTPException(status_code=504, detail=describe_pipeline_error(rpc_error))
         logger.error(f"gRPC error: {rpc_error.code()}: {rpc_error.details()}")
         raise HTTPException(
             status_code=503,
             detail=f"Service unavailable: {rpc_error.details()}"
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing request: {str(e)}")
         raise HTTPException(
@@ -236,16 +1525,299 @@ async def story_to_audio(story_request: StoryRequest):
             detail=f"Internal server error: {str(e)}"
         )
 
-# Add a file serving endpoint to serve generated files
-@app.get("/files/{file_path:path}")
-async def get_file(file_path: str):
-    """Serve generated files"""
-    # This is a placeholder. In a real implementation, you would:
-    # 1. Validate the file_path
-    # 2. Check if the file exists
-    # 3. Return the file with appropriate MIME type
-    # For now, we'll just return a 501 Not Implemented
-    raise HTTPException(status_code=501, detail="File serving not implemented yet")
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Encode one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def segment_event(index: int, segment) -> Dict[str, Any]:
+    """Data of the `segment` event for one synthesized AudioSegment"""
+    return {
+        "index": index,
+        "text": segment.text,
+        "emotion": segment.emotion,
+        "duration": segment.duration,
+        "audio_file_path": segment.audio_file_path,
+        "audio_url": file_url(segment.audio_file_path, FILE_ROOTS),
+        "audio": base64.b64encode(segment.audio_data).decode("ascii")
+    }
+
+def done_event(audio_file_path: str, duration: float) -> Dict[str, Any]:
+    """Data of the final `done` event with the merged story audio"""
+    return {
+        "audio_file_path": audio_file_path,
+        "audio_url": file_url(audio_file_path, FILE_ROOTS),
+        "duration": duration
+    }
+
+async def stream_story_pipeline(storyline: str, genre: str):
+    """
+    Run the audio pipeline and yield Server-Sent Events as results become available
+
+    Events are emitted in this order: `story`, then one `sentence` per
+    sentence as it is tagged and one `segment` per synthesized sentence (with
+    base64 WAV audio), interleaved since synthesis starts while the story is
+    still being tagged, `sentences` with all of them once tagging is done,
+    and finally `done` with the merged audio. A segmented story
+    (generate_segmented_story) comes with all its sentences, so their
+    `sentence` events and `sentences` precede the segments. Any failure is reported as an
+    `error` event. When the client disconnects the generator is cancelled,
+    and with it the gRPC calls.
+    """
+    start_request_deadline()
+    try:
+        logger.info(f"Generating {genre} story (streaming)...")
+        story, sentences = await generate_segmented_story(storyline, genre)
+        yield format_sse("story", {"story": story})
+        
+        segments = []
+        events = tag_and_synthesize(story) if sentences is None else segmented_story_events(sentences)
+        async with aclosing(events) as events:
+            async for kind, index, item in events:
+                if kind == "sentence":
+                    yield format_sse("sentence", {"index": index, "text": item.text, "emotion": item.emotion})
+                elif kind == "sentences":
+                    yield format_sse("sentences", {
+                        "sentences": [{"text": pair.text, "emotion": pair.emotion} for pair in item]
+                    })
+                else:
+                    segments.append(item.audio_data)
+                    logger.info(f"Streaming audio segment {index + 1}")
+                    yield format_sse("segment", segment_event(index, item))
+        audio_file_path, duration = await asyncio.to_thread(merge_story_segments, segments)
+        yield format_sse("done", done_event(audio_file_path, duration))
+    
+    except Exception as e:
+        logger.error(f"Error streaming story: {str(e)}")
+        yield format_sse("error", {"message": describe_pipeline_error(e)})
+
+# Progressive variant of /story-to-audio
+@app.post("/story-to-audio/stream")
+async def story_to_audio_stream(story_request: StoryRequest):
+    """
+    Convert a storyline into an audio story, streaming results as Server-Sent Events
+
+    Listeners can start playing the first segment while the rest of the story
+    is still being synthesized. Image generation is not part of the stream.
+    """
+    try:
+        admission.check_capacity()
+    except AdmissionRejected as e:
+        raise_too_many_requests(e)
+    
+    return StreamingResponse(
+        stream_story_pipeline(story_request.storyline, story_request.genre),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Asynchronous job API
+@app.post("/jobs", response_model=JobSubmitResponse, status_code=202)
+async def submit_job(story_request: StoryRequest, request: Request, response: Response):
+    """
+    Queue a story-to-audio job and return its id immediately
+
+    Poll GET /jobs/{job_id} for the status and fetch GET /jobs/{job_id}/result
+    once the job has succeeded. A retry with the same Idempotency-Key gets
+    the job already queued for it.
+    """
+    try:
+        job = job_manager.submit(
+            make_job_request(story_request),
+            idempotency_key(request, "jobs"),
+            story_cache_key(story_request.storyline, story_request.genre)
+        )
+    except JobQueueFullError as e:
+        raise_too_many_requests(AdmissionRejected(str(e), admission["tts"].retry_after()))
+    except IdempotencyConflictError as e:
+        raise_idempotency_conflict(e)
+    
+    if job.replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return job_submit_response(job)
+
+@app.post("/batch/story-to-audio", response_model=BatchSubmitResponse, status_code=202)
+async def submit_batch(batch_request: BatchStoryRequest, request: Request, response: Response):
+    """
+    Queue several stories as one batch and return their job ids immediately
+
+    Each story becomes a regular job that is polled through the /jobs API.
+    The jobs of a batch are run together, with the sentences of all stories
+    synthesized as one workload across the audio replicas. A retry with
+    the same Idempotency-Key gets the jobs already queued for it.
+    """
+    try:
+        jobs = job_manager.submit_batch(
+            [make_job_request(item) for item in batch_request.items],
+            idempotency_key(request, "batch"),
+            make_cache_key({
+                "items": [story_cache_key(item.storyline, item.genre) for item in batch_request.items]
+            })
+        )
+    except JobQueueFullError as e:
+        raise_too_many_requests(AdmissionRejected(str(e), admission["tts"].retry_after()))
+    except IdempotencyConflictError as e:
+        raise_idempotency_conflict(e)
+    
+    if jobs[0].replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return {
+        "batch_id": jobs[0].batch_id,
+        "jobs": [job_submit_response(job) for job in jobs]
+    }
+
+def make_job_request(story_request: StoryRequest) -> Dict[str, Any]:
+    """Request stored with a job"""
+    return {
+        "storyline": story_request.storyline,
+        "genre": story_request.genre,
+        "traceparent": current_traceparent(),
+        "tenant": request_tenant.get()
+    }
+
+def rerender_job_request(source: Job, edits: List[SentenceEdit]) -> Dict[str, Any]:
+    """
+    Request stored with a re-render job: the earlier job's result with the edits applied
+
+    The sentences were merged and re-segmented from the story text, so they
+    do not necessarily appear in it verbatim; once a text is edited, the
+    story is rebuilt from the sentences.
+
+    Raises:
+        HTTPException: 422 if an edit points past the last sentence or sets an emotion not in EMOTIONS
+    """
+    result = source.result
+    sentences = [{"text": pair["text"], "emotion": pair["emotion"]} for pair in result["sentences"]]
+    story = result["story"]
+    for edit in edits:
+        if edit.index >= len(sentences):
+            raise HTTPException(
+                status_code=422,
+                detail=f"Sentence {edit.index} does not exist, the story has {len(sentences)} sentences"
+            )
+        if edit.emotion is not None and edit.emotion.lower() not in EMOTIONS:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Unknown emotion {edit.emotion!r}, expected one of {', '.join(EMOTIONS)}"
+            )
+        if edit.text is not None:
+            sentences[edit.index]["text"] = edit.text
+        if edit.emotion is not None:
+            sentences[edit.index]["emotion"] = edit.emotion.lower()
+    if any(edit.text is not None for edit in edits):
+        story = " ".join(pair["text"] for pair in sentences)
+    changed = [
+        index for index, (old, new) in enumerate(zip(result["sentences"], sentences))
+        if (old["text"], old["emotion"]) != (new["text"], new["emotion"])
+    ]
+    duration = None
+    if result.get("scenes") and os.path.exists(result["audio_file_path"]):
+        duration = wav_duration(result["audio_file_path"])
+    return {
+        "storyline": source.request["storyline"],
+        "genre": source.request["genre"],
+        "traceparent": current_traceparent(),
+        "tenant": request_tenant.get(),
+        "rerender_of": source.id,
+        "story": story,
+        "sentences": sentences,
+        "changed": changed,
+        "scenes": result.get("scenes"),
+        "image_paths": result.get("image_paths"),
+        "duration": duration
+    }
+
+def job_submit_response(job: Job) -> Dict[str, Any]:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        "result_url": f"/jobs/{job.id}/result"
+    }
+
+def get_job_or_404(job_id: str) -> Job:
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
+
+@app.post("/jobs/{job_id}/rerender", response_model=JobSubmitResponse, status_code=202)
+async def rerender_job(job_id: str, rerender_request: RerenderRequest, request: Request, response: Response):
+    """
+    Queue a job that regenerates only the edited sentences of a finished job
+
+    Each edit changes the text and/or emotion of one sentence of the job's
+    result. The new job synthesizes the edited sentences, reuses the audio
+    of all other sentences and merges the story audio again. It is polled
+    like any other job and can itself be re-rendered.
+    """
+    source = get_job_or_404(job_id)
+    if source.status != JOB_SUCCEEDED:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Job {job_id} has no result to re-render (status: {source.status})"
+        )
+    rerender = rerender_job_request(source, rerender_request.edits)
+    try:
+        job = job_manager.submit(
+            rerender,
+            idempotency_key(request, f"rerender/{job_id}"),
+            make_cache_key({"sentences": rerender["sentences"]})
+        )
+    except JobQueueFullError as e:
+        raise_too_many_requests(AdmissionRejected(str(e), admission["tts"].retry_after()))
+    except IdempotencyConflictError as e:
+        raise_idempotency_conflict(e)
+    
+    if job.replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return job_submit_response(job)
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job_status(job_id: str):
+    """Return the current status of a job"""
+    return get_job_or_404(job_id).to_dict()
+
+@app.get("/jobs/{job_id}/result", response_model=StoryToAudioResponse)
+async def get_job_result(job_id: str):
+    """
+    Return the result of a finished job
+
+    A job without a result is a conflict with the state of the job, not a
+    server error: 409 with the job's status, and for a failed job its error.
+    """
+    job = get_job_or_404(job_id)
+    if job.status == JOB_FAILED:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Job {job_id} failed (status: {job.status}): {job.error}"
+        )
+    if job.status != JOB_SUCCEEDED:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Job {job_id} is not finished yet (status: {job.status})"
+        )
+    return job.result
+
+# File serving endpoint for generated audio and images
+@app.api_route("/files/{file_path:path}", methods=["GET", "HEAD"])
+async def get_file(file_path: str, request: Request):
+    """
+    Serve a generated file
+
+    Supports byte ranges for seeking, strong ETags / Last-Modified for
+    conditional requests and caching, and refuses paths outside FILE_ROOTS.
+    """
+    resolved_path = resolve_served_file(file_path, FILE_ROOTS)
+    if resolved_path is None:
+        raise HTTPException(status_code=404, detail=f"File not found: {file_path}")
+    
+    return file_response(
+        resolved_path,
+        os.stat(resolved_path),
+        request.headers,
+        method=request.method,
+        headers={"Cache-Control": f"public, max-age={FILE_CACHE_MAX_AGE}"}
+    )
 
 def main():
     """Main entry point for the application"""
@@ -253,10 +1825,44 @@ def main():
     parser.add_argument('--disable-images', action='store_true', help='Disable image generation')
     parser.add_argument('--port', type=int, default=5000, help='Port to run the server on')
     parser.add_argument('--host', type=str, default='0.0.0.0', help='Host to bind the server to')
+    parser.add_argument('--job-workers', type=int, default=JOB_WORKERS, help='Number of background job workers')
+    parser.add_argument('--job-queue-size', type=int, default=JOB_QUEUE_SIZE, help='Maximum number of queued jobs')
+    parser.add_argument('--disable-cache', action='store_true', help='Disable the whole-request result cache')
+    parser.add_argument('--story-endpoints', type=str, default=",".join(STORY_ENDPOINTS), help='Comma separated story service replicas')
+    parser.add_argument('--audio-endpoints', type=str, default=",".join(AUDIO_ENDPOINTS), help='Comma separated audio service replicas')
+    parser.add_argument('--image-endpoints', type=str, default=",".join(IMAGE_ENDPOINTS), help='Comma separated image service replicas')
+    parser.add_argument('--production', action='store_true', default=os.getenv("STORY2AUDIO_PRODUCTION", "0") == "1",
+                        help='Serve with several worker processes and without auto-reload')
+    parser.add_argument('--workers', type=int, default=int(os.getenv("STORY2AUDIO_WORKERS", "2")),
+                        help='Number of server worker processes in production mode')
     args = parser.parse_args()
     
-    global ENABLE_IMAGE_GENERATION
-    ENABLE_IMAGE_GENERATION = not args.disable_images
+    # Export through the environment so the reloaded server process picks them up
+    os.environ["STORY2AUDIO_JOB_WORKERS"] = str(args.job_workers)
+    os.environ["STORY2AUDIO_JOB_QUEUE_SIZE"] = str(args.job_queue_size)
+    os.environ["STORY2AUDIO_STORY_ENDPOINTS"] = args.story_endpoints
+    os.environ["STORY2AUDIO_AUDIO_ENDPOINTS"] = args.audio_endpoints
+    os.environ["STORY2AUDIO_IMAGE_ENDPOINTS"] = args.image_endpoints
+    os.environ["STORY2AUDIO_ENABLE_IMAGES"] = "0" if args.disable_images else "1"
+    os.environ["STORY2AUDIO_WORKERS"] = str(args.workers if args.production else 1)
+    if args.disable_cache:
+        os.environ["STORY2AUDIO_CACHE_ENABLED"] = "0"
+    
+    if args.production:
+        logger.info(f"Starting FastAPI server on {args.host}:{args.port} with {args.workers} workers")
+        uvicorn.run(
+            "main:app",
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            # uvloop and httptools when they are installed
+            loop="auto",
+            http="auto",
+            # Every request is already counted and timed on /metrics
+            access_log=False,
+            log_level="info"
+        )
+        return
     
     # Start the FastAPI server
     logger.info(f"Starting FastAPI server on {args.host}:{args.port}")
@@ -24,7 +24,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x1fproto_files/audio_service.proto\x12\raudio_service\"<\n\x0c\x41udioRequest\x12,\n\x08segments\x18\x01 \x03(\x0b\x32\x1a.audio_service.TextEmotion\",\n\x0bTextEmotion\x12\x0c\n\x04text\x18\x01 \x01(\t\x12\x0f\n\x07\x65motion\x18\x02 \x01(\t\"H\n\rAudioResponse\x12\x17\n\x0f\x61udio_file_path\x18\x01 \x01(\t\x12\x0f\n\x07success\x18\x02 \x01(\x08\x12\r\n\x05\x65rror\x18\x03 \x01(\t2^\n\x0e\x41udioGenerator\x12L\n\rGenerateAudio\x12\x1b.audio_service.AudioRequest\x1a\x1c.audio_service.AudioResponse\"\x00\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x1fproto_files/audio_service.proto\x12\raudio_service\"u\n\x0c\x41udioRequest\x12,\n\x08segments\x18\x01 \x03(\x0b\x32\x1a.audio_service.TextEmotion\x12\x15\n\rsegments_only\x18\x02 \x01(\x08\x12\x10\n\x08priority\x18\x03 \x01(\t\x12\x0e\n\x06tenant\x18\x04 \x01(\t\",\n\x0bTextEmotion\x12\x0c\n\x04text\x18\x01 \x01(\t\x12\x0f\n\x07\x65motion\x18\x02 \x01(\t\"Z\n\rAudioResponse\x12\x17\n\x0f\x61udio_file_path\x18\x01 \x01(\t\x12\x0f\n\x07success\x18\x02 \x01(\x08\x12\r\n\x05\x65rror\x18\x03 \x01(\t\x12\x10\n\x08\x64uration\x18\x04 \x01(\x02\"{\n\x0c\x41udioSegment\x12\r\n\x05index\x18\x01 \x01(\x05\x12\x0c\n\x04text\x18\x02 \x01(\t\x12\x0f\n\x07\x65motion\x18\x03 \x01(\t\x12\x17\n\x0f\x61udio_file_path\x18\x04 \x01(\t\x12\x12\n\naudio_data\x18\x05 \x01(\x0c\x12\x10\n\x08\x64uration\x18\x06 \x01(\x02\"\x7f\n\x13\x41udioStreamResponse\x12.\n\x07segment\x18\x01 \x01(\x0b\x32\x1b.audio_service.AudioSegmentH\x00\x12.\n\x06merged\x18\x02 \x01(\x0b\x32\x1c.audio_service.AudioResponseH\x00\x42\x08\n\x06result2\xba\x01\n\x0e\x41udioGenerator\x12L\n\rGenerateAudio\x12\x1b.audio_service.AudioRequest\x1a\x1c.audio_service.AudioResponse\"\x00\x12Z\n\x13GenerateAudioStream\x12\x1b.audio_service.AudioRequest\x1a\".audio_service.AudioStreamResponse\"\x00\x30\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -32,11 +32,15 @@ _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'proto_files.audio_service_p
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
   _globals['_AUDIOREQUEST']._serialized_start=50
-  _globals['_AUDIOREQUEST']._serialized_end=110
-  _globals['_TEXTEMOTION']._serialized_start=112
-  _globals['_TEXTEMOTION']._serialized_end=156
-  _globals['_AUDIORESPONSE']._serialized_start=158
-  _globals['_AUDIORESPONSE']._serialized_end=230
-  _globals['_AUDIOGENERATOR']._serialized_start=232
-  _globals['_AUDIOGENERATOR']._serialized_end=326
+  _globals['_AUDIOREQUEST']._serialized_end=167
+  _globals['_TEXTEMOTION']._serialized_start=169
+  _globals['_TEXTEMOTION']._serialized_end=213
+  _globals['_AUDIORESPONSE']._serialized_start=215
+  _globals['_AUDIORESPONSE']._serialized_end=305
+  _globals['_AUDIOSEGMENT']._serialized_start=307
+  _globals['_AUDIOSEGMENT']._serialized_end=430
+  _globals['_AUDIOSTREAMRESPONSE']._serialized_start=432
+  _globals['_AUDIOSTREAMRESPONSE']._serialized_end=559
+  _globals['_AUDIOGENERATOR']._serialized_start=562
+  _globals['_AUDIOGENERATOR']._serialized_end=748
 # @@protoc_insertion_point(module_scope)
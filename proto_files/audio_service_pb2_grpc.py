@@ -39,6 +39,11 @@ class AudioGeneratorStub(object):
                 request_serializer=proto__files_dot_audio__service__pb2.AudioRequest.SerializeToString,
                 response_deserializer=proto__files_dot_audio__service__pb2.AudioResponse.FromString,
                 _registered_method=True)
+        self.GenerateAudioStream = channel.unary_stream(
+                '/audio_service.AudioGenerator/GenerateAudioStream',
+                request_serializer=proto__files_dot_audio__service__pb2.AudioRequest.SerializeToString,
+                response_deserializer=proto__files_dot_audio__service__pb2.AudioStreamResponse.FromString,
+                _registered_method=True)
 
 
 class AudioGeneratorServicer(object):
@@ -51,6 +56,13 @@ class AudioGeneratorServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def GenerateAudioStream(self, request, context):
+        """Generate audio segment by segment, streaming each one as soon as it is synthesized
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_AudioGeneratorServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -59,6 +71,11 @@ def add_AudioGeneratorServicer_to_server(servicer, server):
                     request_deserializer=proto__files_dot_audio__service__pb2.AudioRequest.FromString,
                     response_serializer=proto__files_dot_audio__service__pb2.AudioResponse.SerializeToString,
             ),
+            'GenerateAudioStream': grpc.unary_stream_rpc_method_handler(
+                    servicer.GenerateAudioStream,
+                    request_deserializer=proto__files_dot_audio__service__pb2.AudioRequest.FromString,
+                    response_serializer=proto__files_dot_audio__service__pb2.AudioStreamResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'audio_service.AudioGenerator', rpc_method_handlers)
@@ -96,3 +113,30 @@ class AudioGenerator(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def GenerateAudioStream(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/audio_service.AudioGenerator/GenerateAudioStream',
+            proto__files_dot_audio__service__pb2.AudioRequest.SerializeToString,
+            proto__files_dot_audio__service__pb2.AudioStreamResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
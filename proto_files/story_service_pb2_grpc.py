@@ -35,15 +35,25 @@ class StoryGeneratorStub(object):
             channel: A grpc.Channel.
         """
         self.GenerateStory = channel.unary_unary(
-                '/story_service.StoryGenerator/GenerateStory',   #calls our function
-                request_serializer=proto__files_dot_story__service__pb2.StoryRequest.SerializeToString,     #sends request
-                response_deserializer=proto__files_dot_story__service__pb2.StoryResponse.FromString,        #receive respone from function
+                '/story_service.StoryGenerator/GenerateStory',
+                request_serializer=proto__files_dot_story__service__pb2.StoryRequest.SerializeToString,
+                response_deserializer=proto__files_dot_story__service__pb2.StoryResponse.FromString,
+                _registered_method=True)
+        self.GenerateSegmentedStory = channel.unary_unary(
+                '/story_service.StoryGenerator/GenerateSegmentedStory',
+                request_serializer=proto__files_dot_story__service__pb2.StoryRequest.SerializeToString,
+                response_deserializer=proto__files_dot_story__service__pb2.SegmentedStoryResponse.FromString,
                 _registered_method=True)
         self.ProcessStoryEmotions = channel.unary_unary(
                 '/story_service.StoryGenerator/ProcessStoryEmotions',
                 request_serializer=proto__files_dot_story__service__pb2.ProcessRequest.SerializeToString,
                 response_deserializer=proto__files_dot_story__service__pb2.ProcessResponse.FromString,
                 _registered_method=True)
+        self.ProcessStoryEmotionsStream = channel.unary_stream(
+                '/story_service.StoryGenerator/ProcessStoryEmotionsStream',
+                request_serializer=proto__files_dot_story__service__pb2.ProcessRequest.SerializeToString,
+                response_deserializer=proto__files_dot_story__service__pb2.SentenceEmotion.FromString,
+                _registered_method=True)
         self.GenerateScenePrompts = channel.unary_unary(
                 '/story_service.StoryGenerator/GenerateScenePrompts',
                 request_serializer=proto__files_dot_story__service__pb2.SceneRequest.SerializeToString,
@@ -61,6 +71,13 @@ class StoryGeneratorServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def GenerateSegmentedStory(self, request, context):
+        """Generate a story already broken into sentences with emotions, in one LLM call
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def ProcessStoryEmotions(self, request, context):
         """Break a story into sentences with associated emotions
         """
@@ -68,6 +85,13 @@ class StoryGeneratorServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def ProcessStoryEmotionsStream(self, request, context):
+        """Same as ProcessStoryEmotions, streaming each sentence as soon as the LLM has tagged it
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def GenerateScenePrompts(self, request, context):
         """Divide a story into scenes with image prompts
         """
@@ -83,11 +107,21 @@ def add_StoryGeneratorServicer_to_server(servicer, server):
                     request_deserializer=proto__files_dot_story__service__pb2.StoryRequest.FromString,
                     response_serializer=proto__files_dot_story__service__pb2.StoryResponse.SerializeToString,
             ),
+            'GenerateSegmentedStory': grpc.unary_unary_rpc_method_handler(
+                    servicer.GenerateSegmentedStory,
+                    request_deserializer=proto__files_dot_story__service__pb2.StoryRequest.FromString,
+                    response_serializer=proto__files_dot_story__service__pb2.SegmentedStoryResponse.SerializeToString,
+            ),
             'ProcessStoryEmotions': grpc.unary_unary_rpc_method_handler(
                     servicer.ProcessStoryEmotions,
                     request_deserializer=proto__files_dot_story__service__pb2.ProcessRequest.FromString,
                     response_serializer=proto__files_dot_story__service__pb2.ProcessResponse.SerializeToString,
             ),
+            'ProcessStoryEmotionsStream': grpc.unary_stream_rpc_method_handler(
+                    servicer.ProcessStoryEmotionsStream,
+                    request_deserializer=proto__files_dot_story__service__pb2.ProcessRequest.FromString,
+                    response_serializer=proto__files_dot_story__service__pb2.SentenceEmotion.SerializeToString,
+            ),
             'GenerateScenePrompts': grpc.unary_unary_rpc_method_handler(
                     servicer.GenerateScenePrompts,
                     request_deserializer=proto__files_dot_story__service__pb2.SceneRequest.FromString,
@@ -131,6 +165,33 @@ class StoryGenerator(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def GenerateSegmentedStory(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/story_service.StoryGenerator/GenerateSegmentedStory',
+            proto__files_dot_story__service__pb2.StoryRequest.SerializeToString,
+            proto__files_dot_story__service__pb2.SegmentedStoryResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def ProcessStoryEmotions(request,
             target,
@@ -158,6 +219,33 @@ class StoryGenerator(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def ProcessStoryEmotionsStream(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/story_service.StoryGenerator/ProcessStoryEmotionsStream',
+            proto__files_dot_story__service__pb2.ProcessRequest.SerializeToString,
+            proto__files_dot_story__service__pb2.SentenceEmotion.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def GenerateScenePrompts(request,
             target,
@@ -6,13 +6,17 @@ python story_service.py &
 python audio_service.py &
 
 # 2. Start FastAPI server (background)
-uvicorn main:app --host 0.0.0.0 --port 5000 &
+python main.py --production --disable-images --port 5000 &
 
-# 3. Wait for FastAPI to be ready before launching the UI
+# 3. Wait until FastAPI is up and the gRPC services have warmed up before launching the UI
 echo "Waiting for FastAPI on port 5000..."
 while ! nc -z localhost 5000; do
   sleep 1
 done
+echo "Waiting for the gRPC services to warm up..."
+until python -c "import urllib.request; urllib.request.urlopen('http://localhost:5000/ready')" 2>/dev/null; do
+  sleep 2
+done
 
 # 4. Start the Gradio UI (after FastAPI is up)
 python utils/frontend.py
@@ -1,111 +1,407 @@
-import grpc
+import asyncio
+import grpc.aio
+import json
+import logging
+import os
 import time
-from concurrent import futures
+from contextlib import aclosing
 from proto_files import story_service_pb2
 from proto_files import story_service_pb2_grpc
 from utils.llm import OllamaModel
+from utils.llm_cache import LLMCache
+from utils.semantic_cache import SemanticCache
+from prometheus_client import Counter, Gauge, Histogram
+from utils.metrics import DEFAULT_BUCKETS, instrument_rpc, start_metrics_server
+from utils.tracing import create_tracer, trace_rpc
+from utils.channel_pool import SERVER_KEEPALIVE_OPTIONS
+from utils.health import add_aio_health_servicer, aio_warm_up
 
-class StoryGeneratorServicer(story_service_pb2_grpc.StoryGeneratorServicer):
-    def __init__(self):
-        self.generator_llm = OllamaModel(model_name="gemma3:4b-it-qat")
-        self.story_breakerLM = OllamaModel(model_name="gemma3:4b-it-qat")
-        self.scene_prompt_makerLM = OllamaModel(model_name="gemma3:4b-it-qat")
-        self.generator_llm.create_assistant("You are a story generator. Generate stories sync to genre and donot exceed length limit")
-        
-    def GenerateStory(self, request, context):
-        print(f"Received request to generate a {request.genre} story with storyline: {request.storyline}")        
-        prompt = f"""
-        Generate a compelling {request.genre} story based on the following storyline:
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# gRPC port; run more replicas on one box by giving each its own port
+PORT = int(os.getenv("STORY_SERVICE_PORT", "50051"))
+# Name reported to gRPC health checks; set STORY_SERVICE_WARMUP=0 to report SERVING without warming up first
+SERVICE_NAME = story_service_pb2.DESCRIPTOR.services_by_name["StoryGenerator"].full_name
+WARMUP = os.getenv("STORY_SERVICE_WARMUP", "1") == "1"
+# Generations run at the same time per model; the rest wait for a slot. Match OLLAMA_NUM_PARALLEL.
+MODEL_CONCURRENCY = int(os.getenv("STORY_SERVICE_MODEL_CONCURRENCY", "4"))
+# Responses by prompt, in memory and in a SQLite file shared by the replicas on one box;
+# set STORY_SERVICE_LLM_CACHE=0 to always ask the model
+LLM_CACHE = os.getenv("STORY_SERVICE_LLM_CACHE", "1") == "1"
+LLM_CACHE_PATH = os.getenv("STORY_SERVICE_LLM_CACHE_PATH", os.path.join("llm_cache", "responses.sqlite3"))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("STORY_SERVICE_LLM_CACHE_MEMORY_ENTRIES", "1000"))
+LLM_CACHE_DISK_ENTRIES = int(os.getenv("STORY_SERVICE_LLM_CACHE_DISK_ENTRIES", "100000"))
+# Opt-in: reuse the story of an earlier storyline of the same genre that is at least
+# SEMANTIC_CACHE_THRESHOLD similar (cosine of hashed character n-grams) and shares at least
+# SEMANTIC_CACHE_MIN_WORD_OVERLAP of its content words, with the same negations and word order.
+# The similarity is lexical: a paraphrase ("goes on a quest" vs "embarks on a quest", 0.87) and
+# an antonym ("destroy" vs "save the kingdom", 0.88) score alike, so both are reused.
+SEMANTIC_CACHE = os.getenv("STORY_SERVICE_SEMANTIC_CACHE", "0") == "1"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("STORY_SERVICE_SEMANTIC_CACHE_THRESHOLD", "0.85"))
+SEMANTIC_CACHE_MIN_WORD_OVERLAP = float(os.getenv("STORY_SERVICE_SEMANTIC_CACHE_MIN_WORD_OVERLAP", "0.7"))
+SEMANTIC_CACHE_ENTRIES = int(os.getenv("STORY_SERVICE_SEMANTIC_CACHE_ENTRIES", "1000"))
+# Seconds in-flight RPCs get to finish on shutdown
+SHUTDOWN_GRACE_SECONDS = 5
+
+# Prometheus metrics, served on METRICS_PORT
+METRICS_PORT = int(os.getenv("STORY_SERVICE_METRICS_PORT", "9101"))
+RPC_DURATION = Histogram("story_service_rpc_duration_seconds", "Latency of StoryGenerator RPCs", ["method"], buckets=DEFAULT_BUCKETS)
+RPC_IN_FLIGHT = Gauge("story_service_rpc_in_flight", "StoryGenerator RPCs currently being handled", ["method"])
+RPC_ERRORS = Counter("story_service_rpc_errors_total", "StoryGenerator RPCs that raised an error", ["method"])
+LLM_QUEUE_WAIT = Histogram("story_service_llm_queue_wait_seconds", "Time LLM calls waited for a slot of their model", ["model"], buckets=DEFAULT_BUCKETS)
+LLM_CANCELLED = Counter("story_service_llm_cancelled_total", "LLM generations aborted because their RPC was cancelled", ["model"])
+LLM_CACHE_LOOKUPS = Counter("story_service_llm_cache_lookups_total", "LLM response cache lookups", ["result"])
+SEMANTIC_CACHE_LOOKUPS = Counter("story_service_semantic_cache_lookups_total", "Near-duplicate storyline lookups", ["result"])
+
+# Spans are continued from the traceparent sent by the orchestrator
+TRACER = create_tracer("story_service")
+
+# Emotions the LLM may assign; each one must be the name of a reference voice of the audio service
+# (reference_audios/emotion, shipped in emotion.zip), which looks the voice up by emotion
+EMOTIONS = ["angry", "calm", "disgust", "fear", "happy", "neutral", "sad", "surprise"]
+
+# JSON schema of the GenerateSegmentedStory response, enforced by Ollama while it decodes
+SEGMENTED_STORY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "sentences": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "text": {"type": "string"},
+                    "emotion": {"type": "string", "enum": EMOTIONS}
+                },
+                "required": ["text", "emotion"]
+            }
+        }
+    },
+    "required": ["sentences"]
+}
+
+def emotion_prompt(story):
+    """Prompt that has the LLM tag every sentence of the story with an emotion, one per line"""
+    return f"""
+        Below is a story. Break it down into individual sentences and assign an appropriate emotion to each sentence.
+        Return the result as a list of sentences with their corresponding emotions.
+        Format each line as: "Sentence: [sentence text] | Emotion: [emotion]"
+        Emotions should only be the following [{",".join(EMOTIONS)}]
+        CRITICAL: DONOT ADD ANY OTHER LINE THAN THE RESPONSE. MEAN THE RESPONSE SHOULD JUST BE THE ABOVE FORMAT
+        NO STARTING OR ENDING STATEMENTS LIKE "HERE IS THE STORY...
+        Story:
+        {story}
+        """
+
+
+def story_prompt(genre, storyline):
+    """Prompt of GenerateStory"""
+    return f"""
+        Generate a compelling {genre} story based on the following storyline:
         
-        {request.storyline}
+        {storyline}
         
-        The story should have a clear beginning, middle, and end. Be creative but stay within the {request.genre} genre.
+        The story should have a clear beginning, middle, and end. Be creative but stay within the {genre} genre.
         CRITICAL: DONT EXCEED 100 WORDS
         CRITICAL: DONOT ADD ANY OTHER LINE THAN STORY IN THE RESPONSE. MEAN THE RESPONSE SHOULD JUST BE THE STORY
         NO STARTING OR ENDING STATEMENTS LIKE "HERE IS THE STORY..."
-        """        
-        story = self.generator_llm.generate_response(prompt)
+        """
+
+
+def segmented_story_prompt(genre, storyline):
+    """Prompt of GenerateSegmentedStory: the story of story_prompt, returned sentence by sentence with emotions"""
+    return f"""
+        Generate a compelling {genre} story based on the following storyline:
         
-        return story_service_pb2.StoryResponse(story=story)
-    
-    def ProcessStoryEmotions(self, request, context):
-        print(f"Received request to break story into sentences with emotions")
+        {storyline}
         
-        prompt = f"""
-        Below is a story. Break it down into individual sentences and assign an appropriate emotion to each sentence.
-        Return the result as a list of sentences with their corresponding emotions.
-        Format each line as: "Sentence: [sentence text] | Emotion: [emotion]"
-        Emotions should only be the following [angry,calm,disgust,feat,happy,neutral,sad,surprise]
-        CRITICAL: DONOT ADD ANY OTHER LINE THAN THE RESPONSE. MEAN THE RESPONSE SHOULD JUST BE THE ABOVE FORMAT
-        NO STARTING OR ENDING STATEMENTS LIKE "HERE IS THE STORY...
-        Story:
-        {request.story}
+        The story should have a clear beginning, middle, and end. Be creative but stay within the {genre} genre.
+        CRITICAL: DONT EXCEED 100 WORDS
+        Return the story as JSON: a "sentences" list holding every sentence of the story in order, each with
+        its "text" and the "emotion" it should be narrated with.
+        Emotions should only be the following [{",".join(EMOTIONS)}]
         """
+
+
+def parse_segmented_story(response):
+    """
+    SentenceEmotion pairs of a GenerateSegmentedStory response
+
+    Raises:
+        ValueError: If the response is not JSON of SEGMENTED_STORY_SCHEMA or has no sentences
+    """
+    try:
+        items = json.loads(response)["sentences"]
+        pairs = [(item["text"].strip(), item["emotion"].strip().lower()) for item in items]
+    except (KeyError, TypeError, AttributeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Response does not follow the segmented story schema: {e}") from e
+    sentences = [story_service_pb2.SentenceEmotion(text=text, emotion=emotion) for text, emotion in pairs if text]
+    if not sentences:
+        raise ValueError("Response has no sentences")
+    return sentences
+
+
+def story_namespace(method, genre):
+    """Semantic cache index of the stories an RPC wrote for a genre"""
+    return f"{method}/{' '.join(genre.lower().split())}"
+
+
+def parse_emotion_line(line):
+    """SentenceEmotion of one "Sentence: ... | Emotion: ..." line, None for any other line"""
+    if '|' not in line:
+        return None
+    parts = line.split('|')
+    if len(parts) != 2:
+        return None
+    # Extract the actual sentence and emotion
+    sentence = parts[0].strip().replace("Sentence:", "").strip()
+    emotion = parts[1].strip().replace("Emotion:", "").strip()
+    if not (sentence and emotion):
+        return None
+    return story_service_pb2.SentenceEmotion(text=sentence, emotion=emotion)
+
+
+class SentenceMerger:
+    """
+    Merges runs of consecutive sentences with the same emotion into one.
+
+    add() returns the previous group once a sentence with another emotion
+    starts a new one, so complete groups are known while sentences still
+    come in; finish() returns the last group.
+    """
+
+    def __init__(self):
+        self.group = None
+
+    def add(self, sentence):
+        if self.group is None:
+            self.group = story_service_pb2.SentenceEmotion(text=sentence.text, emotion=sentence.emotion)
+            return None
+        # If this sentence has the same emotion as our current group
+        if sentence.emotion == self.group.emotion:
+            # Merge the texts with appropriate spacing/punctuation
+            last_char = self.group.text[-1] if self.group.text else ""
+            if last_char in ['.', '!', '?', ':', ';']:
+                self.group.text += " " + sentence.text
+            else:
+                # Add a period if needed before joining
+                self.group.text += ". " + sentence.text
+            return None
+        # Different emotion: the current group is complete, start a new one with this sentence
+        complete = self.group
+        self.group = story_service_pb2.SentenceEmotion(text=sentence.text, emotion=sentence.emotion)
+        return complete
+
+    def finish(self):
+        complete, self.group = self.group, None
+        return complete
+
+
+class StoryGeneratorServicer(story_service_pb2_grpc.StoryGeneratorServicer):
+    def __init__(self):
+        cache = LLMCache(
+            LLM_CACHE_PATH,
+            max_memory_entries=LLM_CACHE_MEMORY_ENTRIES,
+            max_disk_entries=LLM_CACHE_DISK_ENTRIES,
+            on_lookup=lambda outcome: LLM_CACHE_LOOKUPS.labels(outcome).inc()
+        ) if LLM_CACHE else None
+        self.generator_llm = OllamaModel(model_name="gemma3:4b-it-qat", cache=cache)
+        self.story_breakerLM = OllamaModel(model_name="gemma3:4b-it-qat", cache=cache)
+        self.scene_prompt_makerLM = OllamaModel(model_name="gemma3:4b-it-qat", cache=cache)
+        self.generator_llm.create_assistant("You are a story generator. Generate stories sync to genre and donot exceed length limit")
+        # One semaphore per model name, shared by every OllamaModel of that model
+        self.model_slots = {}
+        self.semantic_cache = SemanticCache(
+            threshold=SEMANTIC_CACHE_THRESHOLD,
+            max_entries=SEMANTIC_CACHE_ENTRIES,
+            min_word_overlap=SEMANTIC_CACHE_MIN_WORD_OVERLAP
+        ) if SEMANTIC_CACHE else None
+        
+    async def warmup(self):
+        """Have Ollama load every model used here, so the first story does not wait for it"""
+        for model_name in {llm.model_name for llm in (self.generator_llm, self.story_breakerLM, self.scene_prompt_makerLM)}:
+            await OllamaModel(model_name=model_name).agenerate_response("Reply with OK.")
+
+    async def stream(self, llm, prompt, format=None):
+        """
+        Yield the response to prompt as it is generated, holding a slot of the model's semaphore
+
+        format constrains the response to JSON, see OllamaModel.generate_response.
+        The generation is streamed on the event loop, so a waiting or running
+        call holds no thread. When the RPC is cancelled (client gone,
+        deadline passed) the task is cancelled, which aborts the stream.
+        A response found in the LLM cache is yielded right away, without
+        waiting for a slot.
+        """
+        cached = llm.cached_response(prompt, format)
+        if cached is not None:
+            yield cached
+            return
+        slot = self.model_slots.setdefault(llm.model_name, asyncio.Semaphore(MODEL_CONCURRENCY))
+        wait_start = time.perf_counter()
+        async with slot:
+            LLM_QUEUE_WAIT.labels(llm.model_name).observe(time.perf_counter() - wait_start)
+            with TRACER.span("llm_call", model=llm.model_name):
+                stopped = True
+                try:
+                    async for piece in llm.stream_response(prompt, format=format, read_cache=False):
+                        yield piece
+                    stopped = False
+                except Exception:
+                    stopped = False
+                    raise
+                finally:
+                    # Nothing is awaited here, this also runs on GeneratorExit when the consumer
+                    # closes this generator early. A cancellation already went through
+                    # stream_response and closed its HTTP stream; after a GeneratorExit the
+                    # event loop finalizes stream_response, which closes it, once it is dropped.
+                    if stopped:
+                        LLM_CANCELLED.labels(llm.model_name).inc()
+                        logger.info(f"RPC cancelled, aborted the {llm.model_name} generation")
+
+    def similar_story(self, method, request):
+        """
+        Response of method to an earlier storyline of the same genre that is nearly the same, None if there is none
+
+        Only used with STORY_SERVICE_SEMANTIC_CACHE=1; identical prompts are
+        already answered by the LLM cache.
+        """
+        if self.semantic_cache is None:
+            return None
+        match = self.semantic_cache.lookup(story_namespace(method, request.genre), request.storyline)
+        SEMANTIC_CACHE_LOOKUPS.labels("miss" if match is None else "hit").inc()
+        if match is None:
+            return None
+        response, similarity = match
+        logger.info(f"Reusing the story of a storyline {similarity:.2f} similar")
+        return response
+
+    def remember_story(self, method, request, response):
+        """Make a response of method available to similar_story"""
+        if self.semantic_cache is not None and response:
+            self.semantic_cache.add(story_namespace(method, request.genre), request.storyline, response)
+
+    async def complete(self, llm, prompt, format=None):
+        """Generate the whole response to prompt (see stream)"""
+        response = ""
+        async with aclosing(self.stream(llm, prompt, format=format)) as pieces:
+            async for piece in pieces:
+                response += piece
+        return response
+        
+    @instrument_rpc("GenerateStory", RPC_DURATION, RPC_IN_FLIGHT, RPC_ERRORS)
+    @trace_rpc(TRACER, "GenerateStory")
+    async def GenerateStory(self, request, context):
+        logger.info(f"Received request to generate a {request.genre} story with storyline: {request.storyline}")        
+        story = self.similar_story("GenerateStory", request)
+        if story is None:
+            story = await self.complete(self.generator_llm, story_prompt(request.genre, request.storyline))
+            self.remember_story("GenerateStory", request, story)
         
-        result = self.story_breakerLM.generate_response(prompt)
+        return story_service_pb2.StoryResponse(story=story)
+
+    @instrument_rpc("GenerateSegmentedStory", RPC_DURATION, RPC_IN_FLIGHT, RPC_ERRORS)
+    @trace_rpc(TRACER, "GenerateSegmentedStory")
+    async def GenerateSegmentedStory(self, request, context):
+        """
+        GenerateStory and ProcessStoryEmotions in one LLM call
+
+        The model writes the story directly as JSON sentences with emotions,
+        constrained to SEGMENTED_STORY_SCHEMA by Ollama, so the story is not
+        sent back through the LLM to be tagged. Consecutive sentences with the
+        same emotion are merged as in ProcessStoryEmotions.
+        """
+        logger.info(f"Received request to generate a segmented {request.genre} story with storyline: {request.storyline}")
+        result = self.similar_story("GenerateSegmentedStory", request)
+        reused = result is not None
+        if not reused:
+            result = await self.complete(
+                self.generator_llm, segmented_story_prompt(request.genre, request.storyline), format=SEGMENTED_STORY_SCHEMA
+            )
+        
+        parse_start = time.perf_counter()
+        try:
+            sentences = parse_segmented_story(result)
+        except ValueError as e:
+            logger.warning(f"Error parsing segmented story: {e}")
+            return story_service_pb2.SegmentedStoryResponse(success=0, error=str(e))
+        if not reused:
+            self.remember_story("GenerateSegmentedStory", request, result)
+        story = " ".join(pair.text for pair in sentences)
+        merger = SentenceMerger()
+        merged_sentences = [group for group in map(merger.add, sentences) if group is not None]
+        merged_sentences.append(merger.finish())
+        TRACER.record_span("response_parsing", time.perf_counter() - parse_start, sentences=len(merged_sentences))
+        logger.info(f"Generated a story of {len(sentences)} sentences, {len(merged_sentences)} after merging")
         
+        return story_service_pb2.SegmentedStoryResponse(story=story, sentences=merged_sentences, success=1, error='none')
+    
+    @instrument_rpc("ProcessStoryEmotions", RPC_DURATION, RPC_IN_FLIGHT, RPC_ERRORS)
+    @trace_rpc(TRACER, "ProcessStoryEmotions")
+    async def ProcessStoryEmotions(self, request, context):
+        logger.info("Received request to break story into sentences with emotions")
+        
+        result = await self.complete(self.story_breakerLM, emotion_prompt(request.story))
+        
+        parse_start = time.perf_counter()
         # Parse the response into sentence-emotion pairs
-        temp_sentences = []
-        for line in result.strip().split('\n'):
-            if '|' in line:
-                parts = line.split('|')
-                if len(parts) == 2:
-                    sentence_part = parts[0].strip()
-                    emotion_part = parts[1].strip()
-                    
-                    # Extract the actual sentence and emotion
-                    sentence = sentence_part.replace("Sentence:", "").strip()
-                    emotion = emotion_part.replace("Emotion:", "").strip()
-                    
-                    if sentence and emotion:
-                        temp_sentences.append(story_service_pb2.SentenceEmotion(
-                            text=sentence,
-                            emotion=emotion
-                        ))
-        merged_sentences = []
-        print("Merging redundant ones")
+        temp_sentences = [
+            pair for pair in map(parse_emotion_line, result.strip().split('\n')) if pair is not None
+        ]
+        logger.info("Merging redundant ones")
+        merger = SentenceMerger()
+        merged_sentences = [group for group in map(merger.add, temp_sentences) if group is not None]
         if temp_sentences:
-            current_group = temp_sentences[0]
-            
-            for i in range(1, len(temp_sentences)):
-                print("here")
-                current_sentence = temp_sentences[i]
-                print(f"current sentence {current_sentence}")
-                # If this sentence has the same emotion as our current group
-                if current_sentence.emotion == current_group.emotion:
-                    # Merge the texts with appropriate spacing/punctuation
-                    last_char = current_group.text[-1] if current_group.text else ""
-                    if last_char in ['.', '!', '?', ':', ';']:
-                        current_group.text += " " + current_sentence.text
-                    else:
-                        # Add a period if needed before joining
-                        current_group.text += ". " + current_sentence.text
-                else:
-                    # Different emotion, add the current group to our results
-                    merged_sentences.append(story_service_pb2.SentenceEmotion(
-                        text=current_group.text,
-                        emotion=current_group.emotion
-                    ))
-                    # Start a new group with this sentence
-                    current_group = current_sentence
-        
-              # Don't forget to add the last group
-            merged_sentences.append(story_service_pb2.SentenceEmotion(
-                text=current_group.text,
-                emotion=current_group.emotion
-            ))
+            # Don't forget to add the last group
+            merged_sentences.append(merger.finish())
     
-        print("Original sentence count:", len(temp_sentences))
-        print("Merged sentence count:", len(merged_sentences))
+        TRACER.record_span("response_parsing", time.perf_counter() - parse_start, sentences=len(merged_sentences))
+        
+        logger.info(f"Original sentence count: {len(temp_sentences)}")
+        logger.info(f"Merged sentence count: {len(merged_sentences)}")
         
         for i, sentence in enumerate(merged_sentences):
-            print(f"Merged {i+1}: {sentence.text} | {sentence.emotion}")
+            logger.info(f"Merged {i+1}: {sentence.text} | {sentence.emotion}")
         
         return story_service_pb2.ProcessResponse(sentences=merged_sentences, success=1, error='none')
 
+    @instrument_rpc("ProcessStoryEmotionsStream", RPC_DURATION, RPC_IN_FLIGHT, RPC_ERRORS)
+    @trace_rpc(TRACER, "ProcessStoryEmotionsStream")
+    async def ProcessStoryEmotionsStream(self, request, context):
+        """
+        ProcessStoryEmotions as a stream, parsed while the LLM generates
+
+        Every complete line of the response is parsed right away. A merged
+        sentence is sent as soon as the next line has a different emotion
+        (its merge group is complete), so the caller can start synthesizing
+        it while the rest of the story is still being tagged.
+        """
+        logger.info("Received request to stream the sentences and emotions of a story")
+        merger = SentenceMerger()
+        pending = ""
+        sent = 0
+        async with aclosing(self.stream(self.story_breakerLM, emotion_prompt(request.story))) as pieces:
+            async for piece in pieces:
+                pending += piece
+                *lines, pending = pending.split('\n')
+                for pair in map(parse_emotion_line, lines):
+                    group = merger.add(pair) if pair is not None else None
+                    if group is not None:
+                        sent += 1
+                        yield group
+        pair = parse_emotion_line(pending)
+        group = merger.add(pair) if pair is not None else None
+        for group in (group, merger.finish()):
+            if group is not None:
+                sent += 1
+                yield group
+        logger.info(f"Streamed {sent} merged sentences")
+
     
-    def GenerateScenePrompts(self, request, context):
-        print(f"Received request to generate scene prompts")
+    @instrument_rpc("GenerateScenePrompts", RPC_DURATION, RPC_IN_FLIGHT, RPC_ERRORS)
+    @trace_rpc(TRACER, "GenerateScenePrompts")
+    async def GenerateScenePrompts(self, request, context):
+        logger.info("Received request to generate scene prompts")
         
         prompt = f"""
         Below is a story with a total audio duration of {request.audio_duration} seconds. Divide it into distinct scenes (around 3-5 scenes) and for each scene create an image prompt that captures the visual essence of that scene.
@@ -126,8 +422,9 @@ class StoryGeneratorServicer(story_service_pb2_grpc.StoryGeneratorServicer):
         {request.story}
         """
         
-        result = self.scene_prompt_makerLM.generate_response(prompt)
+        result = await self.complete(self.scene_prompt_makerLM, prompt)
         
+        parse_start = time.perf_counter()
         # Parse the response to extract scenes
         scenes = []
         current_scene = None
@@ -149,7 +446,7 @@ class StoryGeneratorServicer(story_service_pb2_grpc.StoryGeneratorServicer):
                         "prompt": ""
                     }
                 except Exception as e:
-                    print(f"Error parsing scene header: {e}")
+                    logger.warning(f"Error parsing scene header: {e}")
                     continue
             
             # Check if this is an image prompt line
@@ -160,8 +457,8 @@ class StoryGeneratorServicer(story_service_pb2_grpc.StoryGeneratorServicer):
                 # Add the complete scene to our list
                 scenes.append(story_service_pb2.ScenePrompt(
                     scene_number = i,
-                    start_line=current_scene["start_line"],  # now represents start_duration in seconds
-                    end_line=current_scene["end_line"],      # now represents end_duration in seconds
+                    start_line=int(current_scene["start_line"]),  # now represents start_duration in seconds
+                    end_line=int(current_scene["end_line"]),      # now represents end_duration in seconds
                     image_prompt=current_scene["prompt"]
                 ))
                 current_scene = None
@@ -170,22 +467,32 @@ class StoryGeneratorServicer(story_service_pb2_grpc.StoryGeneratorServicer):
             elif current_scene is not None and "prompt" in current_scene and current_scene["prompt"]:
                 current_scene["prompt"] += " " + line
         
-        return story_service_pb2.SceneResponse(scenes=scenes,sucess=1,error='none')
+        TRACER.record_span("response_parsing", time.perf_counter() - parse_start, scenes=len(scenes))
+        
+        return story_service_pb2.SceneResponse(scenes=scenes,success=1,error='none')
 
 
-def serve():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    story_service_pb2_grpc.add_StoryGeneratorServicer_to_server(
-        StoryGeneratorServicer(), server)
-    server.add_insecure_port('[::]:50051')
-    server.start()
-    print("Story Generator Server started on port 50051...")
+async def serve():
+    # grpc.aio: every RPC is a task on one event loop, concurrency is bounded by the model semaphores
+    server = grpc.aio.server(options=SERVER_KEEPALIVE_OPTIONS)
+    servicer = StoryGeneratorServicer()
+    story_service_pb2_grpc.add_StoryGeneratorServicer_to_server(servicer, server)
+    health_servicer = await add_aio_health_servicer(server, SERVICE_NAME)
+    server.add_insecure_port(f'[::]:{PORT}')
+    await server.start()
+    logger.info(f"Story Generator Server started on port {PORT}...")
+    start_metrics_server(METRICS_PORT)
+    await aio_warm_up(servicer.warmup if WARMUP else None, health_servicer, SERVICE_NAME)
     try:
-        while True:
-            time.sleep(86400)  # One day in seconds
-    except KeyboardInterrupt:
-        server.stop(0)
+        await server.wait_for_termination()
+    except asyncio.CancelledError:
+        # Ctrl+C: report NOT_SERVING and give in-flight RPCs a moment to finish
+        await health_servicer.enter_graceful_shutdown()
+        await server.stop(SHUTDOWN_GRACE_SECONDS)
 
 
 if __name__ == '__main__':
-    serve()
\ No newline at end of file
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
\ No newline at end of file
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The services are top-level modules of the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Tests do not write span files
+os.environ.setdefault("STORY2AUDIO_TRACING", "0")
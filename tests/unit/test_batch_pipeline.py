@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+main = pytest.importorskip("main")
+from proto_files import story_service_pb2
+
+
+def story_request(storyline):
+    return {"storyline": storyline, "genre": "fantasy"}
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    async def generate_segmented_story(storyline, genre):
+        if storyline == "empty":
+            return "", []
+        return storyline, [story_service_pb2.SentenceEmotion(text=storyline, emotion="calm")]
+
+    synthesized = []
+
+    async def synthesize_stories(stories):
+        synthesized.append(sorted(stories))
+        if len(stories) > 1:
+            raise RuntimeError("audio replica failed")
+        key = next(iter(stories))
+        if key == "broken":
+            raise RuntimeError("bad segment")
+        return {key: (f"generated_audio/{key}.wav", 1.0)}
+
+    monkeypatch.setattr(main, "generate_segmented_story", generate_segmented_story)
+    monkeypatch.setattr(main, "synthesize_stories", synthesize_stories)
+    monkeypatch.setattr(main, "result_cache", None)
+    return synthesized
+
+
+def test_failed_batch_audio_only_fails_the_failing_story(pipeline):
+    batch = {job_id: (story_request(job_id), None) for job_id in ("ok", "broken", "also_ok")}
+    outcomes = asyncio.run(main.run_batch_pipeline(batch))
+
+    assert outcomes["ok"]["audio_file_path"] == "generated_audio/ok.wav"
+    assert outcomes["also_ok"]["audio_file_path"] == "generated_audio/also_ok.wav"
+    assert isinstance(outcomes["broken"], RuntimeError)
+    # One shared call, then one call per story
+    assert pipeline == [["also_ok", "broken", "ok"], ["ok"], ["broken"], ["also_ok"]]
+
+
+def test_empty_story_fails_alone_before_the_shared_workload(pipeline):
+    batch = {job_id: (story_request(job_id), None) for job_id in ("ok", "empty")}
+    outcomes = asyncio.run(main.run_batch_pipeline(batch))
+
+    assert outcomes["ok"]["audio_file_path"] == "generated_audio/ok.wav"
+    assert str(outcomes["empty"]) == "The story has no sentences to narrate"
+    assert pipeline == [["ok"]]
@@ -0,0 +1,33 @@
+import asyncio
+import json
+
+import pytest
+
+main = pytest.importorskip("main")
+
+
+def test_merging_no_segments_is_rejected_without_writing_a_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(main.HTTPException) as error:
+        main.merge_story_segments([])
+    assert error.value.status_code == 422
+    assert not (tmp_path / "generated_audio").exists()
+
+
+def test_stream_reports_an_empty_story(monkeypatch):
+    async def generate_segmented_story(storyline, genre):
+        return "", []
+
+    async def synthesize_routed_segments(sentences, indexes=None):
+        return
+        yield
+
+    monkeypatch.setattr(main, "generate_segmented_story", generate_segmented_story)
+    monkeypatch.setattr(main, "synthesize_routed_segments", synthesize_routed_segments)
+
+    async def collect():
+        return [event async for event in main.stream_story_pipeline("", "fantasy")]
+
+    events = asyncio.run(collect())
+    assert events[-1].startswith("event: error\n")
+    assert json.loads(events[-1].split("data: ", 1)[1]) == {"message": "The story has no sentences to narrate"}
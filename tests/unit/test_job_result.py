@@ -0,0 +1,33 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+main = pytest.importorskip("main")
+from fastapi import HTTPException
+from utils.jobs import Job, JOB_FAILED, JOB_RUNNING
+
+
+def job_with_status(monkeypatch, status, error=None):
+    job = Job({"storyline": "a knight", "genre": "fantasy"})
+    job.status = status
+    job.error = error
+    monkeypatch.setattr(main, "job_manager", SimpleNamespace(get=lambda job_id: job))
+    return job
+
+
+def test_failed_job_result_is_a_conflict_with_its_error(monkeypatch):
+    job = job_with_status(monkeypatch, JOB_FAILED, "Service unavailable: no audio replica")
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(main.get_job_result(job.id))
+    assert error.value.status_code == 409
+    assert "status: failed" in error.value.detail
+    assert "Service unavailable: no audio replica" in error.value.detail
+
+
+def test_unfinished_job_result_is_a_conflict(monkeypatch):
+    job = job_with_status(monkeypatch, JOB_RUNNING)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(main.get_job_result(job.id))
+    assert error.value.status_code == 409
+    assert "status: running" in error.value.detail
@@ -0,0 +1,78 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+main = pytest.importorskip("main")
+from fastapi import HTTPException
+from utils.job_store import JobStore
+from utils.jobs import Job, JOB_SUCCEEDED
+
+
+def finished_job(story, sentences):
+    job = Job({"storyline": "a knight", "genre": "fantasy"})
+    job.status = JOB_SUCCEEDED
+    job.result = {
+        "story": story,
+        "sentences": [{"text": text, "emotion": emotion} for text, emotion in sentences],
+        "audio_file_path": "generated_audio/story.wav",
+    }
+    return job
+
+
+def test_unknown_emotion_is_rejected():
+    source = finished_job("A knight rode.", [("A knight rode.", "calm")])
+    with pytest.raises(HTTPException) as error:
+        main.rerender_job_request(source, [main.SentenceEdit(index=0, emotion="feat")])
+    assert error.value.status_code == 422
+
+
+def test_edited_story_is_rebuilt_from_the_sentences():
+    # Merged sentences do not appear verbatim in the story text
+    source = finished_job("A knight rode.\nThe sun rose.", [("A knight rode. The sun rose.", "calm")])
+    request = main.rerender_job_request(source, [main.SentenceEdit(index=0, text="A knight walked.", emotion="Sad")])
+    assert request["story"] == "A knight walked."
+    assert request["sentences"] == [{"text": "A knight walked.", "emotion": "sad"}]
+    assert request["changed"] == [0]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs"))
+    yield store
+    store.close()
+
+
+def rerender(monkeypatch, store, source, changed):
+    synthesized = []
+
+    async def synthesize_routed_segments(sentences, indexes=None):
+        synthesized.extend(indexes)
+        for index in indexes:
+            yield index, SimpleNamespace(audio_data=b"new")
+
+    monkeypatch.setattr(main, "job_manager", SimpleNamespace(get=lambda job_id: source, store=store))
+    monkeypatch.setattr(main, "synthesize_routed_segments", synthesize_routed_segments)
+    monkeypatch.setattr(main, "merge_story_segments", lambda segments: ("generated_audio/new.wav", 1.0))
+    request = {
+        "rerender_of": source.id,
+        "story": source.result["story"],
+        "sentences": source.result["sentences"],
+        "changed": changed,
+    }
+    asyncio.run(main.rerender_story(request, store.checkpoints("rerender")))
+    return synthesized
+
+
+def test_only_edited_sentences_are_synthesized(monkeypatch, store):
+    source = finished_job("One. Two. Three.", [("One.", "calm"), ("Two.", "calm"), ("Three.", "calm")])
+    checkpoints = store.checkpoints(source.id)
+    for index in range(3):
+        asyncio.run(checkpoints.save_file(f"segment/{index}", f"segment_{index}.wav", b"old"))
+    assert rerender(monkeypatch, store, source, [1]) == [1]
+
+
+def test_cached_source_without_segments_synthesizes_the_whole_story(monkeypatch, store):
+    # A job answered from the result cache has no segment checkpoints
+    source = finished_job("One. Two. Three.", [("One.", "calm"), ("Two.", "calm"), ("Three.", "calm")])
+    assert rerender(monkeypatch, store, source, [1]) == [0, 1, 2]
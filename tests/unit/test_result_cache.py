@@ -0,0 +1,113 @@
+import json
+import os
+import threading
+
+from utils.result_cache import ResultCache
+
+
+def make_result(tmp_path, name, size):
+    audio_path = tmp_path / f"{name}.wav"
+    audio_path.write_bytes(name.encode() * size)
+    return {"story": name, "sentences": [], "audio_file_path": str(audio_path)}
+
+
+def stored_bytes(cache):
+    return sum(entry.stat().st_size for entry in os.scandir(cache.objects_dir))
+
+
+def test_evicts_least_recently_used_by_size(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=250)
+    for name in ("a", "b", "c"):
+        cache.put(name, make_result(tmp_path, name, 100))
+    assert cache.get("a") is None
+    assert cache.get("c") is not None
+    assert cache.stats()["bytes"] == stored_bytes(cache) == 200
+
+
+def test_shared_artifacts_are_counted_once(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=1000)
+    result = make_result(tmp_path, "a", 100)
+    cache.put("first", result)
+    cache.put("second", result)
+    assert cache.stats()["bytes"] == 100
+    with cache._transaction():
+        cache._remove_entry("first")
+    assert cache.get("second") is not None
+    assert cache.stats()["bytes"] == stored_bytes(cache) == 100
+
+
+def test_concurrent_get_and_put(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=2000)
+    results = [make_result(tmp_path, f"r{i}", 50 + i) for i in range(40)]
+    errors = []
+
+    def worker(offset):
+        try:
+            for i in range(200):
+                key = str((i + offset) % len(results))
+                if cache.get(key) is None:
+                    cache.put(key, results[int(key)])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert cache.stats()["bytes"] == stored_bytes(cache) <= 2000
+
+
+def test_reloads_index_and_size(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=1000)
+    cache.put("a", make_result(tmp_path, "a", 100))
+    reloaded = ResultCache(str(tmp_path / "cache"), max_bytes=1000)
+    assert reloaded.stats()["bytes"] == 100
+    assert reloaded.get("a")["story"] == "a"
+
+
+def last_access(cache, key):
+    return cache.db.execute("SELECT last_access FROM entries WHERE key = ?", (key,)).fetchone()[0]
+
+
+def test_hits_update_access_times_lazily(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_bytes=1000)
+    cache.put("a", make_result(tmp_path, "a", 100))
+    cache.put("b", make_result(tmp_path, "b", 100))
+    stored = last_access(cache, "a")
+    assert cache.get("a") is not None
+    assert last_access(cache, "a") == stored
+
+    cache.flush()
+    # "a" was read after "b" was stored, so it is now the most recently used
+    assert last_access(cache, "a") > last_access(cache, "b")
+
+
+def test_processes_share_one_index(tmp_path):
+    # Two caches on one directory, like the server workers of the orchestrator
+    first = ResultCache(str(tmp_path / "cache"), max_bytes=250)
+    second = ResultCache(str(tmp_path / "cache"), max_bytes=250)
+    first.put("a", make_result(tmp_path, "a", 100))
+    assert second.get("a")["story"] == "a"
+    second.put("b", make_result(tmp_path, "b", 100))
+    first.put("c", make_result(tmp_path, "c", 100))
+    # The limit holds for both together, and the eviction is seen by both
+    assert first.stats()["bytes"] == second.stats()["bytes"] == stored_bytes(first) == 200
+    assert second.get("a") is None
+    assert os.path.exists(second.get("c")["audio_file_path"])
+
+
+def test_imports_entries_of_the_older_layout(tmp_path):
+    cache_dir = tmp_path / "cache"
+    (cache_dir / "objects").mkdir(parents=True)
+    (cache_dir / "entries").mkdir()
+    audio_path = cache_dir / "objects" / "a.wav"
+    audio_path.write_bytes(b"a" * 100)
+    entry = {"key": "a", "created_at": 1e10, "last_access": 1e10,
+             "result": {"story": "a", "sentences": [], "audio_file_path": str(audio_path)}}
+    (cache_dir / "entries" / "a.json").write_text(json.dumps(entry))
+    cache = ResultCache(str(cache_dir), max_bytes=1000)
+    assert cache.get("a")["story"] == "a"
+    assert cache.stats()["bytes"] == 100
+    assert not (cache_dir / "entries").exists()
@@ -0,0 +1,87 @@
+import pytest
+
+pytest.importorskip("numpy")
+from utils.semantic_cache import SemanticCache, content_words, words_match
+
+STORYLINE = "A brave knight embarks on a quest to save the kingdom"
+
+
+@pytest.fixture
+def cache():
+    cache = SemanticCache()
+    cache.add("fantasy", STORYLINE, "story")
+    return cache
+
+
+@pytest.mark.parametrize("storyline", [
+    STORYLINE,
+    "a  brave knight embarks on a quest to save the kingdom!!",
+    "A brave knight embarked on a quest to save the kingdom",
+    "The brave knight embarks on the quest to save a kingdom.",
+])
+def test_reuses_storylines_that_only_differ_in_form(cache, storyline):
+    assert cache.lookup("fantasy", storyline)[0] == "story"
+
+
+@pytest.mark.parametrize("storyline", [
+    "a brave knight goes on a quest to save the kingdom",
+    "A brave knight embarks on a journey to save the kingdom",
+])
+def test_reuses_paraphrases(cache, storyline):
+    assert cache.lookup("fantasy", storyline)[0] == "story"
+
+
+@pytest.mark.parametrize("storyline", [
+    "A brave knight does not embark on a quest to save the kingdom",
+    "A brave knight doesn't embark on a quest to save the kingdom",
+    "A kingdom embarks on a quest to save the brave knight",
+    "A cowardly wizard hides from a quest to save the kingdom",
+])
+def test_does_not_reuse_negated_swapped_or_different_storylines(cache, storyline):
+    assert cache.lookup("fantasy", storyline) is None
+
+
+def test_similarity_decides_between_candidates():
+    cache = SemanticCache()
+    cache.add("fantasy", "A brave knight embarks on a quest to destroy the kingdom", "destroy")
+    cache.add("fantasy", STORYLINE, "save")
+    assert cache.lookup("fantasy", "a brave knight embarked on a quest to save the kingdom")[0] == "save"
+
+
+def test_threshold_decides():
+    strict = SemanticCache(threshold=0.9)
+    strict.add("fantasy", STORYLINE, "story")
+    assert strict.lookup("fantasy", "a brave knight goes on a quest to save the kingdom") is None
+
+
+def test_full_overlap_only_reuses_the_same_content_words():
+    exact = SemanticCache(min_word_overlap=1.0)
+    exact.add("fantasy", STORYLINE, "story")
+    assert exact.lookup("fantasy", "a brave knight goes on a quest to save the kingdom") is None
+    assert exact.lookup("fantasy", "The brave knight embarked on the quest to save a kingdom.")[0] == "story"
+
+
+def test_words_match_keeps_negations_and_order():
+    words = content_words("A knight guards the princess")
+    assert words_match(words, content_words("The knight guarded a princess"), 1.0)
+    assert not words_match(words, content_words("A princess guards the knight"), 0.7)
+    assert not words_match(words, content_words("A knight never guards the princess"), 0.0)
+
+
+def test_namespaces_are_separate(cache):
+    assert cache.lookup("horror", STORYLINE) is None
+
+
+def test_picks_the_candidate_with_the_same_content_words():
+    cache = SemanticCache(threshold=0.8)
+    cache.add("fantasy", "A brave knight embarks on a quest to destroy the kingdom", "destroy")
+    cache.add("fantasy", STORYLINE, "save")
+    assert cache.lookup("fantasy", "a brave knight embarked on a quest to save the kingdom")[0] == "save"
+
+
+def test_keeps_the_last_max_entries():
+    cache = SemanticCache(max_entries=20)
+    for i in range(50):
+        cache.add("fantasy", f"story number {i} about things", i)
+    assert cache.lookup("fantasy", "story number 49 about things")[0] == 49
+    assert cache.lookup("fantasy", "story number 3 about things") is None
@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.singleflight import SingleFlight
+
+
+def test_callers_share_one_execution():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "done"
+
+        results = await asyncio.gather(*(flight.run("key", work) for _ in range(3)))
+        return calls, results, len(flight)
+
+    calls, results, pending = asyncio.run(scenario())
+    assert calls == [1]
+    assert results == ["done"] * 3
+    assert pending == 0
+
+
+def test_caller_timeout_leaves_work_running_for_others():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.1)
+            return "done"
+
+        hurried = asyncio.create_task(flight.run("key", work, timeout=0.01))
+        patient = asyncio.create_task(flight.run("key", work))
+        with pytest.raises(asyncio.TimeoutError):
+            await hurried
+        return await patient
+
+    assert asyncio.run(scenario()) == "done"
+
+
+def test_shared_run_ignores_the_first_callers_deadline_and_priority(monkeypatch):
+    main = pytest.importorskip("main")
+    monkeypatch.setattr(main, "result_cache", None)
+    runs = []
+
+    async def run_and_cache_story_pipeline(cache_key, storyline, genre):
+        runs.append((main.request_deadline.get(), main.background_work.get()))
+        await asyncio.sleep(0.05)
+        return {"story": storyline}
+
+    monkeypatch.setattr(main, "run_and_cache_story_pipeline", run_and_cache_story_pipeline)
+
+    async def call(deadline_seconds, background):
+        main.request_deadline.set(time.monotonic() + deadline_seconds)
+        main.background_work.set(background)
+        return await main.run_cached_story_pipeline("a knight", "fantasy")
+
+    async def scenario():
+        hurried = asyncio.create_task(call(0.01, False))
+        patient = asyncio.create_task(call(10, False))
+        job = asyncio.create_task(call(10, True))
+        with pytest.raises(main.HTTPException) as error:
+            await hurried
+        return error.value.status_code, await patient, await job
+
+    status_code, patient, job = asyncio.run(scenario())
+    assert status_code == 504
+    assert patient == job == {"story": "a knight"}
+    # One run per priority class, neither bound to a caller's deadline
+    assert sorted(runs, key=lambda run: run[1]) == [(None, False), (None, True)]
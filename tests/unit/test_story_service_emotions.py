@@ -0,0 +1,37 @@
+import os
+import zipfile
+
+import pytest
+
+pytest.importorskip("ollama")
+story_service = pytest.importorskip("story_service")
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def reference_voices():
+    """Emotions with a reference voice in emotion.zip"""
+    with zipfile.ZipFile(os.path.join(REPO_ROOT, "emotion.zip")) as archive:
+        return {
+            os.path.splitext(os.path.basename(name))[0]
+            for name in archive.namelist()
+            if name.endswith(".wav")
+        }
+
+
+def test_every_schema_emotion_has_a_reference_voice():
+    schema_emotions = story_service.SEGMENTED_STORY_SCHEMA["properties"]["sentences"]["items"]["properties"]["emotion"]["enum"]
+    assert set(schema_emotions) <= reference_voices()
+
+
+def test_emotion_prompt_only_offers_reference_voices():
+    prompt = story_service.emotion_prompt("Once upon a time.")
+    offered = prompt.split("Emotions should only be the following [")[1].split("]")[0].split(",")
+    assert set(offered) <= reference_voices()
+
+
+def test_parse_segmented_story_normalizes_emotions():
+    sentences = story_service.parse_segmented_story(
+        '{"sentences": [{"text": " A dragon! ", "emotion": "Fear"}]}'
+    )
+    assert [(pair.text, pair.emotion) for pair in sentences] == [("A dragon!", "fear")]
@@ -0,0 +1,51 @@
+import json
+import os
+
+from utils.tracing import FileExporter, Tracer, create_tracer
+
+
+def read_spans(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_spans_are_written_by_the_background_thread(tmp_path):
+    path = tmp_path / "traces" / "service.jsonl"
+    exporter = FileExporter(str(path))
+    tracer = Tracer("service", exporter)
+    with tracer.span("parent") as parent:
+        tracer.record_span("child", 0.5, items=3)
+    exporter.close()
+    child, parent_span = read_spans(path)
+    assert child["parentId"] == parent.span_id == parent_span["id"]
+    assert child["tags"] == {"items": "3"}
+
+
+def test_file_is_rotated_at_max_bytes(tmp_path):
+    path = tmp_path / "service.jsonl"
+    exporter = FileExporter(str(path), max_bytes=2000)
+    tracer = Tracer("service", exporter)
+    for i in range(200):
+        tracer.record_span(f"span {i}", 0.1)
+    exporter.close()
+    rotated = path.with_name("service.jsonl.1")
+    assert rotated.exists()
+    assert not path.exists() or path.stat().st_size < 2000
+    newest = read_spans(path) if path.exists() else read_spans(rotated)
+    assert newest[-1]["name"] == "span 199"
+
+
+def test_full_queue_drops_spans(tmp_path):
+    exporter = FileExporter(str(tmp_path / "service.jsonl"), max_queued=1)
+    exporter.close()
+    exporter.export({"name": "queued"})
+    exporter.export({"name": "dropped"})
+    assert exporter.dropped == 1
+
+
+def test_each_process_writes_its_own_file(tmp_path, monkeypatch):
+    monkeypatch.setenv("STORY2AUDIO_TRACING", "1")
+    monkeypatch.setenv("STORY2AUDIO_TRACE_DIR", str(tmp_path))
+    tracer = create_tracer("service")
+    tracer.exporter.close()
+    assert tracer.exporter.path == str(tmp_path / f"service.{os.getpid()}.jsonl")
@@ -0,0 +1,172 @@
+import asyncio
+import contextvars
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Set for work that is already queued elsewhere (e.g. background jobs); such
+# callers wait for a slot without the queue bound or the queue-time limit
+background_work = contextvars.ContextVar("background_work", default=False)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a stage cannot take more work; maps to HTTP 429."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class StageLimiter:
+    """
+    Concurrency limit for one downstream stage with a bounded wait queue.
+
+    At most max_concurrency calls run at once. Up to max_queue further calls
+    wait for a slot, each for at most max_queue_seconds; anything beyond that
+    is rejected immediately so callers can back off instead of timing out.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, max_queue_seconds: float,
+                 on_reject: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            name: Stage name used in logs and stats
+            max_concurrency: Number of calls allowed to run at the same time
+            max_queue: Number of calls allowed to wait for a slot
+            max_queue_seconds: Longest time a call may wait for a slot
+            on_reject: Called with the stage name for every rejected or timed out call
+        """
+        self.name = name
+        self.on_reject = on_reject
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_seconds = max_queue_seconds
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+        # Exponentially weighted moving averages, in seconds
+        self.avg_wait_seconds = 0.0
+        self.avg_service_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def retry_after(self) -> int:
+        """Estimate in whole seconds until a queued slot frees up"""
+        backlog = (self.queued + self.in_flight) / self.max_concurrency
+        return max(1, math.ceil(backlog * self.avg_service_seconds))
+
+    def is_full(self) -> bool:
+        return self.queued >= self.max_queue and self.in_flight >= self.max_concurrency
+
+    def check_capacity(self):
+        """
+        Raises:
+            AdmissionRejected: If a new call would be rejected right now
+        """
+        if self.is_full():
+            self.rejected += 1
+            self._notify_reject()
+            raise AdmissionRejected(
+                f"The {self.name} stage is at capacity ({self.queued} requests queued)",
+                self.retry_after()
+            )
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one concurrency slot of the stage for the duration of the block"""
+        bounded = not background_work.get()
+        if bounded:
+            self.check_capacity()
+
+        self.queued += 1
+        wait_start = time.monotonic()
+        try:
+            if bounded:
+                await asyncio.wait_for(self.semaphore.acquire(), timeout=self.max_queue_seconds)
+            else:
+                await self.semaphore.acquire()
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            self._notify_reject()
+            raise AdmissionRejected(
+                f"Timed out after {self.max_queue_seconds:.0f}s waiting for the {self.name} stage",
+                self.retry_after()
+            )
+        finally:
+            self.queued -= 1
+        self._record_wait(time.monotonic() - wait_start)
+
+        self.in_flight += 1
+        service_start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.semaphore.release()
+            self.avg_service_seconds = self._ewma(self.avg_service_seconds, time.monotonic() - service_start)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "avg_wait_seconds": round(self.avg_wait_seconds, 3),
+            "max_wait_seconds": round(self.max_wait_seconds, 3),
+            "avg_service_seconds": round(self.avg_service_seconds, 3),
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+    def _notify_reject(self):
+        if self.on_reject is not None:
+            self.on_reject(self.name)
+
+    def _record_wait(self, wait_seconds: float):
+        self.avg_wait_seconds = self._ewma(self.avg_wait_seconds, wait_seconds)
+        self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+    @staticmethod
+    def _ewma(average: float, sample: float, alpha: float = 0.2) -> float:
+        return sample if average == 0.0 else (1 - alpha) * average + alpha * sample
+
+
+class AdmissionController:
+    """The StageLimiters of all downstream stages."""
+
+    def __init__(self, limits: Dict[str, int], max_queue: int, max_queue_seconds: float,
+                 on_reject: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            limits: Maximum concurrency per stage name
+            max_queue: Wait queue size of each stage
+            max_queue_seconds: Maximum time to wait for a slot in any stage
+            on_reject: Called with the stage name for every rejected or timed out call
+        """
+        self.stages = {
+            name: StageLimiter(name, concurrency, max_queue, max_queue_seconds, on_reject)
+            for name, concurrency in limits.items()
+        }
+
+    def __getitem__(self, name: str) -> StageLimiter:
+        return self.stages[name]
+
+    def check_capacity(self):
+        """
+        Reject up front if any stage is full, before work is spent on earlier stages.
+
+        Raises:
+            AdmissionRejected: If a stage cannot take a new request
+        """
+        if background_work.get():
+            return
+        for stage in self.stages.values():
+            stage.check_capacity()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stage.stats() for name, stage in self.stages.items()}
@@ -0,0 +1,318 @@
+import asyncio
+import bisect
+import hashlib
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Collection, Dict, List, Optional
+
+import grpc
+import grpc.aio
+from grpc_health.v1 import health_pb2, health_pb2_grpc
+
+from utils.circuit_breaker import OPEN, CircuitBreaker, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+# Client keepalive: ping idle connections so dead replicas are noticed before a call is sent to them
+KEEPALIVE_TIME_MS = 30000
+KEEPALIVE_TIMEOUT_MS = 10000
+CLIENT_KEEPALIVE_OPTIONS = [
+    ("grpc.keepalive_time_ms", KEEPALIVE_TIME_MS),
+    ("grpc.keepalive_timeout_ms", KEEPALIVE_TIMEOUT_MS),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+]
+# Server side counterpart; without it the server answers the pings above with GOAWAY "too_many_pings"
+SERVER_KEEPALIVE_OPTIONS = [
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.min_recv_ping_interval_without_data_ms", KEEPALIVE_TIME_MS // 2),
+    ("grpc.http2.max_pings_without_data", 0),
+]
+# Points per replica on the consistent hash ring; more points spread keys more evenly
+RING_POINTS_PER_ENDPOINT = 100
+# Timeout of one grpc.health.v1 Check call made by the probe
+HEALTH_CHECK_TIMEOUT_SECONDS = 2.0
+# Status codes that say something is wrong with the replica rather than with the request.
+# UNKNOWN is not one of them: it is what a handler that raised returns, which is usually
+# caused by the request (a bad emotion, text the model cannot handle), not by the replica.
+FAILURE_CODES = (
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.INTERNAL,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+)
+
+
+def parse_endpoints(value: str) -> List[str]:
+    """Split a comma separated list of host:port addresses"""
+    return [address.strip() for address in value.split(",") if address.strip()]
+
+
+def _ring_hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+class Endpoint:
+    """One replica of a gRPC service with its long-lived channel and stub."""
+
+    def __init__(self, address: str, stub_class: Callable[[grpc.aio.Channel], Any], breaker: CircuitBreaker):
+        self.address = address
+        self.channel = grpc.aio.insecure_channel(address, options=CLIENT_KEEPALIVE_OPTIONS)
+        self.stub = stub_class(self.channel)
+        self.health_stub = health_pb2_grpc.HealthStub(self.channel)
+        # Result of the last health check: None until checked (or when not checked at all)
+        self.serving: Optional[bool] = None
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.breaker = breaker
+        # Set when UNAVAILABLE calls opened the circuit, so a reconnect can half-open it early
+        self.lost_connection = False
+
+    def is_ejected(self, now: float) -> bool:
+        """The circuit breaker lets no calls through right now"""
+        return not self.breaker.allows(now)
+
+    def is_available(self, now: float) -> bool:
+        """Circuit not open, not reporting NOT_SERVING (e.g. still warming up) and not known to be unreachable"""
+        if self.is_ejected(now) or self.serving is False:
+            return False
+        return self.channel.get_state() != grpc.ChannelConnectivity.TRANSIENT_FAILURE
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejected": self.breaker.state(now) == OPEN,
+            "circuit": self.breaker.stats(now),
+            "serving": self.serving,
+            "state": self.channel.get_state().name,
+        }
+
+
+class ChannelPool:
+    """
+    Load-balanced set of replicas of one gRPC service.
+
+    Each call goes to the available replica with the fewest outstanding
+    requests (ties rotate), over a channel that is created once and reused.
+    Every replica has a circuit breaker fed with the outcome and latency of
+    its calls; an open circuit ejects the replica, and a background probe
+    moves it to half-open early as soon as its channel reconnects. With a
+    health_service, the probe also asks every replica for its
+    grpc.health.v1 status, and replicas that are not SERVING (e.g. still
+    warming up) receive no calls. If every replica is out for another
+    reason, calls still go to the least loaded one rather than failing
+    without trying; only when every circuit is open do calls fail fast with
+    CircuitOpenError.
+
+    Calls with an affinity key are routed by consistent hashing instead, so
+    the same key keeps landing on the same replica (and its warm caches)
+    while replicas come and go. When that replica is unavailable or already
+    has max_affinity_outstanding calls, the next replica on the ring is
+    tried, then the least loaded one.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        addresses: List[str],
+        stub_class: Callable[[grpc.aio.Channel], Any],
+        breaker: Callable[[], CircuitBreaker] = CircuitBreaker,
+        probe_interval_seconds: float = 5.0,
+        max_affinity_outstanding: int = 1,
+        health_service: Optional[str] = None
+    ):
+        """
+        Args:
+            name: Service name used in logs and stats
+            addresses: host:port of every replica
+            stub_class: Generated stub class of the service
+            breaker: Creates the circuit breaker of each replica
+            probe_interval_seconds: How often channels are checked for reconnection
+            max_affinity_outstanding: Outstanding calls at which a replica counts
+                as overloaded for affinity routing
+            health_service: Service name to check with the gRPC health
+                service, None to not check health
+        """
+        if not addresses:
+            raise ValueError(f"No endpoints configured for the {name} service")
+        self.name = name
+        self.endpoints = [Endpoint(address, stub_class, breaker()) for address in addresses]
+        self.probe_interval_seconds = probe_interval_seconds
+        self.max_affinity_outstanding = max_affinity_outstanding
+        self.health_service = health_service
+        points = [
+            (_ring_hash(f"{endpoint.address}#{point}"), endpoint)
+            for endpoint in self.endpoints
+            for point in range(RING_POINTS_PER_ENDPOINT)
+        ]
+        self.ring = sorted(points, key=lambda point: point[0])
+        self._ring_hashes = [point for point, _ in self.ring]
+        self._next = 0
+        self._probe_task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    def start(self):
+        """Start the background probe of the replicas"""
+        if self._probe_task is None:
+            self._probe_task = asyncio.create_task(self._probe())
+
+    async def close(self):
+        """Stop the probe and close every channel"""
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            await asyncio.gather(self._probe_task, return_exceptions=True)
+            self._probe_task = None
+        await asyncio.gather(*(endpoint.channel.close() for endpoint in self.endpoints))
+
+    def ring_order(self, key: str) -> List[Endpoint]:
+        """Every replica, in the order the consistent hash ring prefers them for the key"""
+        start = bisect.bisect(self._ring_hashes, _ring_hash(key))
+        order = []
+        for offset in range(len(self.ring)):
+            endpoint = self.ring[(start + offset) % len(self.ring)][1]
+            if endpoint not in order:
+                order.append(endpoint)
+                if len(order) == len(self.endpoints):
+                    break
+        return order
+
+    def owner(self, key: str) -> Endpoint:
+        """The replica that owns the key on the hash ring, regardless of its load or health"""
+        return self.ring_order(key)[0]
+
+    def pick(self, affinity_key: Optional[str] = None, avoid: Collection[Endpoint] = ()) -> Endpoint:
+        """
+        The replica for the next call
+
+        Without an affinity key, the available replica with the fewest
+        outstanding calls. With one, the first available replica on the hash
+        ring that is not overloaded, falling back to the least loaded one.
+        Replicas in avoid (e.g. already used by a hedged call) are only
+        picked when no other replica is available.
+
+        Raises:
+            CircuitOpenError: If the circuit of every replica is open
+        """
+        now = time.monotonic()
+        allowed = [endpoint for endpoint in self.endpoints if not endpoint.is_ejected(now)]
+        if not allowed:
+            retry_after = min(endpoint.breaker.retry_after(now) for endpoint in self.endpoints)
+            raise CircuitOpenError(
+                f"The circuit of every {self.name} replica is open",
+                max(1, int(retry_after + 0.999))
+            )
+        if affinity_key is not None:
+            for endpoint in self.ring_order(affinity_key):
+                if (endpoint.is_available(now) and endpoint.outstanding < self.max_affinity_outstanding
+                        and endpoint not in avoid):
+                    return endpoint
+        # Rotate the starting point so equally loaded replicas share the traffic
+        start = self._next % len(self.endpoints)
+        self._next += 1
+        rotated = self.endpoints[start:] + self.endpoints[:start]
+        available = [endpoint for endpoint in rotated if endpoint.is_available(now)]
+        candidates = (
+            [endpoint for endpoint in available if endpoint not in avoid]
+            or available
+            or [endpoint for endpoint in rotated if endpoint in allowed]
+        )
+        return min(candidates, key=lambda endpoint: endpoint.outstanding)
+
+    @asynccontextmanager
+    async def endpoint(self, affinity_key: Optional[str] = None, avoid: Collection[Endpoint] = ()):
+        """
+        Pick a replica and count the block as one outstanding call on it
+
+        The block's outcome feeds the replica's circuit breaker: an
+        AioRpcError with a FAILURE_CODES status counts as a failure,
+        DEADLINE_EXCEEDED as a slow call, and a block that completes as a
+        success with its duration. Cancelled blocks (e.g. the losing side of
+        a hedged call) are not counted.
+
+        Raises:
+            CircuitOpenError: If the circuit of every replica is open
+        """
+        endpoint = self.pick(affinity_key, avoid)
+        start = time.monotonic()
+        endpoint.breaker.on_call_start(start)
+        endpoint.outstanding += 1
+        endpoint.requests += 1
+        try:
+            yield endpoint
+        except grpc.aio.AioRpcError as e:
+            now = time.monotonic()
+            if e.code() in FAILURE_CODES:
+                endpoint.failures += 1
+                if endpoint.breaker.record_failure(now):
+                    endpoint.lost_connection = e.code() == grpc.StatusCode.UNAVAILABLE
+                    failures = endpoint.breaker.consecutive_failures
+                    self._log_opened(endpoint, f"{failures} failed calls in a row ({e.code().name})"
+                                     if failures >= endpoint.breaker.max_consecutive_failures
+                                     else f"failure rate too high ({e.code().name})")
+            elif e.code() == grpc.StatusCode.DEADLINE_EXCEEDED:
+                if endpoint.breaker.record_success(now, float("inf")):
+                    self._log_opened(endpoint, "too many calls exceeded their deadline")
+            else:
+                endpoint.breaker.record_ignored(now)
+            raise
+        except BaseException:
+            endpoint.breaker.record_ignored(time.monotonic())
+            raise
+        else:
+            now = time.monotonic()
+            if endpoint.breaker.record_success(now, now - start):
+                self._log_opened(endpoint, "too many slow calls")
+        finally:
+            endpoint.outstanding -= 1
+
+    def ready(self) -> bool:
+        """At least one replica is reachable and (if health is checked) SERVING"""
+        now = time.monotonic()
+        return any(
+            endpoint.is_available(now) and (self.health_service is None or endpoint.serving)
+            for endpoint in self.endpoints
+        )
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {endpoint.address: endpoint.stats() for endpoint in self.endpoints}
+
+    def _log_opened(self, endpoint: Endpoint, reason: str):
+        logger.warning(
+            f"Circuit of {self.name} replica {endpoint.address} opened for "
+            f"{endpoint.breaker.open_seconds:.0f}s: {reason}"
+        )
+
+    async def _check_health(self, endpoint: Endpoint):
+        try:
+            response = await endpoint.health_stub.Check(
+                health_pb2.HealthCheckRequest(service=self.health_service),
+                timeout=HEALTH_CHECK_TIMEOUT_SECONDS
+            )
+            serving = response.status == health_pb2.HealthCheckResponse.SERVING
+        except grpc.aio.AioRpcError as e:
+            # A replica without the health service is taken to be serving
+            serving = e.code() == grpc.StatusCode.UNIMPLEMENTED
+        if serving != endpoint.serving:
+            logger.info(f"{self.name} replica {endpoint.address} is {'SERVING' if serving else 'not serving'}")
+        endpoint.serving = serving
+
+    async def _probe(self):
+        while True:
+            if self.health_service is not None:
+                await asyncio.gather(*(self._check_health(endpoint) for endpoint in self.endpoints))
+            now = time.monotonic()
+            for endpoint in self.endpoints:
+                # Ask idle or failed channels to connect so they are ready for the next call
+                state = endpoint.channel.get_state(try_to_connect=True)
+                if (endpoint.lost_connection and endpoint.breaker.state(now) == OPEN
+                        and state == grpc.ChannelConnectivity.READY and endpoint.serving is not False):
+                    logger.info(f"{self.name} replica {endpoint.address} reconnected, probing it (half-open)")
+                    endpoint.lost_connection = False
+                    endpoint.breaker.half_open(now)
+            await asyncio.sleep(self.probe_interval_seconds)
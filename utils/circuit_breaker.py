@@ -0,0 +1,168 @@
+import collections
+from typing import Any, Deque, Dict, Optional, Tuple
+
+# Circuit breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when every replica of a service has an open circuit; maps to HTTP 503."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one downstream replica.
+
+    The outcomes of calls in the last window_seconds are kept. Once at least
+    min_calls are recorded, the circuit opens if the share of failed calls
+    reaches failure_rate or the share of calls slower than slow_call_seconds
+    reaches slow_call_rate; max_consecutive_failures failures in a row open
+    it regardless of the window. An open circuit lets no calls through for
+    open_seconds, then turns half-open: up to half_open_calls probe calls
+    are let through, and their outcome closes the circuit again or reopens it.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float = 60.0,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_seconds: Optional[float] = None,
+        slow_call_rate: float = 0.5,
+        max_consecutive_failures: int = 3,
+        open_seconds: float = 30.0,
+        half_open_calls: int = 1
+    ):
+        """
+        Args:
+            window_seconds: How long call outcomes count towards the rates
+            min_calls: Calls in the window before the rates are evaluated
+            failure_rate: Share of failed calls that opens the circuit
+            slow_call_seconds: Duration above which a call counts as slow,
+                None to ignore latency
+            slow_call_rate: Share of slow calls that opens the circuit
+            max_consecutive_failures: Failures in a row that open the circuit
+            open_seconds: How long the circuit stays open before probing
+            half_open_calls: Probe calls allowed while half-open
+        """
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.max_consecutive_failures = max_consecutive_failures
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self._state = CLOSED
+        self.opened_until = 0.0
+        self.consecutive_failures = 0
+        self.half_open_in_flight = 0
+        self.times_opened = 0
+        # (time, failed, slow) of the calls in the window
+        self._calls: Deque[Tuple[float, bool, bool]] = collections.deque()
+
+    def state(self, now: float) -> str:
+        if self._state == OPEN and now >= self.opened_until:
+            self._state = HALF_OPEN
+            self.half_open_in_flight = 0
+        return self._state
+
+    def allows(self, now: float) -> bool:
+        """Whether a call may be sent now (without taking a half-open probe slot)"""
+        state = self.state(now)
+        if state == OPEN:
+            return False
+        return state == CLOSED or self.half_open_in_flight < self.half_open_calls
+
+    def retry_after(self, now: float) -> float:
+        """Seconds until the circuit lets a call through again"""
+        return max(0.0, self.opened_until - now) if self.state(now) == OPEN else 0.0
+
+    def on_call_start(self, now: float):
+        if self.state(now) == HALF_OPEN:
+            self.half_open_in_flight += 1
+
+    def record_success(self, now: float, duration: float) -> bool:
+        """Record a completed call; True if it opened the circuit (it was too slow)"""
+        slow = self.slow_call_seconds is not None and duration > self.slow_call_seconds
+        self.consecutive_failures = 0
+        if self.state(now) == HALF_OPEN:
+            self.half_open_in_flight = max(0, self.half_open_in_flight - 1)
+            if slow:
+                return self._open(now)
+            self._close()
+            return False
+        return self._record(now, False, slow)
+
+    def record_failure(self, now: float) -> bool:
+        """Record a failed call; True if it opened the circuit"""
+        self.consecutive_failures += 1
+        state = self.state(now)
+        if state == HALF_OPEN:
+            self.half_open_in_flight = max(0, self.half_open_in_flight - 1)
+            return self._open(now)
+        if state == OPEN:
+            # A call that started before the circuit opened
+            return False
+        if self.consecutive_failures >= self.max_consecutive_failures:
+            return self._open(now)
+        return self._record(now, True, False)
+
+    def record_ignored(self, now: float):
+        """A call that ended without telling anything about the replica (e.g. cancelled by the caller)"""
+        if self.state(now) == HALF_OPEN:
+            self.half_open_in_flight = max(0, self.half_open_in_flight - 1)
+
+    def half_open(self, now: float):
+        """Let probe calls through right away, e.g. after the replica reconnected"""
+        if self.state(now) == OPEN:
+            self.opened_until = now
+            self.state(now)
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        self._trim(now)
+        calls = len(self._calls)
+        return {
+            "state": self.state(now),
+            "calls": calls,
+            "failure_rate": round(sum(failed for _, failed, _ in self._calls) / calls, 3) if calls else 0.0,
+            "slow_call_rate": round(sum(slow for _, _, slow in self._calls) / calls, 3) if calls else 0.0,
+            "times_opened": self.times_opened,
+        }
+
+    def _record(self, now: float, failed: bool, slow: bool) -> bool:
+        if self._state != CLOSED:
+            return False
+        self._calls.append((now, failed, slow))
+        self._trim(now)
+        calls = len(self._calls)
+        if calls < self.min_calls:
+            return False
+        failures = sum(failed for _, failed, _ in self._calls)
+        slow_calls = sum(slow for _, _, slow in self._calls)
+        if failures / calls >= self.failure_rate or slow_calls / calls >= self.slow_call_rate:
+            return self._open(now)
+        return False
+
+    def _trim(self, now: float):
+        while self._calls and self._calls[0][0] < now - self.window_seconds:
+            self._calls.popleft()
+
+    def _open(self, now: float) -> bool:
+        self._state = OPEN
+        self.opened_until = now + self.open_seconds
+        self.half_open_in_flight = 0
+        self.times_opened += 1
+        self._calls.clear()
+        return True
+
+    def _close(self):
+        self._state = CLOSED
+        self.consecutive_failures = 0
+        self._calls.clear()
@@ -0,0 +1,123 @@
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+# Scheduling classes of TTS requests
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BATCH = "batch"
+DEFAULT_WEIGHTS = {PRIORITY_INTERACTIVE: 8.0, PRIORITY_BATCH: 1.0}
+DEFAULT_TENANT = "default"
+
+
+class SchedulingCancelled(Exception):
+    """Raised when a caller stops waiting for a slot (should_stop returned True)."""
+
+
+def parse_weights(value: str) -> Dict[str, float]:
+    """Parse "interactive=8,batch=1" into a weight per priority class"""
+    weights = dict(DEFAULT_WEIGHTS)
+    for item in value.split(","):
+        if "=" in item:
+            name, weight = item.split("=", 1)
+            weights[name.strip()] = float(weight)
+    return weights
+
+
+class FairScheduler:
+    """
+    Weighted fair queuing of work items in front of a shared engine.
+
+    Every item belongs to a flow, the (priority class, tenant) pair of the
+    request it came from, and has a cost (e.g. characters to synthesize).
+    Items are started in order of their virtual start tag (start-time fair
+    queuing): a flow's tags advance by cost / weight of its class, so over
+    time each backlogged flow gets engine time in proportion to its weight,
+    whatever the order and number of items that were submitted. A flow that
+    was idle starts at the current virtual time, so it gets its share right
+    away instead of waiting behind the backlog of other flows or catching up
+    on time it did not use.
+
+    Scheduling happens per item, so a long request cannot hold the engine
+    for all of its items while a short request of another flow waits.
+    """
+
+    def __init__(self, slots: int = 1, weights: Optional[Dict[str, float]] = None, poll_seconds: float = 0.5):
+        """
+        Args:
+            slots: Items allowed to run on the engine at the same time
+            weights: Weight per priority class; unknown classes get the
+                weight of the interactive class
+            poll_seconds: How often waiting callers check should_stop
+        """
+        self.slots = slots
+        self.weights = weights or dict(DEFAULT_WEIGHTS)
+        self.poll_seconds = poll_seconds
+        self._condition = threading.Condition()
+        self._waiting: List[List[Any]] = []
+        self._sequence = itertools.count()
+        self._finish_tags: Dict[tuple, float] = {}
+        self._virtual_time = 0.0
+        self.in_service = 0
+        self.completed: Dict[str, int] = {}
+
+    def weight(self, priority: str) -> float:
+        return self.weights.get(priority, self.weights.get(PRIORITY_INTERACTIVE, 1.0))
+
+    @contextmanager
+    def slot(self, priority: str, tenant: str, cost: float, should_stop: Optional[Callable[[], bool]] = None):
+        """
+        Wait for the item's turn, hold an engine slot for the block and yield the seconds waited
+
+        Raises:
+            SchedulingCancelled: If should_stop returns True while waiting
+        """
+        flow = (priority, tenant)
+        enqueued = time.monotonic()
+        with self._condition:
+            start = max(self._virtual_time, self._finish_tags.get(flow, 0.0))
+            finish = start + max(cost, 1.0) / self.weight(priority)
+            self._finish_tags[flow] = finish
+            entry = [start, next(self._sequence), flow]
+            heapq.heappush(self._waiting, entry)
+            while self.in_service >= self.slots or self._waiting[0] is not entry:
+                if should_stop is not None and should_stop():
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    # Give the flow back the share the item would have used
+                    if self._finish_tags.get(flow) == finish:
+                        self._finish_tags[flow] = start
+                    self._condition.notify_all()
+                    raise SchedulingCancelled()
+                self._condition.wait(timeout=self.poll_seconds)
+            heapq.heappop(self._waiting)
+            self._virtual_time = max(self._virtual_time, start)
+            self.in_service += 1
+            # The next item at the head may be able to take another free slot
+            self._condition.notify_all()
+        try:
+            yield time.monotonic() - enqueued
+        finally:
+            with self._condition:
+                self.in_service -= 1
+                self.completed[priority] = self.completed.get(priority, 0) + 1
+                if not self._waiting and self.in_service == 0:
+                    # Idle: tags of flows that are not ahead of the virtual clock carry no information
+                    self._finish_tags = {
+                        key: tag for key, tag in self._finish_tags.items() if tag > self._virtual_time
+                    }
+                self._condition.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            waiting: Dict[str, int] = {}
+            for _, _, (priority, _) in self._waiting:
+                waiting[priority] = waiting.get(priority, 0) + 1
+            return {
+                "slots": self.slots,
+                "in_service": self.in_service,
+                "waiting": waiting,
+                "completed": dict(self.completed),
+            }
@@ -0,0 +1,181 @@
+import mimetypes
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Iterator, List, Mapping, Optional, Tuple
+from urllib.parse import quote
+
+from starlette.responses import Response, StreamingResponse
+
+# Bytes read from a file per chunk of a response body
+CHUNK_SIZE = 64 * 1024
+
+
+def make_etag(stat_result: os.stat_result) -> str:
+    """
+    Strong ETag for a generated file.
+
+    Generated files are written once and never modified in place, so size and
+    nanosecond mtime identify the content without hashing the whole file.
+    """
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+def resolve_served_file(file_path: str, roots: List[str]) -> Optional[str]:
+    """
+    Resolve a requested relative path to a real file inside one of the roots.
+
+    Args:
+        file_path: Path from the URL, relative to the working directory
+        roots: Directories that are allowed to be served
+
+    Returns:
+        The absolute path of the file, or None if it is outside the roots
+        (path traversal, absolute paths, symlinks pointing elsewhere) or is
+        not a regular file
+    """
+    candidate = os.path.realpath(os.path.join(os.getcwd(), file_path))
+    for root in roots:
+        real_root = os.path.realpath(root)
+        if os.path.commonpath([candidate, real_root]) == real_root and candidate != real_root:
+            return candidate if os.path.isfile(candidate) else None
+    return None
+
+
+def file_url(file_path: str, roots: List[str]) -> Optional[str]:
+    """Public /files URL for a generated file, or None if it can't be served"""
+    if not file_path or resolve_served_file(file_path, roots) is None:
+        return None
+    relative_path = os.path.relpath(os.path.realpath(file_path), os.getcwd())
+    return "/files/" + relative_path.replace(os.sep, "/")
+
+
+def is_not_modified(request_headers: Mapping[str, str], stat_result: os.stat_result) -> bool:
+    """Evaluate If-None-Match / If-Modified-Since against the file"""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        etag = make_etag(stat_result)
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(stat_result.st_mtime) <= since
+    return False
+
+
+class RangeNotSatisfiable(Exception):
+    """The requested byte range does not overlap the file"""
+
+    def __init__(self, size: int):
+        super().__init__(f"Range not satisfiable for a file of {size} bytes")
+        self.size = size
+
+
+def parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single byte range.
+
+    Args:
+        range_header: Value of the Range header
+        size: Size of the file
+
+    Returns:
+        The inclusive (start, end) of the range, or None if the header is
+        malformed or asks for several ranges, in which case the whole file
+        is served
+
+    Raises:
+        RangeNotSatisfiable: The range lies outside the file
+    """
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    first, separator, last = (part.strip() for part in ranges.partition("-"))
+    if not separator or (first and not first.isdigit()) or (last and not last.isdigit()) or not (first or last):
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable(size)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable(size)
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def read_file_range(path: str, start: int, end: int) -> Iterator[bytes]:
+    """Read the inclusive byte range of a file in chunks"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def file_response(
+    path: str,
+    stat_result: os.stat_result,
+    request_headers: Mapping[str, str],
+    method: str = "GET",
+    headers: Optional[Mapping[str, str]] = None
+) -> Response:
+    """
+    Response for a generated file with validators and byte ranges.
+
+    Conditional requests get a 304. A single `Range` is answered with a 206
+    and `Content-Range`, unless an `If-Range` validator no longer matches;
+    a range outside the file gets a 416. The file is streamed in chunks
+    from a worker thread, and HEAD requests get the headers only.
+
+    Args:
+        path: Resolved path of the file
+        stat_result: os.stat of the file, used for validators and its size
+        request_headers: Headers of the request
+        method: HTTP method of the request
+        headers: Extra response headers, such as Cache-Control
+    """
+    size = stat_result.st_size
+    response_headers = {
+        **(headers or {}),
+        "Accept-Ranges": "bytes",
+        "ETag": make_etag(stat_result),
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+    }
+    if is_not_modified(request_headers, stat_result):
+        return Response(status_code=304, headers=response_headers)
+
+    response_headers["Content-Disposition"] = f'inline; filename="{quote(os.path.basename(path))}"'
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    status_code = 200
+    start, end = 0, size - 1
+    range_header = request_headers.get("range")
+    if_range = request_headers.get("if-range")
+    if range_header is not None and (if_range is None or if_range in (response_headers["ETag"], response_headers["Last-Modified"])):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**response_headers, "Content-Range": f"bytes */{size}"})
+        if byte_range is not None:
+            status_code = 206
+            start, end = byte_range
+            response_headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    response_headers["Content-Length"] = str(end - start + 1)
+    if method == "HEAD" or size == 0:
+        return Response(status_code=status_code, headers=response_headers, media_type=media_type)
+    return StreamingResponse(
+        read_file_range(path, start, end), status_code=status_code, headers=response_headers, media_type=media_type
+    )
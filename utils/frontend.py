@@ -6,6 +6,8 @@ from pydub import AudioSegment
 import tempfile
 import logging
 import shutil
+import time
+import uuid
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -13,6 +15,9 @@ logger = logging.getLogger(__name__)
 
 # FastAPI backend URL
 BACKEND_URL = "http://localhost:5000"  # Change this if your FastAPI runs on a different port
+JOB_POLL_INTERVAL = 2  # Seconds between job status checks
+JOB_SUBMIT_ATTEMPTS = 3  # Submissions of the same job before giving up
+JOB_TIMEOUT = 600  # Give up waiting for a job after this many seconds
 
 def story2Audio(storyline, genre, use_user_audio, *emotion_audio_files):
     """
@@ -62,13 +67,11 @@ def story2Audio(storyline, genre, use_user_audio, *emotion_audio_files):
                 "genre": genre
             }
         
-        # Call the FastAPI backend
-        logger.info(f"Sending request to {BACKEND_URL}/story-to-audio")
-        response = requests.post(
-            f"{BACKEND_URL}/story-to-audio",
-            json=payload,
-            timeout=600  # Longer timeout since story generation can take time
-        )
+        # Submit a background job to the FastAPI backend and poll until it finishes
+        logger.info(f"Submitting job to {BACKEND_URL}/jobs")
+        response = submit_job(payload)
+        if response.status_code == 202:
+            response = wait_for_job(response.json()["job_id"])
         
         # Check if the request was successful
         if response.status_code == 200:
@@ -80,7 +83,12 @@ def story2Audio(storyline, genre, use_user_audio, *emotion_audio_files):
             
             # Process the audio file
             try:
-                if "audio_file_path" in result:
+                if result.get("audio_url"):
+                    # Stream the audio straight from the backend instead of copying it
+                    audio_url = f"{BACKEND_URL}{result['audio_url']}"
+                    logger.info(f"Audio URL from API: {audio_url}")
+                    return audio_url, story_text
+                elif "audio_file_path" in result:
                     api_audio_path = result["audio_file_path"]
                     logger.info(f"Audio file path from API: {api_audio_path}")
                     
@@ -135,12 +143,47 @@ def story2Audio(storyline, genre, use_user_audio, *emotion_audio_files):
         gr.Warning(error_msg)
         return None, f"Unexpected error: {str(e)}"
 
+def submit_job(payload):
+    """
+    Submit a background job, resubmitting it if the backend does not answer in time
+
+    All attempts carry the same Idempotency-Key, so a submission that did
+    reach the backend is not queued a second time.
+    """
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+    for attempt in range(1, JOB_SUBMIT_ATTEMPTS + 1):
+        try:
+            return requests.post(f"{BACKEND_URL}/jobs", json=payload, headers=headers, timeout=10)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == JOB_SUBMIT_ATTEMPTS:
+                raise
+            logger.warning(f"Job submission failed ({str(e)}), retrying")
+            time.sleep(attempt)
+
+def wait_for_job(job_id):
+    """
+    Poll a background job until it finishes and return the result response
+    """
+    deadline = time.time() + JOB_TIMEOUT
+    while time.time() < deadline:
+        status = requests.get(f"{BACKEND_URL}/jobs/{job_id}", timeout=10).json()
+        if status["status"] in ("succeeded", "failed"):
+            break
+        time.sleep(JOB_POLL_INTERVAL)
+    else:
+        raise requests.Timeout(f"Job {job_id} did not finish within {JOB_TIMEOUT} seconds")
+    
+    logger.info(f"Job {job_id} finished with status: {status['status']}")
+    return requests.get(f"{BACKEND_URL}/jobs/{job_id}/result", timeout=10)
+
 def check_backend_status():
     """Check if the backend API is running"""
     try:
         response = requests.get(f"{BACKEND_URL}/health", timeout=5)
         if response.status_code == 200:
             data = response.json()
+            if not data.get('ready', True):
+                return "⏳ Connected to backend API, services are still warming up."
             return f"✅ Connected to backend API. Image generation: {'enabled' if data.get('image_service_enabled') else 'disabled'}"
         else:
             return "❌ Backend API responded with an error."
@@ -0,0 +1,79 @@
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+
+from grpc_health.v1 import health, health_pb2, health_pb2_grpc
+
+logger = logging.getLogger(__name__)
+
+SERVING = health_pb2.HealthCheckResponse.SERVING
+NOT_SERVING = health_pb2.HealthCheckResponse.NOT_SERVING
+
+
+def add_health_servicer(server, service_name: str) -> health.HealthServicer:
+    """
+    Register the standard gRPC health service (grpc.health.v1.Health) on a server
+
+    Both the server as a whole ("") and service_name start as NOT_SERVING;
+    call warm_up once the server is started to flip them to SERVING.
+    """
+    servicer = health.HealthServicer()
+    health_pb2_grpc.add_HealthServicer_to_server(servicer, server)
+    set_serving(servicer, service_name, False)
+    return servicer
+
+
+def set_serving(servicer: health.HealthServicer, service_name: str, serving: bool):
+    status = SERVING if serving else NOT_SERVING
+    for name in ("", service_name):
+        servicer.set(name, status)
+
+
+def warm_up(warmup: Optional[Callable[[], None]], servicer: health.HealthServicer, service_name: str):
+    """
+    Run the service's warmup, then report SERVING
+
+    The server is already answering health checks (NOT_SERVING) while this
+    runs, so clients can tell a process that is still warming up from one
+    that is down. A failed warmup is logged and the service serves anyway:
+    warmup only moves one-off costs out of the first requests.
+    """
+    if warmup is not None:
+        logger.info(f"Warming up {service_name}...")
+        start = time.perf_counter()
+        try:
+            warmup()
+            logger.info(f"Warmup of {service_name} finished in {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            logger.warning(f"Warmup of {service_name} failed, serving without it: {e}")
+    set_serving(servicer, service_name, True)
+    logger.info(f"{service_name} is SERVING")
+
+
+async def add_aio_health_servicer(server, service_name: str) -> health.aio.HealthServicer:
+    """add_health_servicer for a grpc.aio server"""
+    servicer = health.aio.HealthServicer()
+    health_pb2_grpc.add_HealthServicer_to_server(servicer, server)
+    await set_aio_serving(servicer, service_name, False)
+    return servicer
+
+
+async def set_aio_serving(servicer: health.aio.HealthServicer, service_name: str, serving: bool):
+    status = SERVING if serving else NOT_SERVING
+    for name in ("", service_name):
+        await servicer.set(name, status)
+
+
+async def aio_warm_up(warmup: Optional[Callable[[], Awaitable[None]]], servicer: health.aio.HealthServicer,
+                      service_name: str):
+    """warm_up for a grpc.aio server, with a coroutine function as the warmup"""
+    if warmup is not None:
+        logger.info(f"Warming up {service_name}...")
+        start = time.perf_counter()
+        try:
+            await warmup()
+            logger.info(f"Warmup of {service_name} finished in {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            logger.warning(f"Warmup of {service_name} failed, serving without it: {e}")
+    await set_aio_serving(servicer, service_name, True)
+    logger.info(f"{service_name} is SERVING")
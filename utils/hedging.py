@@ -0,0 +1,73 @@
+import asyncio
+import collections
+import math
+from typing import Any, Awaitable, Callable, Deque, Optional
+
+
+class LatencyTracker:
+    """Latencies of the most recent successful calls of one method."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        """
+        Args:
+            size: Number of recent calls kept
+            min_samples: Calls needed before quantiles are reported
+        """
+        self.min_samples = min_samples
+        self.samples: Deque[float] = collections.deque(maxlen=size)
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """The q-quantile of the recent latencies, None while there are too few"""
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+
+async def hedge(
+    attempt: Callable[[], Awaitable[Any]],
+    delay: Optional[float],
+    retriable: Callable[[BaseException], bool],
+    max_attempts: int = 2,
+    on_hedge: Optional[Callable[[], None]] = None
+) -> Any:
+    """
+    Run attempt(), starting another one if it is slow or fails
+
+    A second attempt is started when the first has not finished after delay
+    seconds (a hedge; None disables hedging) or as soon as it fails with a
+    retriable error (failover). The first attempt to succeed wins and the
+    others are cancelled. Only use this for idempotent calls.
+
+    Raises:
+        The error of the last attempt when none of them succeeded
+    """
+    pending = set()
+    launched = 0
+    error: Optional[BaseException] = None
+    try:
+        while True:
+            if not pending:
+                if launched == max_attempts or (error is not None and not retriable(error)):
+                    raise error
+                pending.add(asyncio.ensure_future(attempt()))
+                launched += 1
+            timeout = delay if launched < max_attempts else None
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # Slower than the hedging delay: race another attempt against it
+                pending.add(asyncio.ensure_future(attempt()))
+                launched += 1
+                if on_hedge is not None:
+                    on_hedge()
+                continue
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+    finally:
+        for task in pending:
+            task.cancel()
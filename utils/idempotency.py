@@ -0,0 +1,97 @@
+import asyncio
+import collections
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Longest Idempotency-Key header accepted
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflictError(Exception):
+    """Raised when an idempotency key is reused for a different request; maps to HTTP 422."""
+
+
+class _Run:
+    def __init__(self, fingerprint: str, task: asyncio.Task):
+        self.fingerprint = fingerprint
+        self.task = task
+        # Set once the run has succeeded; the result is replayed until then
+        self.expires_at: Optional[float] = None
+
+
+class IdempotentRuns:
+    """
+    Runs of requests that carry an idempotency key.
+
+    The first request with a key starts the work as a separate task. Unlike
+    SingleFlight, the task is not cancelled when its caller goes away: a
+    client that timed out and retries with the same key reattaches to the
+    run that is still going instead of starting another one. A successful
+    result is replayed for window_seconds after it finished; a failed run is
+    forgotten, so the next retry starts over.
+    """
+
+    def __init__(self, window_seconds: float = 3600.0, max_keys: int = 10000):
+        """
+        Args:
+            window_seconds: How long a finished result is replayed
+            max_keys: Finished runs kept at most; the oldest are dropped first
+        """
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+        self.runs: "collections.OrderedDict[str, _Run]" = collections.OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.runs)
+
+    async def run(self, key: str, fingerprint: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run fn() for the key, or reattach to the run already made for it
+
+        Args:
+            key: Idempotency key of the request
+            fingerprint: Identity of the request body; a key can only be
+                reused for the same request
+            fn: Coroutine function that performs the work
+
+        Returns:
+            (result, replayed): replayed is True if the result comes from an
+            earlier request with the same key (the same object for every caller)
+
+        Raises:
+            IdempotencyConflictError: If the key was used for a different request
+        """
+        self._evict_expired()
+        run = self.runs.get(key)
+        replayed = run is not None
+        if run is None:
+            run = _Run(fingerprint, asyncio.create_task(fn()))
+            self.runs[key] = run
+            run.task.add_done_callback(lambda _: self._finished(key, run))
+        elif run.fingerprint != fingerprint:
+            raise IdempotencyConflictError(f"Idempotency-Key {key!r} was already used for a different request")
+        else:
+            state = "finished" if run.task.done() else "in flight"
+            logger.info(f"Reattaching to the {state} run of idempotency key {key!r}")
+        # Shielded: a caller that goes away leaves the run going for its retry
+        return await asyncio.shield(run.task), replayed
+
+    def _finished(self, key: str, run: _Run):
+        if run.task.cancelled() or run.task.exception() is not None:
+            if self.runs.get(key) is run:
+                del self.runs[key]
+            return
+        run.expires_at = time.monotonic() + self.window_seconds
+        self._evict_expired()
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        for key, run in list(self.runs.items()):
+            if run.expires_at is not None and run.expires_at <= now:
+                del self.runs[key]
+        finished = [key for key, run in self.runs.items() if run.expires_at is not None]
+        for key in finished[:max(0, len(self.runs) - self.max_keys)]:
+            del self.runs[key]
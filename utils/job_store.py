@@ -0,0 +1,332 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.idempotency import IdempotencyConflictError
+from utils.jobs import Job, JOB_FAILED, JOB_QUEUED, JOB_RUNNING
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    request TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    lease_owner TEXT,
+    lease_expires_at REAL,
+    batch_id TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    job_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (job_id, name)
+);
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    job_ids TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+class JobStore:
+    """
+    Durable job queue in a local SQLite database.
+
+    Layout:
+        <store_dir>/jobs.sqlite3   jobs, their leases and their checkpoints
+        <store_dir>/files/<job_id>/   files written by checkpoints (e.g. segment audio)
+
+    A worker leases a job for lease_seconds and keeps renewing the lease
+    while it runs. If the process dies the lease runs out and the job is
+    handed to the next worker, which resumes from the job's checkpoints.
+    """
+
+    def __init__(self, store_dir: str = "job_store"):
+        """
+        Args:
+            store_dir: Directory holding the database and the checkpoint files
+        """
+        self.store_dir = store_dir
+        self.files_dir = os.path.join(store_dir, "files")
+        os.makedirs(self.files_dir, exist_ok=True)
+        # Autocommit; lease_next opens its own write transaction
+        self.db = sqlite3.connect(os.path.join(store_dir, "jobs.sqlite3"), isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self._migrate()
+        self.db.execute("CREATE INDEX IF NOT EXISTS jobs_by_batch ON jobs (batch_id)")
+
+    def _migrate(self):
+        """Add columns introduced after a database was created"""
+        columns = {row["name"] for row in self.db.execute("PRAGMA table_info(jobs)")}
+        if "batch_id" not in columns:
+            self.db.execute("ALTER TABLE jobs ADD COLUMN batch_id TEXT")
+
+    def close(self):
+        self.db.close()
+
+    def create(self, request: Dict[str, Any], batch_id: Optional[str] = None) -> Job:
+        """Store a new queued job"""
+        job = Job(request, batch_id)
+        self.db.execute(
+            "INSERT INTO jobs (id, request, status, created_at, batch_id) VALUES (?, ?, ?, ?, ?)",
+            (job.id, json.dumps(request), job.status, job.created_at, batch_id)
+        )
+        return job
+
+    def create_batch(self, requests: List[Dict[str, Any]], batch_id: str) -> List[Job]:
+        """Store the jobs of a batch in one transaction, so workers never see half of it"""
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            jobs = [self.create(request, batch_id) for request in requests]
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+        return jobs
+
+    def idempotent_jobs(self, key: str, fingerprint: str, created_after: float) -> Optional[List[Job]]:
+        """
+        Jobs stored for an idempotency key since created_after, None if there are none
+
+        Raises:
+            IdempotencyConflictError: If the key was stored for a different request
+        """
+        row = self.db.execute("SELECT * FROM idempotency_keys WHERE key = ?", (key,)).fetchone()
+        if row is None or row["created_at"] < created_after:
+            return None
+        if row["fingerprint"] != fingerprint:
+            raise IdempotencyConflictError(f"Idempotency-Key {key!r} was already used for a different request")
+        jobs = [self.get(job_id) for job_id in json.loads(row["job_ids"])]
+        if any(job is None for job in jobs):
+            # The jobs were evicted before the key expired
+            return None
+        for job in jobs:
+            job.replayed = True
+        return jobs
+
+    def create_idempotent(self, key: str, fingerprint: str, requests: List[Dict[str, Any]],
+                          batch_id: Optional[str], created_after: float) -> Tuple[List[Job], bool]:
+        """
+        Store the jobs of a request under its idempotency key, unless the key already has jobs
+
+        Checked and written in one transaction, so concurrent retries with
+        the same key (also from other processes) end up with the same jobs.
+
+        Returns:
+            (jobs, created): created is False if the jobs stored for the key were returned
+
+        Raises:
+            IdempotencyConflictError: If the key was stored for a different request
+        """
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            jobs = self.idempotent_jobs(key, fingerprint, created_after)
+            created = jobs is None
+            if created:
+                jobs = [self.create(request, batch_id) for request in requests]
+                self.db.execute(
+                    "INSERT OR REPLACE INTO idempotency_keys (key, fingerprint, job_ids, created_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, fingerprint, json.dumps([job.id for job in jobs]), time.time())
+                )
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+        return jobs, created
+
+    def evict_idempotency_keys(self, created_before: float):
+        self.db.execute("DELETE FROM idempotency_keys WHERE created_at < ?", (created_before,))
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self.db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job_from_row(row) if row is not None else None
+
+    def count_queued(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (JOB_QUEUED,)).fetchone()[0]
+
+    def lease_next(self, owner: str, lease_seconds: float, max_attempts: int) -> Optional[Job]:
+        """
+        Lease the oldest queued job, or a running job whose lease has expired
+
+        A job that has already been leased max_attempts times is failed
+        instead, so a job that keeps crashing the service is not retried forever.
+        """
+        now = time.time()
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            while True:
+                row = self.db.execute(
+                    "SELECT * FROM jobs WHERE status = ? OR (status = ? AND lease_expires_at < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (JOB_QUEUED, JOB_RUNNING, now)
+                ).fetchone()
+                if row is None:
+                    self.db.execute("COMMIT")
+                    return None
+                if row["attempts"] >= max_attempts:
+                    logger.warning(f"Job {row['id']} was interrupted {row['attempts']} times, failing it")
+                    self.db.execute(
+                        "UPDATE jobs SET status = ?, error = ?, finished_at = ?, lease_owner = NULL, "
+                        "lease_expires_at = NULL WHERE id = ?",
+                        (JOB_FAILED, f"Job was interrupted {row['attempts']} times", now, row["id"])
+                    )
+                    continue
+                if row["status"] == JOB_RUNNING:
+                    logger.info(f"Lease of job {row['id']} held by {row['lease_owner']} expired, taking it over")
+                self.db.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, started_at = COALESCE(started_at, ?), "
+                    "lease_owner = ?, lease_expires_at = ? WHERE id = ?",
+                    (JOB_RUNNING, now, owner, now + lease_seconds, row["id"])
+                )
+                self.db.execute("COMMIT")
+                return self.get(row["id"])
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def lease_batch(self, batch_id: str, owner: str, lease_seconds: float, max_attempts: int) -> List[Job]:
+        """Lease the remaining jobs of a batch (queued or with an expired lease) for the same owner"""
+        now = time.time()
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self.db.execute(
+                "SELECT id FROM jobs WHERE batch_id = ? AND attempts < ? "
+                "AND (status = ? OR (status = ? AND lease_expires_at < ?)) ORDER BY created_at",
+                (batch_id, max_attempts, JOB_QUEUED, JOB_RUNNING, now)
+            ).fetchall()
+            self.db.executemany(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, started_at = COALESCE(started_at, ?), "
+                "lease_owner = ?, lease_expires_at = ? WHERE id = ?",
+                [(JOB_RUNNING, now, owner, now + lease_seconds, row["id"]) for row in rows]
+            )
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+        return [self.get(row["id"]) for row in rows]
+
+    def renew_lease(self, job_id: str, owner: str, lease_seconds: float) -> bool:
+        """Extend a lease; False if the owner no longer holds it"""
+        cursor = self.db.execute(
+            "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND status = ? AND lease_owner = ?",
+            (time.time() + lease_seconds, job_id, JOB_RUNNING, owner)
+        )
+        return cursor.rowcount == 1
+
+    def release(self, job_id: str, owner: str):
+        """Give a leased job back to the queue, e.g. on shutdown"""
+        self.db.execute(
+            "UPDATE jobs SET status = ?, attempts = MAX(attempts - 1, 0), lease_owner = NULL, "
+            "lease_expires_at = NULL WHERE id = ? AND lease_owner = ?",
+            (JOB_QUEUED, job_id, owner)
+        )
+
+    def finish(self, job_id: str, owner: str, status: str, result: Optional[Dict[str, Any]] = None,
+               error: Optional[str] = None) -> bool:
+        """Record the outcome of a leased job; False if the owner no longer holds its lease"""
+        cursor = self.db.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_owner = NULL, "
+            "lease_expires_at = NULL WHERE id = ? AND lease_owner = ?",
+            (status, json.dumps(result) if result is not None else None, error, time.time(), job_id, owner)
+        )
+        return cursor.rowcount == 1
+
+    def checkpoints(self, job_id: str) -> "JobCheckpoints":
+        return JobCheckpoints(self, job_id)
+
+    def load_checkpoints(self, job_id: str) -> Dict[str, Any]:
+        rows = self.db.execute("SELECT name, value FROM checkpoints WHERE job_id = ?", (job_id,)).fetchall()
+        return {row["name"]: json.loads(row["value"]) for row in rows}
+
+    def save_checkpoint(self, job_id: str, name: str, value: Any):
+        self.db.execute(
+            "INSERT OR REPLACE INTO checkpoints (job_id, name, value) VALUES (?, ?, ?)",
+            (job_id, name, json.dumps(value))
+        )
+
+    def write_job_file(self, job_id: str, filename: str, data: bytes) -> str:
+        """Write a checkpoint file of a job atomically and return its path"""
+        job_dir = os.path.join(self.files_dir, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        path = os.path.join(job_dir, filename)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return path
+
+    def evict_finished(self, finished_before: float) -> List[str]:
+        """Delete finished jobs (with their checkpoints and files) that ended before the cutoff"""
+        rows = self.db.execute(
+            "SELECT id FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (finished_before,)
+        ).fetchall()
+        job_ids = [row["id"] for row in rows]
+        for job_id in job_ids:
+            self.db.execute("DELETE FROM checkpoints WHERE job_id = ?", (job_id,))
+            self.db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            shutil.rmtree(os.path.join(self.files_dir, job_id), ignore_errors=True)
+        return job_ids
+
+    @staticmethod
+    def _job_from_row(row: sqlite3.Row) -> Job:
+        job = Job(json.loads(row["request"]), row["batch_id"])
+        job.id = row["id"]
+        job.status = row["status"]
+        job.result = json.loads(row["result"]) if row["result"] is not None else None
+        job.error = row["error"]
+        job.attempts = row["attempts"]
+        job.created_at = row["created_at"]
+        job.started_at = row["started_at"]
+        job.finished_at = row["finished_at"]
+        return job
+
+
+class JobCheckpoints:
+    """
+    Completed stages of one job.
+
+    The pipeline saves each stage's output as soon as it is done; a job that
+    is resumed after a crash finds them here and skips those stages.
+    """
+
+    def __init__(self, store: JobStore, job_id: str):
+        self.store = store
+        self.job_id = job_id
+        self.values = store.load_checkpoints(job_id)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.values
+
+    def get(self, name: str, default: Any = None) -> Any:
+        return self.values.get(name, default)
+
+    def save(self, name: str, value: Any):
+        self.store.save_checkpoint(self.job_id, name, value)
+        self.values[name] = value
+
+    async def save_file(self, name: str, filename: str, data: bytes) -> str:
+        """Write data to a file of the job and checkpoint its path under name"""
+        path = await asyncio.to_thread(self.store.write_job_file, self.job_id, filename, data)
+        self.save(name, path)
+        return path
@@ -0,0 +1,275 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Job lifecycle states
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+class JobQueueFullError(Exception):
+    """Raised when a job is submitted while the wait queue is at capacity."""
+
+
+class Job:
+    """A single story-to-audio request tracked by the JobManager."""
+
+    def __init__(self, request: Dict[str, Any], batch_id: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        # Jobs submitted together in one batch are run together
+        self.batch_id = batch_id
+        self.status = JOB_QUEUED
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # How often a worker has leased the job (more than once after a crash)
+        self.attempts = 0
+        # Returned for a repeated idempotency key instead of being created
+        self.replayed = False
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JOB_SUCCEEDED, JOB_FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Status view of the job (without the result payload)."""
+        return {
+            "job_id": self.id,
+            "batch_id": self.batch_id,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """
+    Runs story pipelines in the background on a bounded pool of asyncio workers.
+
+    Submitting a job only stores it in the durable JobStore, so the HTTP
+    request that created it can return immediately while the workers drain
+    the queue. A worker leases each job and renews the lease while the
+    pipeline runs; after a crash the lease expires and the job is resumed
+    from its checkpoints by whichever worker picks it up next.
+
+    The jobs of a batch are leased by one worker together and handed to the
+    batch pipeline in a single call, so their stages can be scheduled as
+    one workload.
+    """
+
+    def __init__(
+        self,
+        pipeline: Callable[[Dict[str, Any], Any], Awaitable[Dict[str, Any]]],
+        store,
+        num_workers: int = 2,
+        max_queue_size: int = 100,
+        retention_seconds: float = 3600.0,
+        lease_seconds: float = 30.0,
+        max_attempts: int = 3,
+        poll_seconds: float = 1.0,
+        batch_pipeline: Optional[Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]] = None,
+        idempotency_seconds: float = 3600.0,
+    ):
+        """
+        Args:
+            pipeline: Coroutine function that takes the job request and its
+                JobCheckpoints and returns the result
+            store: JobStore holding the jobs
+            num_workers: Number of jobs processed concurrently
+            max_queue_size: Maximum number of jobs waiting to be processed
+            retention_seconds: How long finished jobs are kept for polling
+            lease_seconds: How long a job stays leased without a heartbeat
+            max_attempts: Leases after which an interrupted job is failed
+            poll_seconds: How often idle workers look for expired leases
+            batch_pipeline: Coroutine function that takes {job_id: (request,
+                JobCheckpoints)} for the jobs of a batch and returns
+                {job_id: result or exception}
+            idempotency_seconds: How long an idempotency key maps to the
+                jobs submitted with it
+        """
+        self.pipeline = pipeline
+        self.store = store
+        self.num_workers = num_workers
+        self.max_queue_size = max_queue_size
+        self.retention_seconds = retention_seconds
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_seconds = poll_seconds
+        self.batch_pipeline = batch_pipeline
+        self.idempotency_seconds = idempotency_seconds
+        # Lease owner prefix, unique per process
+        self.owner_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.workers: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+
+    def start(self):
+        """Spawn the worker tasks on the running event loop."""
+        for i in range(self.num_workers):
+            self.workers.append(asyncio.create_task(self._worker(i)))
+        logger.info(f"Job manager started with {self.num_workers} workers ({self.store.count_queued()} jobs queued)")
+
+    async def stop(self):
+        """Cancel the worker tasks and wait for them to exit; their jobs go back to the queue."""
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        logger.info("Job manager stopped")
+
+    def submit(self, request: Dict[str, Any], idempotency_key: Optional[str] = None,
+               fingerprint: Optional[str] = None) -> Job:
+        """
+        Enqueue a new job.
+
+        A request with an idempotency key that was already submitted within
+        the idempotency window gets the job made for it (marked replayed)
+        instead of a new one.
+
+        Raises:
+            JobQueueFullError: If the wait queue is full
+            IdempotencyConflictError: If the key was used for a different request
+        """
+        return self._submit([request], None, idempotency_key, fingerprint)[0]
+
+    def submit_batch(self, requests: List[Dict[str, Any]], idempotency_key: Optional[str] = None,
+                     fingerprint: Optional[str] = None) -> List[Job]:
+        """
+        Enqueue the jobs of a batch.
+
+        Raises:
+            JobQueueFullError: If the wait queue cannot take all of them
+            IdempotencyConflictError: If the key was used for a different request
+        """
+        return self._submit(requests, uuid.uuid4().hex, idempotency_key, fingerprint)
+
+    def _submit(self, requests: List[Dict[str, Any]], batch_id: Optional[str],
+                idempotency_key: Optional[str], fingerprint: Optional[str]) -> List[Job]:
+        self._evict_expired()
+        key_created_after = time.time() - self.idempotency_seconds
+        if idempotency_key is not None:
+            # A retry is answered even when the queue is full
+            jobs = self.store.idempotent_jobs(idempotency_key, fingerprint, key_created_after)
+            if jobs is not None:
+                logger.info(f"Idempotency key {idempotency_key!r} replayed job(s) {', '.join(job.id for job in jobs)}")
+                return jobs
+        queued = self.store.count_queued()
+        if queued + len(requests) > self.max_queue_size:
+            if batch_id is None:
+                raise JobQueueFullError(f"Job queue is full ({queued} jobs waiting)")
+            raise JobQueueFullError(
+                f"Job queue cannot take a batch of {len(requests)} ({queued} of {self.max_queue_size} jobs waiting)"
+            )
+        if idempotency_key is not None:
+            jobs, created = self.store.create_idempotent(
+                idempotency_key, fingerprint, requests, batch_id, key_created_after
+            )
+            if not created:
+                return jobs
+        elif batch_id is not None:
+            jobs = self.store.create_batch(requests, batch_id)
+        else:
+            jobs = [self.store.create(requests[0])]
+        self._wakeup.set()
+        if batch_id is None:
+            logger.info(f"Job {jobs[0].id} queued ({queued + 1} waiting)")
+        else:
+            logger.info(f"Batch {batch_id} of {len(jobs)} jobs queued")
+        return jobs
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.store.get(job_id)
+
+    def _evict_expired(self):
+        """Drop finished jobs older than the retention window and expired idempotency keys."""
+        now = time.time()
+        self.store.evict_finished(now - self.retention_seconds)
+        self.store.evict_idempotency_keys(now - self.idempotency_seconds)
+
+    async def _worker(self, worker_id: int):
+        owner = f"{self.owner_id}-{worker_id}"
+        while True:
+            # Cleared before looking, so a submit in between still wakes this worker
+            self._wakeup.clear()
+            job = self.store.lease_next(owner, self.lease_seconds, self.max_attempts)
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            jobs = [job]
+            if job.batch_id is not None and self.batch_pipeline is not None:
+                jobs += self.store.lease_batch(job.batch_id, owner, self.lease_seconds, self.max_attempts)
+            await self._run(jobs, owner, worker_id)
+
+    def _start_pipeline(self, jobs: List[Job]) -> asyncio.Task:
+        """Run the pipeline for the leased jobs; the task returns {job_id: result or exception}"""
+        if len(jobs) == 1:
+            # Also the last job left of a batch, nothing to share a workload with
+            return asyncio.create_task(self._run_single(jobs[0]))
+        return asyncio.create_task(self.batch_pipeline({
+            job.id: (job.request, self.store.checkpoints(job.id)) for job in jobs
+        }))
+
+    async def _run_single(self, job: Job) -> Dict[str, Any]:
+        try:
+            return {job.id: await self.pipeline(job.request, self.store.checkpoints(job.id))}
+        except Exception as e:
+            return {job.id: e}
+
+    async def _run(self, jobs: List[Job], owner: str, worker_id: int):
+        for job in jobs:
+            resumed = " (resumed)" if job.attempts > 1 else ""
+            logger.info(f"Worker {worker_id} started job {job.id}{resumed}")
+        run = self._start_pipeline(jobs)
+        lease = {"lost": False}
+        heartbeat = asyncio.create_task(self._heartbeat([job.id for job in jobs], owner, run, lease))
+        try:
+            outcomes = await run
+        except asyncio.CancelledError:
+            if not lease["lost"]:
+                # Shutting down: hand the jobs back so the next start resumes them
+                for job in jobs:
+                    self.store.release(job.id, owner)
+                raise
+            logger.warning(f"Worker {worker_id} lost the lease of its jobs, abandoning them")
+            return
+        except Exception as e:
+            outcomes = {job.id: e for job in jobs}
+        finally:
+            heartbeat.cancel()
+
+        for job in jobs:
+            outcome = outcomes.get(job.id, RuntimeError("The pipeline returned no result for the job"))
+            if isinstance(outcome, Exception):
+                logger.error(f"Job {job.id} failed: {str(outcome)}")
+                result, status, error = None, JOB_FAILED, str(outcome)
+            else:
+                result, status, error = outcome, JOB_SUCCEEDED, None
+            if not self.store.finish(job.id, owner, status, result=result, error=error):
+                logger.warning(f"Job {job.id} finished after its lease was taken over, dropping the outcome")
+                continue
+            logger.info(f"Worker {worker_id} finished job {job.id} ({status})")
+
+    async def _heartbeat(self, job_ids: List[str], owner: str, run: asyncio.Task, lease: Dict[str, bool]):
+        """Renew the leases while the jobs run, cancelling the run if a lease was lost"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            for job_id in job_ids:
+                if not self.store.renew_lease(job_id, owner, self.lease_seconds):
+                    lease["lost"] = True
+                    run.cancel()
+                    return
@@ -1,20 +1,28 @@
 import os
+from ollama import AsyncClient
 from ollama import chat as ollama_chat
+from utils.llm_cache import make_llm_cache_key
 
 class OllamaModel():
    """Local Ollama-based implementation."""
-  
-   def __init__(self, model_name="llama3.1"):
+
+   def __init__(self, model_name="llama3.1", options=None, cache=None):
        """
        Initialize the OllamaModel with the given model name.
-      
+
        Args:
            model_name (str): The name of the Ollama model to use.
+           options (dict): Ollama generation options (seed, temperature, ...), None for the model's defaults.
+           cache (LLMCache): Responses by prompt; a prompt answered before is not sent to the model again.
        """
        self.model_name = model_name
        self.system_prompt = """
        You are a teacher assitant working to generate lecture contents.
        """
+       self.options = options
+       self.cache = cache
+       # Created on first use, inside the event loop that uses it
+       self.async_client = None
 
 
    def create_assistant(self, instructions):
@@ -23,7 +31,29 @@ class OllamaModel():
        self.system_prompt = f"{instructions}"
 
 
-   def generate_response(self, prompt,assitant = None):
+   def cache_key(self, prompt, format=None):
+       """Key of the response to prompt in the cache"""
+       return make_llm_cache_key(self.model_name, self.system_prompt, prompt, options=self.options, format=format)
+
+
+   def cached_response(self, prompt, format=None):
+       """The cached response to prompt, None on a miss or without a cache"""
+       if self.cache is None:
+           return None
+       return self.cache.get(self.cache_key(prompt, format))
+
+
+   def generate_response(self, prompt,assitant = None,format=None):
+       """
+       Generate the response to prompt, or return it from the cache.
+
+       Args:
+           format: "json" or a JSON schema the response must follow (Ollama structured outputs), None for free text
+       """
+       cached = self.cached_response(prompt, format)
+       if cached is not None:
+           return cached
+
        messages = [
            {"role": "system", "content": self.system_prompt},
            {"role": "user", "content": prompt}
@@ -31,8 +61,49 @@ class OllamaModel():
 
 
        response = ""
-       for chunk in ollama_chat(model=self.model_name, messages=messages, stream=True):
+       for chunk in ollama_chat(model=self.model_name, messages=messages, stream=True, format=format, options=self.options):
            response += chunk['message']['content']
-      
+
+       if self.cache is not None and response:
+           self.cache.put(self.cache_key(prompt, format), response)
        return response
 
+
+   async def stream_response(self, prompt, format=None, read_cache=True):
+       """
+       Yield the response to prompt piece by piece as the model generates it.
+
+       format is passed on as in generate_response. A cached response is
+       yielded as one piece; a generated one is cached once it is complete.
+       Cancelling the consumer closes the HTTP stream, which makes Ollama
+       stop generating for it, and nothing is cached. read_cache=False skips
+       the lookup when the caller has already made it.
+       """
+       cached = self.cached_response(prompt, format) if read_cache else None
+       if cached is not None:
+           yield cached
+           return
+
+       if self.async_client is None:
+           self.async_client = AsyncClient()
+       messages = [
+           {"role": "system", "content": self.system_prompt},
+           {"role": "user", "content": prompt}
+       ]
+       response = ""
+       async for chunk in await self.async_client.chat(
+           model=self.model_name, messages=messages, stream=True, format=format, options=self.options
+       ):
+           response += chunk['message']['content']
+           yield chunk['message']['content']
+
+       if self.cache is not None and response:
+           self.cache.put(self.cache_key(prompt, format), response)
+
+
+   async def agenerate_response(self, prompt, format=None):
+       """Async generate_response, without holding a thread for the generation"""
+       response = ""
+       async for piece in self.stream_response(prompt, format=format):
+           response += piece
+       return response
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_by_age ON responses (created_at);
+"""
+
+# Lookup outcomes passed to on_lookup
+MEMORY_HIT = "memory_hit"
+DISK_HIT = "disk_hit"
+MISS = "miss"
+
+
+def make_llm_cache_key(model_name: str, system_prompt: str, prompt: str, **params: Any) -> str:
+    """
+    Hash of everything that decides an LLM response
+
+    params holds the other generation arguments (options such as the seed
+    or temperature, the response format); None values are left out, so
+    adding an unused argument does not change existing keys.
+    """
+    payload = json.dumps(
+        {
+            "model": model_name,
+            "system": system_prompt,
+            "prompt": prompt,
+            **{name: value for name, value in params.items() if value is not None},
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Cache of LLM responses by prompt, in memory and on disk.
+
+    Layout:
+        <path>   SQLite database with one row per response
+
+    The most recently used max_memory_entries responses are also kept in an
+    in-memory LRU, so repeated prompts are answered without touching the
+    database. The database keeps max_disk_entries responses, the oldest are
+    deleted first, and it survives restarts, so a story that was already
+    tagged or divided into scenes is never sent to the model again.
+    Safe to use from several threads.
+    """
+
+    def __init__(
+        self,
+        path: str = os.path.join("llm_cache", "responses.sqlite3"),
+        max_memory_entries: int = 1000,
+        max_disk_entries: int = 100000,
+        on_lookup: Optional[Callable[[str], None]] = None
+    ):
+        """
+        Args:
+            path: SQLite database file, created if missing
+            max_memory_entries: Responses kept in memory
+            max_disk_entries: Responses kept in the database
+            on_lookup: Called with MEMORY_HIT, DISK_HIT or MISS after every get
+        """
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.on_lookup = on_lookup
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        # key -> response, ordered from least to most recently used
+        self.memory: "OrderedDict[str, str]" = OrderedDict()
+        self.lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.disk_entries = self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        logger.info(f"LLM cache opened with {self.disk_entries} responses in {path}")
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for a key, or None on a miss"""
+        with self.lock:
+            response = self.memory.get(key)
+            if response is not None:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                outcome = MEMORY_HIT
+            else:
+                row = self.db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    response = row[0]
+                    self._remember(key, response)
+                    self.disk_hits += 1
+                    outcome = DISK_HIT
+                else:
+                    self.misses += 1
+                    outcome = MISS
+        if self.on_lookup is not None:
+            self.on_lookup(outcome)
+        return response
+
+    def put(self, key: str, response: str):
+        with self.lock:
+            # Concurrent misses of one prompt both store a response; the first one is kept
+            inserted = self.db.execute(
+                "INSERT OR IGNORE INTO responses (key, response, created_at) VALUES (?, ?, ?)",
+                (key, response, time.time())
+            ).rowcount
+            if not inserted:
+                return
+            self._remember(key, response)
+            self.disk_entries += inserted
+            if self.disk_entries > self.max_disk_entries:
+                self._trim()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "memory_entries": len(self.memory),
+            "disk_entries": self.disk_entries,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+        }
+
+    def close(self):
+        self.db.close()
+
+    def _remember(self, key: str, response: str):
+        self.memory[key] = response
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def _trim(self):
+        """Delete the oldest responses until the database is back under max_disk_entries"""
+        self.db.execute(
+            "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY created_at LIMIT ?)",
+            (self.disk_entries - self.max_disk_entries,)
+        )
+        self.disk_entries = self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
@@ -0,0 +1,117 @@
+import functools
+import inspect
+import logging
+import time
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from single LLM tokens up to whole stories
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+
+class BusyClock:
+    """
+    Wall time during which at least one of several, possibly overlapping, activities was running.
+
+    Used per request to measure the time spent waiting on downstream services,
+    whose calls can run concurrently (e.g. the audio and image branches).
+    """
+
+    def __init__(self):
+        self.active = 0
+        self.busy_seconds = 0.0
+        self._since = 0.0
+
+    def start(self):
+        if self.active == 0:
+            self._since = time.perf_counter()
+        self.active += 1
+
+    def stop(self):
+        self.active -= 1
+        if self.active == 0:
+            self.busy_seconds += time.perf_counter() - self._since
+
+    def elapsed(self) -> float:
+        if self.active:
+            return self.busy_seconds + time.perf_counter() - self._since
+        return self.busy_seconds
+
+
+def instrument_rpc(method_name: str, duration: Histogram, in_flight: Gauge, errors: Counter):
+    """
+    Decorator recording latency, concurrency and failures of a gRPC handler.
+
+    Works for unary handlers and for server-streaming handlers (generators),
+    where the duration covers the whole stream, both sync and grpc.aio.
+    """
+    def decorator(handler):
+        if inspect.isasyncgenfunction(handler):
+            @functools.wraps(handler)
+            async def async_streaming_wrapper(self, request, context):
+                in_flight.labels(method_name).inc()
+                start = time.perf_counter()
+                try:
+                    async for response in handler(self, request, context):
+                        yield response
+                except Exception:
+                    errors.labels(method_name).inc()
+                    raise
+                finally:
+                    in_flight.labels(method_name).dec()
+                    duration.labels(method_name).observe(time.perf_counter() - start)
+            return async_streaming_wrapper
+
+        if inspect.iscoroutinefunction(handler):
+            @functools.wraps(handler)
+            async def async_unary_wrapper(self, request, context):
+                in_flight.labels(method_name).inc()
+                start = time.perf_counter()
+                try:
+                    return await handler(self, request, context)
+                except Exception:
+                    errors.labels(method_name).inc()
+                    raise
+                finally:
+                    in_flight.labels(method_name).dec()
+                    duration.labels(method_name).observe(time.perf_counter() - start)
+            return async_unary_wrapper
+
+        if inspect.isgeneratorfunction(handler):
+            @functools.wraps(handler)
+            def streaming_wrapper(self, request, context):
+                in_flight.labels(method_name).inc()
+                start = time.perf_counter()
+                try:
+                    yield from handler(self, request, context)
+                except Exception:
+                    errors.labels(method_name).inc()
+                    raise
+                finally:
+                    in_flight.labels(method_name).dec()
+                    duration.labels(method_name).observe(time.perf_counter() - start)
+            return streaming_wrapper
+
+        @functools.wraps(handler)
+        def unary_wrapper(self, request, context):
+            in_flight.labels(method_name).inc()
+            start = time.perf_counter()
+            try:
+                return handler(self, request, context)
+            except Exception:
+                errors.labels(method_name).inc()
+                raise
+            finally:
+                in_flight.labels(method_name).dec()
+                duration.labels(method_name).observe(time.perf_counter() - start)
+        return unary_wrapper
+    return decorator
+
+
+def start_metrics_server(port: int):
+    """Serve /metrics of the default prometheus_client registry for a gRPC service from a background thread"""
+    server = start_http_server(port)
+    logger.info(f"Metrics server started on port {port}...")
+    return server
@@ -0,0 +1,296 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_by_access ON entries (last_access);
+CREATE TABLE IF NOT EXISTS objects (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    refs INTEGER NOT NULL
+);
+"""
+
+
+def make_cache_key(params: Dict[str, Any]) -> str:
+    """
+    Canonical hash of a story request.
+
+    Whitespace in string values is collapsed and keys are sorted, so requests
+    that only differ in formatting map to the same key.
+    """
+    canonical = {
+        key: " ".join(value.split()) if isinstance(value, str) else value
+        for key, value in params.items()
+    }
+    payload = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed on-disk cache for whole story results.
+
+    Layout:
+        <cache_dir>/index.sqlite3   entries (story, sentences and artifact references) and artifact sizes
+        <cache_dir>/objects/<sha256>.<ext>   audio/image artifacts, stored once per content
+
+    The index is shared by every process that opens the same directory (the
+    server workers of the orchestrator): max_bytes bounds the directory as a
+    whole, and an artifact is only deleted once no entry refers to it any more.
+    Entries are evicted least-recently-used first once the artifacts exceed
+    max_bytes, and expire ttl_seconds after they were stored. A hit only
+    updates the access time in memory; it is written to the index by the
+    next put or flush. Safe to use from several threads and processes (put
+    copies artifacts and is run off the event loop).
+    """
+
+    def __init__(self, cache_dir: str = "result_cache", max_bytes: int = 1024 ** 3, ttl_seconds: float = 7 * 24 * 3600,
+                 on_lookup: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            cache_dir: Directory holding the cache
+            max_bytes: Maximum total size of stored artifacts
+            ttl_seconds: Lifetime of an entry after it was stored
+            on_lookup: Called with "hit" or "miss" after every get
+        """
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, "objects")
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.on_lookup = on_lookup
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+        # key -> time of its last hit in this process, not written to the index yet
+        self.accessed: Dict[str, float] = {}
+        self.lock = threading.Lock()
+        # Other processes hold the write lock for one put or eviction at a time; wait for them
+        self.db = sqlite3.connect(
+            os.path.join(cache_dir, "index.sqlite3"), isolation_level=None, check_same_thread=False, timeout=30
+        )
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        with self.lock, self._transaction():
+            self._import_entry_files()
+            self._evict()
+        logger.info(f"Result cache opened with {self._count_entries()} entries in {self.cache_dir}")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached result for a key, or None on a miss"""
+        result = self._lookup(key)
+        if self.on_lookup is not None:
+            self.on_lookup("miss" if result is None else "hit")
+        return result
+
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.db.execute("SELECT result, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+            result = json.loads(row[0]) if row is not None else None
+            if result is not None and (self._expired(row[1]) or not self._artifacts_exist(result)):
+                with self._transaction():
+                    self._remove_entry(key)
+                result = None
+            if result is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.accessed[key] = time.time()
+            return result
+
+    def put(self, key: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Store a result and its artifacts.
+
+        Returns:
+            A copy of the result with artifact paths pointing into the cache,
+            or the result unchanged if an artifact was evicted while it was stored
+        """
+        cached_result = json.loads(json.dumps(result))
+        cached_result["audio_file_path"] = self._store_object(result["audio_file_path"])
+        for scene in cached_result.get("scenes") or []:
+            if scene.get("image_path"):
+                scene["image_path"] = self._store_object(scene["image_path"])
+        if cached_result.get("scenes"):
+            cached_result["image_paths"] = [
+                scene["image_path"] for scene in cached_result["scenes"] if scene.get("image_path")
+            ]
+
+        with self.lock, self._transaction():
+            # Artifacts are copied outside the transaction; an eviction in between may have deleted a shared one
+            if not self._artifacts_exist(cached_result):
+                logger.warning(f"Artifacts of {key} were evicted while being stored, not caching it")
+                return json.loads(json.dumps(result))
+            previous = self._entry_result(key)
+            self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            # The new references are counted before the old ones are released, so shared artifacts stay
+            self._add_entry(key, cached_result, time.time())
+            if previous is not None:
+                self._release_artifacts(previous)
+            self._flush_accessed()
+            self._evict()
+        return json.loads(json.dumps(cached_result))
+
+    def flush(self):
+        """Write the access times of the entries read since the last put, so evictions see them"""
+        with self.lock, self._transaction():
+            self._flush_accessed()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "entries": self._count_entries(),
+                "bytes": self._total_bytes(),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Write transaction on the index
+
+        BEGIN IMMEDIATE takes the database's write lock up front, so the
+        processes sharing the cache check, update and evict one at a time.
+        """
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+
+    def _store_object(self, path: str) -> str:
+        """Copy an artifact into the object store, named by its content hash"""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        object_path = os.path.join(self.objects_dir, digest.hexdigest() + os.path.splitext(path)[1])
+        if not os.path.exists(object_path):
+            # Unique per call: concurrent puts of the same content must not share a temp file
+            temp_path = f"{object_path}.{uuid.uuid4().hex}.tmp"
+            shutil.copyfile(path, temp_path)
+            os.replace(temp_path, object_path)
+        return object_path
+
+    def _artifact_paths(self, result: Dict[str, Any]) -> List[str]:
+        paths = [result["audio_file_path"]]
+        paths.extend(scene["image_path"] for scene in result.get("scenes") or [] if scene.get("image_path"))
+        return paths
+
+    def _artifacts_exist(self, result: Dict[str, Any]) -> bool:
+        return all(os.path.exists(path) for path in self._artifact_paths(result))
+
+    def _expired(self, created_at: float) -> bool:
+        return time.time() - created_at > self.ttl_seconds
+
+    def _count_entries(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def _total_bytes(self) -> int:
+        return self.db.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+
+    def _entry_result(self, key: str) -> Optional[Dict[str, Any]]:
+        row = self.db.execute("SELECT result FROM entries WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def _evict(self):
+        """Drop expired entries, then least recently used ones until under max_bytes"""
+        expired = self.db.execute(
+            "SELECT key FROM entries WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+        ).fetchall()
+        for (key,) in expired:
+            self._remove_entry(key)
+        while self._total_bytes() > self.max_bytes:
+            row = self.db.execute("SELECT key FROM entries ORDER BY last_access LIMIT 1").fetchone()
+            if row is None:
+                break
+            self._remove_entry(row[0])
+
+    def _add_entry(self, key: str, result: Dict[str, Any], created_at: float, last_access: Optional[float] = None):
+        """Index an entry and count the artifacts it refers to"""
+        self.db.execute(
+            "INSERT INTO entries (key, result, created_at, last_access) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(result), created_at, last_access or created_at)
+        )
+        for path in set(self._artifact_paths(result)):
+            self.db.execute(
+                "INSERT INTO objects (path, size, refs) VALUES (?, ?, 1) "
+                "ON CONFLICT (path) DO UPDATE SET refs = refs + 1",
+                (path, os.path.getsize(path) if os.path.exists(path) else 0)
+            )
+
+    def _release_artifacts(self, result: Dict[str, Any]):
+        """
+        Delete the artifacts of a removed entry that no remaining entry refers to
+
+        The files are deleted inside the transaction, so a put of another
+        process that reuses one either sees it gone or counts its reference first.
+        """
+        for path in set(self._artifact_paths(result)):
+            self.db.execute("UPDATE objects SET refs = refs - 1 WHERE path = ?", (path,))
+            row = self.db.execute("SELECT refs FROM objects WHERE path = ?", (path,)).fetchone()
+            if row is not None and row[0] <= 0:
+                self.db.execute("DELETE FROM objects WHERE path = ?", (path,))
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _remove_entry(self, key: str):
+        result = self._entry_result(key)
+        if result is None:
+            # Already removed by another process
+            return
+        self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        self.accessed.pop(key, None)
+        self._release_artifacts(result)
+        logger.info(f"Evicted result cache entry {key}")
+
+    def _flush_accessed(self):
+        self.db.executemany(
+            "UPDATE entries SET last_access = MAX(last_access, ?) WHERE key = ?",
+            [(accessed_at, key) for key, accessed_at in self.accessed.items()]
+        )
+        self.accessed.clear()
+
+    def _import_entry_files(self):
+        """Move the entries of the older layout (<cache_dir>/entries/<key>.json) into the index"""
+        entries_dir = os.path.join(self.cache_dir, "entries")
+        if not os.path.isdir(entries_dir):
+            return
+        for filename in os.listdir(entries_dir):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(entries_dir, filename)) as f:
+                    entry = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable cache entry {filename}: {str(e)}")
+                continue
+            if self._entry_result(entry["key"]) is None and self._artifacts_exist(entry["result"]):
+                self._add_entry(entry["key"], entry["result"], entry["created_at"], entry["last_access"])
+        shutil.rmtree(entries_dir, ignore_errors=True)
@@ -0,0 +1,209 @@
+import re
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Words and numbers; punctuation and whitespace only separate them
+WORD_PATTERN = re.compile(r"[\w']+")
+
+# Words that do not change what a storyline is about
+FILLER_WORDS = frozenset({
+    "a", "an", "the", "is", "are", "was", "were", "be", "been", "being",
+    "do", "does", "did", "has", "have", "had",
+})
+# Inflections stripped from content words; a word that is cut differently only lowers the overlap
+SUFFIXES = ("ing", "ed", "s")
+# Words that flip the meaning of a storyline; two storylines must have as many of them
+NEGATIONS = frozenset({"not", "no", "never", "nor", "without", "nobody", "nothing"})
+
+
+def content_words(text: str) -> Tuple[str, ...]:
+    """
+    The words of text that carry its meaning, in order
+
+    Lowercased, without FILLER_WORDS, and with plural and verb endings cut
+    off, so "The knights embarked" and "a knight embarks" are the same.
+    """
+    words = []
+    for word in WORD_PATTERN.findall(text.lower()):
+        if word in FILLER_WORDS:
+            continue
+        for suffix in SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+                word = word[:-len(suffix)]
+                break
+        words.append(word)
+    return tuple(words)
+
+
+def words_match(words: Tuple[str, ...], other: Tuple[str, ...], min_overlap: float) -> bool:
+    """
+    Whether two storylines with these content words may be the same storyline
+
+    They have to share at least min_overlap of their content words
+    (Jaccard), have as many negations ("not", "don't", ...) and have the
+    words they share in the same order, so "knight saves princess" does
+    not match "princess saves knight".
+    """
+    shared = set(words) & set(other)
+    if len(shared) < min_overlap * len(set(words) | set(other)):
+        return False
+    if _negations(words) != _negations(other):
+        return False
+    return [word for word in words if word in shared] == [word for word in other if word in shared]
+
+
+def _negations(words: Tuple[str, ...]) -> int:
+    return sum(1 for word in words if word in NEGATIONS or word.endswith("n't"))
+
+
+class HashedNgramVectorizer:
+    """
+    Embeds short texts as hashed character n-gram vectors.
+
+    Text is lowercased and split into words; the character n-grams of every
+    word (padded with spaces, so prefixes and suffixes count on their own)
+    and the words themselves are hashed into a fixed number of dimensions.
+    The vectors are L2-normalized, so a dot product is the cosine
+    similarity. Requests that differ in casing, whitespace, punctuation or
+    a word or two land close together, without any model to download.
+    """
+
+    def __init__(self, dimensions: int = 2 ** 14, ngram_sizes: Tuple[int, ...] = (3, 4, 5)):
+        """
+        Args:
+            dimensions: Length of the vectors
+            ngram_sizes: Lengths of the character n-grams
+        """
+        self.dimensions = dimensions
+        self.ngram_sizes = ngram_sizes
+
+    def features(self, text: str) -> List[str]:
+        words = WORD_PATTERN.findall(text.lower())
+        features = [f"w:{word}" for word in words]
+        for word in words:
+            padded = f" {word} "
+            for size in self.ngram_sizes:
+                features.extend(padded[i:i + size] for i in range(len(padded) - size + 1))
+        return features
+
+    def transform(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature in self.features(text):
+            # crc32 rather than hash(): the same text has to map to the same vector in every process
+            digest = zlib.crc32(feature.encode("utf-8"))
+            # The top bit picks the sign, so colliding features tend to cancel out instead of adding up
+            vector[digest % self.dimensions] += 1.0 if digest & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class _Index:
+    """Vectors of one namespace in a preallocated matrix, overwritten oldest first once full"""
+
+    def __init__(self, dimensions: int, max_entries: int):
+        self.vectors = np.zeros((0, dimensions), dtype=np.float32)
+        self.values: List[Any] = []
+        self.words: List[Tuple[str, ...]] = []
+        self.max_entries = max_entries
+        self.next_slot = 0
+
+    def add(self, vector: np.ndarray, words: Tuple[str, ...], value: Any):
+        if len(self.values) < self.max_entries:
+            if len(self.values) == len(self.vectors):
+                # Grow by doubling instead of copying the matrix on every add
+                grown = np.zeros((min(self.max_entries, max(16, 2 * len(self.vectors))), self.vectors.shape[1]),
+                                 dtype=np.float32)
+                grown[:len(self.vectors)] = self.vectors
+                self.vectors = grown
+            self.vectors[len(self.values)] = vector
+            self.values.append(value)
+            self.words.append(words)
+            return
+        self.vectors[self.next_slot] = vector
+        self.values[self.next_slot] = value
+        self.words[self.next_slot] = words
+        self.next_slot = (self.next_slot + 1) % self.max_entries
+
+    def nearest(self, vector: np.ndarray, words: Tuple[str, ...], threshold: float,
+                min_word_overlap: Optional[float]) -> Tuple[Optional[int], float]:
+        """Most similar entry at or above threshold whose words match (see words_match, skipped if min_word_overlap is None)"""
+        if not self.values:
+            return None, 0.0
+        similarities = self.vectors[:len(self.values)] @ vector
+        candidates = np.flatnonzero(similarities >= threshold)
+        for candidate in candidates[np.argsort(-similarities[candidates])]:
+            if min_word_overlap is None or words_match(self.words[candidate], words, min_word_overlap):
+                return int(candidate), float(similarities[candidate])
+        return None, 0.0
+
+
+class SemanticCache:
+    """
+    Cache of values by near-duplicate text.
+
+    Texts are embedded with a HashedNgramVectorizer and kept in one index
+    per namespace (e.g. per genre), so only texts of the same namespace
+    are compared. A lookup returns the value of the most similar text whose
+    cosine similarity reaches threshold and whose content words match
+    (words_match: enough overlap, the same negations, the same order).
+    Each index keeps the last max_entries texts.
+
+    Character n-grams measure how much wording two texts share, not what
+    they mean: one changed word scores about the same whether it is a
+    synonym or an antonym. The word check rules out negations and swapped
+    roles, but a single replaced word is matched either way, so "goes on
+    a quest" matches "embarks on a quest" and so does "to destroy the
+    kingdom" for "to save the kingdom".
+    """
+
+    def __init__(self, threshold: float = 0.85, max_entries: int = 1000,
+                 vectorizer: Optional[HashedNgramVectorizer] = None, min_word_overlap: Optional[float] = 0.7):
+        """
+        Args:
+            threshold: Cosine similarity at or above which a text counts as a duplicate
+            max_entries: Texts kept per namespace
+            vectorizer: Embeds the texts, a HashedNgramVectorizer by default
+            min_word_overlap: Share of content words (Jaccard) a duplicate must have in common,
+                None to match on the similarity alone
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.min_word_overlap = min_word_overlap
+        self.vectorizer = vectorizer or HashedNgramVectorizer()
+        self.indexes: Dict[str, _Index] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, namespace: str, text: str) -> Optional[Tuple[Any, float]]:
+        """
+        Value stored for the text of namespace most similar to text
+
+        Returns:
+            (value, similarity), or None if no stored text reaches the threshold
+            with matching content words
+        """
+        index = self.indexes.get(namespace)
+        best, similarity = (None, 0.0) if index is None else index.nearest(
+            self.vectorizer.transform(text), content_words(text), self.threshold, self.min_word_overlap
+        )
+        if best is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return index.values[best], similarity
+
+    def add(self, namespace: str, text: str, value: Any):
+        index = self.indexes.get(namespace)
+        if index is None:
+            index = self.indexes[namespace] = _Index(self.vectorizer.dimensions, self.max_entries)
+        index.add(self.vectorizer.transform(text), content_words(text), value)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "namespaces": len(self.indexes),
+            "entries": sum(len(index.values) for index in self.indexes.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,69 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """An in-flight call shared by every request with the same key."""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls into one execution.
+
+    The first caller for a key (the leader) starts the work as a separate task
+    and every caller, leader included, awaits that task through a shield. A
+    caller that is cancelled (e.g. its client disconnected) only stops waiting;
+    the shared work keeps running for the others and is cancelled only once
+    the last waiter has gone. Each caller can bound its own wait with a
+    timeout, so a follower is not held to the leader's deadline.
+    """
+
+    def __init__(self):
+        self.calls: Dict[str, _Call] = {}
+
+    def __len__(self) -> int:
+        return len(self.calls)
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        """
+        Run fn() for the key, or join the execution already in flight.
+
+        Args:
+            key: Identity of the call; callers with equal keys share one execution
+            fn: Coroutine function that performs the work
+            timeout: Longest time this caller waits for the result, or None to wait until it is done
+
+        Returns:
+            The result of the shared execution (the same object for every caller)
+
+        Raises:
+            asyncio.TimeoutError: This caller's timeout expired; the work goes on for the other callers
+        """
+        call = self.calls.get(key)
+        if call is None:
+            call = _Call(asyncio.create_task(fn()))
+            self.calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+        else:
+            logger.info(f"Joining in-flight request {key[:12]} ({call.waiters} already waiting)")
+
+        call.waiters += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(call.task), timeout)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                logger.info(f"All waiters left in-flight request {key[:12]}, cancelling it")
+                call.task.cancel()
+                self._forget(key, call)
+
+    def _forget(self, key: str, call: _Call):
+        if self.calls.get(key) is call:
+            del self.calls[key]
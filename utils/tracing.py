@@ -0,0 +1,256 @@
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# W3C Trace Context header, passed as gRPC metadata between the services
+TRACEPARENT = "traceparent"
+
+
+class SpanContext:
+    """Identity of a span, as carried in a traceparent header."""
+
+    def __init__(self, trace_id: str, span_id: str):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+    def to_traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    @classmethod
+    def from_traceparent(cls, value: Optional[str]) -> Optional["SpanContext"]:
+        """Parse a traceparent header, returning None if it is missing or malformed"""
+        if not value:
+            return None
+        parts = value.strip().split("-")
+        if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+            return None
+        try:
+            int(parts[1], 16), int(parts[2], 16)
+        except ValueError:
+            return None
+        return cls(parts[1], parts[2])
+
+
+# The span currently active in this thread / asyncio task
+current_span: contextvars.ContextVar[Optional[SpanContext]] = contextvars.ContextVar("current_span", default=None)
+
+
+class FileExporter:
+    """
+    Appends finished spans to a file, one Zipkin v2 JSON span per line.
+
+    The file can be loaded into Zipkin or Jaeger (POST the spans as a JSON
+    array) or inspected directly with jq.
+
+    export() only queues the span: a background thread writes the queued
+    spans in batches, so ending a span on the event loop never waits for
+    the disk. Once the file reaches max_bytes it is renamed to <path>.1
+    (replacing the previous one) and a new file is started, so the spans
+    take at most twice max_bytes. When the queue is full (the disk cannot
+    keep up) spans are dropped and counted in dropped.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 100 * 1024 * 1024, max_queued: int = 10000):
+        """
+        Args:
+            path: File the spans are appended to
+            max_bytes: Size at which the file is rotated
+            max_queued: Spans waiting to be written at most
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        self.queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_queued)
+        self.writer = threading.Thread(target=self._write_spans, name="span-writer", daemon=True)
+        self.writer.start()
+        # Write what is still queued when the process exits
+        atexit.register(self.close)
+
+    def export(self, span: Dict[str, Any]):
+        try:
+            self.queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout: float = 5.0):
+        """Write the queued spans and stop the writer thread"""
+        if self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join(timeout)
+
+    def _write_spans(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        while True:
+            spans = [self.queue.get()]
+            # Everything that queued up while the last batch was written goes into this one
+            while spans[-1] is not None:
+                try:
+                    spans.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._append(span for span in spans if span is not None)
+            except OSError as e:
+                logger.error(f"Failed to write {len(spans)} spans to {self.path}: {e}")
+            if spans[-1] is None:
+                return
+
+    def _append(self, spans):
+        with open(self.path, "a") as f:
+            f.writelines(json.dumps(span) + "\n" for span in spans)
+            size = f.tell()
+        if size >= self.max_bytes:
+            os.replace(self.path, self.path + ".1")
+
+
+class Tracer:
+    """Creates spans for one service and hands them to an exporter."""
+
+    def __init__(self, service_name: str, exporter: Optional[FileExporter]):
+        """
+        Args:
+            service_name: Name recorded as the span's local endpoint
+            exporter: Where finished spans go; None disables tracing
+        """
+        self.service_name = service_name
+        self.exporter = exporter
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[SpanContext] = None, kind: Optional[str] = None, **tags):
+        """
+        Record a span around a block of code.
+
+        The span becomes the current span inside the block, so nested spans
+        and outgoing gRPC calls are linked to it. Without an explicit parent
+        the current span is used, and without either a new trace is started.
+        """
+        parent = parent or current_span.get()
+        context = SpanContext(parent.trace_id if parent else secrets.token_hex(16), secrets.token_hex(8))
+        token = current_span.set(context)
+        start = time.time()
+        error = None
+        try:
+            yield context
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            current_span.reset(token)
+            if error is not None:
+                tags["error"] = f"{type(error).__name__}: {error}"
+            self._export(context, parent, name, start, time.time() - start, kind, tags)
+
+    def record_span(self, name: str, duration_seconds: float, **tags):
+        """Record a child span of the current span that ended just now"""
+        parent = current_span.get()
+        context = SpanContext(parent.trace_id if parent else secrets.token_hex(16), secrets.token_hex(8))
+        end = time.time()
+        self._export(context, parent, name, end - duration_seconds, duration_seconds, None, tags)
+
+    def _export(self, context: SpanContext, parent: Optional[SpanContext], name: str,
+                start: float, duration: float, kind: Optional[str], tags: Dict[str, Any]):
+        if self.exporter is None:
+            return
+        span = {
+            "traceId": context.trace_id,
+            "id": context.span_id,
+            "name": name,
+            "timestamp": int(start * 1_000_000),
+            "duration": max(1, int(duration * 1_000_000)),
+            "localEndpoint": {"serviceName": self.service_name},
+            "tags": {key: str(value) for key, value in tags.items()},
+        }
+        if parent is not None:
+            span["parentId"] = parent.span_id
+        if kind is not None:
+            span["kind"] = kind
+        self.exporter.export(span)
+
+
+def create_tracer(service_name: str) -> Tracer:
+    """
+    Tracer configured from the environment.
+
+    STORY2AUDIO_TRACING=0 disables tracing; STORY2AUDIO_TRACE_DIR sets where
+    the <service_name>.<pid>.jsonl span files are written (default: traces/)
+    and STORY2AUDIO_TRACE_MAX_MB the size at which they are rotated (default:
+    100). Every process gets its own file, so the server workers of the
+    orchestrator never append to or rotate each other's.
+    """
+    if os.getenv("STORY2AUDIO_TRACING", "1") != "1":
+        return Tracer(service_name, None)
+    trace_dir = os.getenv("STORY2AUDIO_TRACE_DIR", "traces")
+    max_bytes = int(float(os.getenv("STORY2AUDIO_TRACE_MAX_MB", "100")) * 1024 * 1024)
+    return Tracer(service_name, FileExporter(os.path.join(trace_dir, f"{service_name}.{os.getpid()}.jsonl"), max_bytes=max_bytes))
+
+
+def current_traceparent() -> Optional[str]:
+    """traceparent header value of the current span, if any"""
+    context = current_span.get()
+    return context.to_traceparent() if context is not None else None
+
+
+def outgoing_metadata() -> List[Tuple[str, str]]:
+    """gRPC metadata that propagates the current span to the callee"""
+    traceparent = current_traceparent()
+    return [(TRACEPARENT, traceparent)] if traceparent is not None else []
+
+
+def incoming_context(grpc_context) -> Optional[SpanContext]:
+    """Span context sent by the caller of a gRPC handler, if any"""
+    for key, value in grpc_context.invocation_metadata() or ():
+        if key == TRACEPARENT:
+            return SpanContext.from_traceparent(value)
+    return None
+
+
+def trace_rpc(tracer: Tracer, method_name: str):
+    """
+    Decorator opening a server span for a gRPC handler.
+
+    The span continues the trace passed in the traceparent metadata. Works
+    for unary and server-streaming (generator) handlers, sync or grpc.aio.
+    """
+    def decorator(handler):
+        if inspect.isasyncgenfunction(handler):
+            @functools.wraps(handler)
+            async def async_streaming_wrapper(self, request, context):
+                with tracer.span(method_name, parent=incoming_context(context), kind="SERVER"):
+                    async for response in handler(self, request, context):
+                        yield response
+            return async_streaming_wrapper
+
+        if inspect.iscoroutinefunction(handler):
+            @functools.wraps(handler)
+            async def async_unary_wrapper(self, request, context):
+                with tracer.span(method_name, parent=incoming_context(context), kind="SERVER"):
+                    return await handler(self, request, context)
+            return async_unary_wrapper
+
+        if inspect.isgeneratorfunction(handler):
+            @functools.wraps(handler)
+            def streaming_wrapper(self, request, context):
+                with tracer.span(method_name, parent=incoming_context(context), kind="SERVER"):
+                    yield from handler(self, request, context)
+            return streaming_wrapper
+
+        @functools.wraps(handler)
+        def unary_wrapper(self, request, context):
+            with tracer.span(method_name, parent=incoming_context(context), kind="SERVER"):
+                return handler(self, request, context)
+        return unary_wrapper
+    return decorator
@@ -1,4 +1,6 @@
+import io
 import os
+import wave
 
 def get_files_with_extension(directory, extension):
 
@@ -14,5 +16,24 @@ def get_files_with_extension(directory, extension):
     return files
 
 
+def merge_wav_data(segments, output_file):
+    """Concatenate WAV encoded segments of the same format into output_file and return its duration in seconds"""
+    if not segments:
+        raise ValueError("No audio segments to merge")
+    with wave.open(output_file, "wb") as merged:
+        for i, data in enumerate(segments):
+            with wave.open(io.BytesIO(data), "rb") as segment:
+                if i == 0:
+                    merged.setparams(segment.getparams())
+                merged.writeframes(segment.readframes(segment.getnframes()))
+        return merged.getnframes() / merged.getframerate()
+
+
+def wav_duration(path):
+    """Duration of a WAV file in seconds"""
+    with wave.open(path, "rb") as audio:
+        return audio.getnframes() / audio.getframerate()
+
+
 if __name__ =="__main__":
     get_files_with_extension(f'reference_audios\emotions','wav')
\ No newline at end of file
@@ -1,5 +1,6 @@
 import random
 import sys
+import time
 
 import soundfile as sf
 import tqdm
@@ -165,6 +166,8 @@ class F5TTS:
         file_wave=None,
         file_spect=None,
         seed=-1,
+        on_stage=None,
+        should_stop=None,
     ):
         max_size = 4294967295
         if seed == -1:
@@ -172,7 +175,10 @@ class F5TTS:
         seed_everything(seed)
         self.seed = seed
 
+        stage_start = time.perf_counter()
         ref_file, ref_text = preprocess_ref_audio_text(ref_file, ref_text, device=self.device)
+        if on_stage is not None:
+            on_stage("reference_preprocess", time.perf_counter() - stage_start)
 
         wav, sr, spect = infer_process(
             ref_file,
@@ -191,10 +197,15 @@ class F5TTS:
             speed=speed,
             fix_duration=fix_duration,
             device=self.device,
+            on_stage=on_stage,
+            should_stop=should_stop,
         )
 
         if file_wave is not None:
+            stage_start = time.perf_counter()
             self.export_wav(wav, sr,file_wave, remove_silence)
+            if on_stage is not None:
+                on_stage("file_write", time.perf_counter() - stage_start)
 
         if file_spect is not None:
             self.export_spectrogram(spect, file_spect)
@@ -40,6 +40,10 @@ except:
     )
 
 
+class InferenceCancelled(Exception):
+    """Raised inside sampling when the should_stop callback asks to abandon the request."""
+
+
 class CFM(nn.Module):
     def __init__(
         self,
@@ -107,6 +111,7 @@ class CFM(nn.Module):
         duplicate_test=False,
         t_inter=0.1,
         edit_mask=None,
+        should_stop: Callable[[], bool] | None = None,
     ):
         self.eval()
         # raw wave
@@ -171,6 +176,10 @@ class CFM(nn.Module):
         # neural ode
 
         def fn(t, x):
+            # checked once per solver step so abandoned requests stop using the GPU early
+            if should_stop is not None and should_stop():
+                raise InferenceCancelled()
+
             # at each step, conditioning is fixed
             # step_cond = torch.where(cond_mask, cond, torch.zeros_like(cond))
 
@@ -7,6 +7,7 @@ import os
 import hashlib
 import re
 import tempfile
+import time
 
 import matplotlib
 
@@ -36,6 +37,8 @@ except:
     )
 
 _ref_audio_cache = {}
+# (reference file, mtime, size, ref_text) -> (clipped reference file, ref_text)
+_ref_preprocess_cache = {}
 
 device = "cuda" if torch.cuda.is_available() else "mps" if torch.backends.mps.is_available() else "cpu"
 # device = 'cpu'
@@ -286,6 +289,20 @@ def remove_silence_edges(audio, silence_threshold=-42):
 
 
 def preprocess_ref_audio_text(ref_audio_orig, ref_text, clip_short=True, show_info=print, device=device):
+    # The same few reference voices are used over and over, keep their clipped audio and transcript
+    stat = os.stat(ref_audio_orig)
+    cache_key = (os.path.abspath(ref_audio_orig), stat.st_mtime, stat.st_size, ref_text, clip_short)
+    cached = _ref_preprocess_cache.get(cache_key)
+    if cached is not None and os.path.exists(cached[0]):
+        show_info("Using cached reference audio...")
+        return cached
+
+    ref_audio, ref_text = _preprocess_ref_audio_text(ref_audio_orig, ref_text, clip_short, show_info)
+    _ref_preprocess_cache[cache_key] = (ref_audio, ref_text)
+    return ref_audio, ref_text
+
+
+def _preprocess_ref_audio_text(ref_audio_orig, ref_text, clip_short, show_info):
     show_info("Converting audio...")
     with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as f:
         aseg = AudioSegment.from_file(ref_audio_orig)
@@ -376,7 +393,15 @@ def infer_process(
     speed=speed,
     fix_duration=fix_duration,
     device=device,
+    on_stage=None,
+    should_stop=None,
 ):
+    """
+    Synthesize gen_text in the voice of ref_audio, in batches of text (see infer_batch_process)
+
+    on_stage(stage_name, seconds), if given, is called after each timed step.
+    should_stop() is polled at every ODE step; returning True raises InferenceCancelled.
+    """
     # Split the input text into batches
     audio, sr = torchaudio.load(ref_audio)
     max_chars = int(len(ref_text.encode("utf-8")) / (audio.shape[-1] / sr) * (25 - audio.shape[-1] / sr))
@@ -402,9 +427,28 @@ def infer_process(
         speed=speed,
         fix_duration=fix_duration,
         device=device,
+        on_stage=on_stage,
+        should_stop=should_stop,
     )
 
 
+def _report_stage(on_stage, stage_name, start, device, synchronize=True):
+    """
+    Call on_stage with the time since start, if a stage hook is set
+
+    CUDA kernels run asynchronously, so without a synchronize the time would
+    only cover launching them. Synchronizing stalls the pipeline until the
+    GPU is idle, which is why it only happens when someone asked for the
+    timings. Pass synchronize=False for a stage that already ended by waiting
+    for the GPU (e.g. copying its result to the CPU).
+    """
+    if on_stage is None:
+        return
+    if synchronize and device is not None and "cuda" in str(device):
+        torch.cuda.synchronize()
+    on_stage(stage_name, time.perf_counter() - start)
+
+
 # infer batches
 
 
@@ -424,7 +468,16 @@ def infer_batch_process(
     speed=1,
     fix_duration=None,
     device=None,
+    on_stage=None,
+    should_stop=None,
 ):
+    """
+    Synthesize each batch of gen_text_batches and cross-fade them together
+
+    on_stage(stage_name, seconds), if given, is called after the ODE sampling
+    and the vocoder decode of each batch. should_stop() is polled at every
+    ODE step; returning True raises InferenceCancelled.
+    """
     audio, sr = ref_audio
     if audio.shape[0] > 1:
         audio = torch.mean(audio, dim=0, keepdim=True)
@@ -458,6 +511,7 @@ def infer_batch_process(
 
         # inference
         with torch.inference_mode():
+            stage_start = time.perf_counter()
             generated, _ = model_obj.sample(
                 cond=audio,
                 text=final_text_list,
@@ -465,8 +519,11 @@ def infer_batch_process(
                 steps=nfe_step,
                 cfg_strength=cfg_strength,
                 sway_sampling_coef=sway_sampling_coef,
+                should_stop=should_stop,
             )
+            _report_stage(on_stage, "ode_sampling", stage_start, device)
 
+            stage_start = time.perf_counter()
             generated = generated.to(torch.float32)
             generated = generated[:, ref_audio_len:, :]
             generated_mel_spec = generated.permute(0, 2, 1)
@@ -479,6 +536,8 @@ def infer_batch_process(
 
             # wav -> numpy
             generated_wave = generated_wave.squeeze().cpu().numpy()
+            # .cpu() above already waited for the vocoder kernels
+            _report_stage(on_stage, "vocoder_decode", stage_start, device, synchronize=False)
 
             generated_waves.append(generated_wave)
             spectrograms.append(generated_mel_spec[0].cpu().numpy())